@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Speed Test Attempt Events
+Append-only JSONL log of speed test attempts (start, success, failure, rate
+limiting, write errors) written by the loggers, and an incremental tail reader
+the web interface keeps in memory instead of scraping the systemd journal.
+"""
+
+import os
+import json
+import threading
+from collections import deque
+from datetime import datetime
+
+# Event kind -> (status, type) as shown in the dashboard's recent attempts table
+EVENT_KINDS = {
+    'start': ('started', 'info'),
+    'success': ('success', 'success'),
+    'failure': ('failed', 'error'),
+    'rate_limited': ('failed', 'error'),
+    'write_error': ('warning', 'warning'),
+    'service_started': ('service', 'info'),
+    'service_stopped': ('service', 'info')
+}
+ATTEMPT_KINDS = ('start', 'success', 'failure', 'rate_limited', 'write_error')
+
+# Only this much of the end of the file is read when a reader starts
+TAIL_BYTES = 64 * 1024
+
+
+def events_path_for(log_path):
+    """Event log path that sits next to a raw CSV log or SQLite database."""
+    return os.path.splitext(log_path)[0] + '.events.jsonl'
+
+
+def event_time(event):
+    """An event's timestamp as an aware datetime, or None if it has none."""
+    try:
+        # Naive timestamps are taken as local time
+        return datetime.fromisoformat(event['timestamp']).astimezone()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def pid_alive(pid):
+    """True if a process with this pid exists."""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AttemptEventLog:
+    """Writer side: one JSON object per line, appended with a single write()."""
+
+    def __init__(self, path):
+        self.path = path
+        # Set by the continuous loop so readers can check the service is alive
+        self.service_pid = None
+
+    @classmethod
+    def for_storage(cls, storage):
+        """Event log for a speed_storage backend."""
+        return cls(events_path_for(storage.location))
+
+    def record(self, kind, message, **fields):
+        """
+        Append one event. Failures are swallowed: the event log must never
+        break a speed test run.
+
+        Returns:
+            True if the event was written
+        """
+        status, event_type = EVENT_KINDS[kind]
+        event = {
+            'timestamp': datetime.now().astimezone().isoformat(timespec='seconds'),
+            'event': kind,
+            'status': status,
+            'message': message,
+            'type': event_type,
+            'pid': os.getpid()
+        }
+        if self.service_pid:
+            event['service_pid'] = self.service_pid
+        event.update(fields)
+
+        line = (json.dumps(event, separators=(',', ':')) + '\n').encode()
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            return True
+        except OSError:
+            return False
+
+    def start(self, attempt=None, max_attempts=None):
+        suffix = f" (attempt {attempt}/{max_attempts})" if attempt and max_attempts else ''
+        return self.record('start', f"Speed test started{suffix}")
+
+    def success(self, download_mbps, upload_mbps, ping_ms, phase_seconds=None):
+        fields = {'phase_seconds': phase_seconds} if phase_seconds else {}
+        return self.record(
+            'success',
+            f"Success: {download_mbps} Mbps down, {upload_mbps} Mbps up, {ping_ms} ms ping",
+            download_speed_mbps=download_mbps,
+            upload_speed_mbps=upload_mbps,
+            ping_ms=ping_ms,
+            **fields
+        )
+
+    def failure(self, error):
+        return self.record('failure', f"Failed: {error}")
+
+    def rate_limited(self):
+        return self.record('rate_limited', 'Failed: HTTP Error 403 - Speedtest server blocked request')
+
+    def write_error(self, error):
+        return self.record('write_error', 'Warning: Failed to write results to CSV file', error=str(error))
+
+    def service_started(self, interval_hours):
+        self.service_pid = os.getpid()
+        return self.record('service_started', f"Logger started, testing every {interval_hours} hour(s)")
+
+    def service_stopped(self):
+        written = self.record('service_stopped', 'Logger stopped')
+        self.service_pid = None
+        return written
+
+
+class AttemptEventTail:
+    """
+    Reader side: keeps the newest events in a ring buffer and reads only the
+    bytes appended since the previous refresh.
+    """
+
+    def __init__(self, path, capacity=200):
+        self.path = path
+        self.events = deque(maxlen=capacity)
+        self.service_pid = None
+        # Optional callable(event) seeing each event written after the reader started, once
+        self.on_event = None
+        # Newest event time read so far (or when the reader started); lines read
+        # after a (re)start that aren't newer were already there and aren't observed
+        self._seen_until = datetime.now().astimezone()
+        self._offset = 0
+        self._inode = None
+        self._partial = b''
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Pull newly appended events into the ring buffer."""
+        with self._lock:
+            try:
+                stat_info = os.stat(self.path)
+            except OSError:
+                return
+
+            if stat_info.st_ino != self._inode or stat_info.st_size < self._offset:
+                # New, replaced or truncated file: start again from its tail
+                self.events.clear()
+                self.service_pid = None
+                self._inode = stat_info.st_ino
+                self._offset = max(0, stat_info.st_size - TAIL_BYTES)
+                self._partial = b''
+                skip_first_line = self._offset > 0
+                backfill = True
+            else:
+                skip_first_line = False
+                backfill = False
+
+            if stat_info.st_size == self._offset:
+                return
+
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                chunk = f.read(stat_info.st_size - self._offset)
+            self._offset += len(chunk)
+
+            lines = (self._partial + chunk).split(b'\n')
+            self._partial = lines.pop()
+            if skip_first_line and lines:
+                lines.pop(0)
+
+            for line in lines:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                self._track_service(event)
+                self._observe(event, backfill)
+                if event.get('event') in ATTEMPT_KINDS:
+                    self.events.append(event)
+
+    def _observe(self, event, backfill):
+        timestamp = event_time(event)
+        if backfill and (timestamp is None or timestamp <= self._seen_until):
+            return
+        if timestamp is not None:
+            self._seen_until = max(self._seen_until, timestamp)
+        if self.on_event:
+            self.on_event(event)
+
+    def _track_service(self, event):
+        if event.get('event') == 'service_stopped':
+            # Known to be stopped, as opposed to None (unknown)
+            self.service_pid = 0
+        elif event.get('service_pid'):
+            self.service_pid = event['service_pid']
+
+    def has_events(self):
+        return bool(self.events) or self.service_pid is not None
+
+    def recent(self, limit=5):
+        """Newest attempt events first."""
+        with self._lock:
+            return [dict(event) for event in list(self.events)[-limit:][::-1]] if limit > 0 else []
+
+    def service_running(self):
+        """
+        Whether the logging service is alive, judged by the pid of the last
+        continuous run; None when the events don't say.
+        """
+        if self.service_pid is None:
+            return None
+        return pid_alive(self.service_pid)
+
+
+_tails = {}
+_tails_lock = threading.Lock()
+
+
+def get_event_tail(path):
+    """Shared AttemptEventTail per event log path."""
+    with _tails_lock:
+        if path not in _tails:
+            _tails[path] = AttemptEventTail(path)
+        return _tails[path]
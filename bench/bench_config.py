@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Configuration Loading Benchmark
+Compares re-parsing config.json on every load_config() call with the cached
+ConfigStore, and counts how many loads one uncached /api/data request makes.
+
+Usage: python3 bench/bench_config.py [calls]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import web_interface
+from config_store import ConfigStore
+
+
+def legacy_load_config(path):
+    """What load_config() did before: open and parse the file on every call."""
+    with open(path, 'r') as f:
+        config = json.load(f)
+    for key, value in web_interface.default_config().items():
+        if key not in config:
+            config[key] = value
+    return config
+
+
+def time_calls(func, calls):
+    """Mean wall time per call in microseconds."""
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def count_loads_per_request(url):
+    """Number of load_config() calls made while serving one uncached request."""
+    calls = 0
+    original = web_interface.load_config
+
+    def counting_load_config():
+        nonlocal calls
+        calls += 1
+        return original()
+
+    web_interface.load_config = counting_load_config
+    try:
+        web_interface.response_cache._entries.clear()
+        web_interface.app.test_client().get(url)
+    finally:
+        web_interface.load_config = original
+    return calls
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    workdir = tempfile.mkdtemp(prefix='bench_config_')
+    try:
+        web_interface.CONFIG_PATH = os.path.join(workdir, 'config.json')
+        web_interface.CSV_PATH = os.path.join(workdir, 'internet_speed_log.csv')
+        web_interface.save_config(web_interface.default_config())
+
+        store = ConfigStore(web_interface.CONFIG_PATH)
+        legacy_us = time_calls(lambda: legacy_load_config(web_interface.CONFIG_PATH), calls)
+        cached_us = time_calls(lambda: store.load(web_interface.default_config), calls)
+
+        print(f"load_config x {calls:,}")
+        print(f"  re-parse every call  {legacy_us:8.1f} us/call")
+        print(f"  ConfigStore (cached) {cached_us:8.1f} us/call  ({store.reads} file read)")
+
+        for url in ('/api/data?days=7', '/api/manual-test-status', '/api/recent-attempts'):
+            loads = count_loads_per_request(url)
+            saved = loads * (legacy_us - cached_us)
+            print(f"  {url:<26} {loads} loads/request, ~{saved:.0f} us saved per request")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Downsampling Benchmark
+Times LTTB and min/max downsampling on a synthetic 1M-point speed series.
+
+Usage: python3 bench/bench_downsample.py [points] [max_points]
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downsampling import lttb_indices, minmax_indices
+
+
+def synthetic_series(points, seed=42):
+    """Hourly samples with a daily cycle, noise and occasional outage dips."""
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(points, dtype=np.int64) * 3600
+    daily = 10 * np.sin(timestamps / 86400 * 2 * np.pi)
+    download = (80 + daily + rng.normal(0, 8, points)).astype(np.float32)
+    upload = (18 + daily / 5 + rng.normal(0, 2, points)).astype(np.float32)
+    ping = (20 + rng.gamma(2, 3, points)).astype(np.float32)
+
+    outages = rng.choice(points, size=max(1, points // 5000), replace=False)
+    download[outages] = 0.5
+    return timestamps, download, upload, ping, outages
+
+
+def time_call(func, repeat=5):
+    """Best-of-N wall time in milliseconds and the last result."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    max_points = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    timestamps, download, upload, ping, outages = synthetic_series(points)
+    print(f"Series: {points:,} points, target {max_points} points, {len(outages)} outage dips")
+
+    lttb_ms, lttb = time_call(lambda: lttb_indices(timestamps, download, max_points))
+    minmax_ms, minmax = time_call(lambda: minmax_indices([download, upload, ping], max_points))
+
+    for name, elapsed, indices in (('lttb', lttb_ms, lttb), ('minmax', minmax_ms, minmax)):
+        kept = np.isin(outages, indices).sum()
+        print(f"  {name:<7} {elapsed:8.1f} ms  {len(indices):5d} points  "
+              f"outage dips kept: {kept}/{len(outages)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Statistics Benchmark
+Times the single-pass MetricStats accumulator against list-based and NumPy
+two-pass statistics on a synthetic speed series, checks its percentiles
+against exact ones, and times merging per-hour accumulators into a total.
+
+Usage: python3 bench/bench_statistics.py [points]
+"""
+
+import os
+import sys
+import time
+import math
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from speed_stats import MetricStats, QUANTILES
+
+
+def synthetic_download(points, seed=42):
+    """Hourly download speeds with a daily cycle, noise and occasional outages."""
+    rng = np.random.default_rng(seed)
+    hours = np.arange(points)
+    download = 80 + 10 * np.sin(hours / 24 * 2 * np.pi) + rng.normal(0, 8, points)
+    download[rng.choice(points, size=max(1, points // 5000), replace=False)] = 0.0
+    return np.round(np.clip(download, 0, None), 2)
+
+
+def time_call(func, repeat=5):
+    """Best-of-N wall time in milliseconds and the last result."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def list_statistics(values):
+    """Python lists: a pass for the mean, another for the variance, a sort for percentiles."""
+    count = len(values)
+    mean = sum(values) / count
+    variance = sum((v - mean) ** 2 for v in values) / count
+    ordered = sorted(values)
+    summary = {'avg': mean, 'min': ordered[0], 'max': ordered[-1], 'stddev': math.sqrt(variance)}
+    for name, q in QUANTILES:
+        summary[name] = ordered[round(q * (count - 1))]
+    return summary
+
+
+def numpy_statistics(values):
+    """NumPy: separate reductions plus np.percentile (a partition per call)."""
+    summary = {'avg': values.mean(), 'min': values.min(), 'max': values.max(), 'stddev': values.std()}
+    for name, q in QUANTILES:
+        summary[name] = np.percentile(values, q * 100, method='nearest')
+    return summary
+
+
+def main():
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    download = synthetic_download(points)
+    as_list = download.tolist()
+    print(f"Series: {points:,} points")
+
+    list_ms, exact = time_call(lambda: list_statistics(as_list), repeat=3)
+    numpy_ms, _ = time_call(lambda: numpy_statistics(download))
+    stream_ms, summary = time_call(lambda: MetricStats.from_values(download).summary())
+    print(f"  lists        {list_ms:8.1f} ms")
+    print(f"  numpy        {numpy_ms:8.1f} ms")
+    print(f"  MetricStats  {stream_ms:8.1f} ms")
+
+    for name, _ in QUANTILES:
+        error = abs(summary[name] - exact[name]) / exact[name] * 100 if exact[name] else 0.0
+        print(f"  {name:<4} exact {exact[name]:8.2f}  sketch {summary[name]:8.2f}  ({error:.2f}% off)")
+    print(f"  stddev exact {exact['stddev']:8.2f}  running {summary['stddev']:8.2f}")
+
+    # Per-hour accumulators (as the rollups keep them) merged into one summary
+    hourly = [MetricStats.from_values(download[i:i + 1]) for i in range(min(points, 24 * 365))]
+    merge_ms, _ = time_call(lambda: merged(hourly).summary())
+    recompute_ms, _ = time_call(lambda: MetricStats.from_values(download[:len(hourly)]).summary())
+    print(f"  merge {len(hourly):,} hourly buckets {merge_ms:8.1f} ms  "
+          f"(recompute from samples {recompute_ms:.1f} ms)")
+
+
+def merged(parts):
+    total = MetricStats()
+    for part in parts:
+        total.merge(part)
+    return total
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite
+Generates synthetic logs from one month to ten years (see synthetic_log.py)
+and, for each, times the web interface's data functions and every GET route
+through the Flask test client. Prints machine-readable JSON with latency
+percentiles in milliseconds and the peak RSS of the process, so runs on a Pi
+can be compared over time.
+
+Each dataset runs in its own child process so its peak RSS isn't inflated by
+the larger datasets before it. POST routes (settings changes, manual tests),
+the never-ending /api/stream and /admin/logout are not timed.
+
+Usage: python3 bench/bench_suite.py [--months 1,12,60,120] [--repeat 20] [--output results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+DEFAULT_MONTHS = (1, 12, 60, 120)
+PERCENTILES = (50, 90, 99)
+# Routes timed in addition to every parameterless GET route
+EXTRA_URLS = ('/api/data?days=7', '/api/data?days=30&limit=50', '/api/chart-data?days=30',
+              '/api/chart-data?days=365', '/api/chart-data?days=3650&resolution=raw',
+              '/api/rollups?period=day&days=365', '/download/filtered-csv?days=30',
+              '/api/manual-test/unknown')
+SKIPPED_URLS = ('/api/stream', '/admin/logout')
+
+
+def time_samples(func, repeat):
+    """Wall time of each of `repeat` calls in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    """First (cold) call plus percentiles of the rest."""
+    warm = samples[1:] or samples
+    summary = {'first_ms': round(samples[0], 3), 'calls': len(samples)}
+    for p in PERCENTILES:
+        summary[f'p{p}_ms'] = round(float(np.percentile(warm, p)), 3)
+    summary['max_ms'] = round(max(warm), 3)
+    summary['mean_ms'] = round(sum(warm) / len(warm), 3)
+    return summary
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def route_urls(app):
+    """Every GET route without URL arguments, plus EXTRA_URLS."""
+    urls = []
+    for rule in app.url_map.iter_rules():
+        if 'GET' in rule.methods and not rule.arguments and rule.rule not in SKIPPED_URLS:
+            urls.append(rule.rule)
+    return sorted(urls) + list(EXTRA_URLS)
+
+
+def bench_dataset(months, repeat, seed):
+    """Generate one dataset in a temporary directory and time everything against it."""
+    from synthetic_log import write_log
+    import speed_data
+    import web_interface
+    from speed_storage import CsvStorage
+    from speed_rollups import RollupStore
+
+    workdir = tempfile.mkdtemp(prefix='bench_suite_')
+    try:
+        web_interface.DATA_DIR = workdir
+        web_interface.CSV_PATH = os.path.join(workdir, 'internet_speed_log.csv')
+        web_interface.CONFIG_PATH = os.path.join(workdir, 'config.json')
+        config = web_interface.default_config()
+        config['storage']['csv_rotation'] = 'none'
+        web_interface.save_config(config)
+
+        start = time.perf_counter()
+        rows = write_log(web_interface.CSV_PATH, months, seed)
+        generate_s = time.perf_counter() - start
+        RollupStore.for_storage(CsvStorage(web_interface.CSV_PATH)).sync(CsvStorage(web_interface.CSV_PATH))
+
+        def cold_read():
+            speed_data._caches.clear()
+            return web_interface.read_speed_data()
+
+        functions = {'read_speed_data_cold': summarize(time_samples(cold_read, max(3, repeat // 4)))}
+        functions['read_speed_data'] = summarize(time_samples(web_interface.read_speed_data, repeat))
+        records = web_interface.read_speed_data()
+        frame = web_interface.read_speed_frame()
+        package = config['subscription_package']
+        functions['get_statistics'] = summarize(time_samples(lambda: web_interface.get_statistics(frame), repeat))
+        functions['filter_hourly_readings'] = summarize(
+            time_samples(lambda: web_interface.filter_hourly_readings(records), repeat))
+        functions['get_package_performance'] = summarize(
+            time_samples(lambda: web_interface.get_package_performance(frame, package), repeat))
+
+        client = web_interface.app.test_client()
+        with client.session_transaction() as session:
+            session['admin_logged_in'] = True
+            session['admin_username'] = config['admin']['username']
+
+        routes = {}
+        for url in route_urls(web_interface.app):
+            statuses = set()
+
+            def get():
+                response = client.get(url)
+                response.get_data()
+                statuses.add(response.status_code)
+
+            web_interface.response_cache._entries.clear()
+            routes[url] = summarize(time_samples(get, repeat))
+            routes[url]['status'] = sorted(statuses)
+
+        return {
+            'months': months,
+            'rows': rows,
+            'csv_bytes': os.path.getsize(web_interface.CSV_PATH),
+            'generate_s': round(generate_s, 3),
+            'functions': functions,
+            'routes': routes,
+            'peak_rss_kb': peak_rss_kb()
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_child(months, repeat, seed):
+    """Benchmark one dataset in a fresh interpreter and return its result."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', '--months', str(months),
+         '--repeat', str(repeat), '--seed', str(seed)],
+        check=True, stdout=subprocess.PIPE, cwd=BENCH_DIR
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the web interface on synthetic logs")
+    parser.add_argument('--months', default=','.join(str(m) for m in DEFAULT_MONTHS),
+                        help="Comma-separated dataset sizes in months")
+    parser.add_argument('--repeat', type=int, default=20, help="Calls per function and route")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for the synthetic logs")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [float(m) for m in args.months.split(',')]
+    if args.child:
+        import logging
+        logging.disable(logging.INFO)
+        print(json.dumps(bench_dataset(sizes[0], args.repeat, args.seed)))
+        return
+
+    report = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'datasets': []
+    }
+    for months in sizes:
+        print(f"Benchmarking {months:g} months...", file=sys.stderr)
+        report['datasets'].append(run_child(months, args.repeat, args.seed))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Synthetic Speed Log
+Writes a realistic internet_speed_log.csv covering any number of months:
+hourly tests with a few minutes of jitter, a daily congestion cycle, service
+restarts that shift the schedule, manual tests in between, runs of ERROR rows
+during outages, and a share of legacy 4-column rows as written by
+SimpleSpeedLogger (no server columns).
+
+Usage: python3 bench/synthetic_log.py output.csv [months] [seed]
+"""
+
+import os
+import sys
+import csv
+import numpy as np
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from speed_storage import CSV_HEADERS
+
+SERVERS = [('Vox', 'South Africa', 'Afrihost'), ('Cool Ideas', 'South Africa', 'Afrihost'),
+           ('Openserve', 'South Africa', 'Afrihost'), ('Rain', 'South Africa', 'Afrihost')]
+# Share of rows written by SimpleSpeedLogger, without server columns
+LEGACY_SHARE = 0.25
+# Outages (runs of 1-5 ERROR rows), manual tests and service restarts
+OUTAGES_PER_MONTH = 2
+MANUAL_TESTS_PER_DAY = 0.3
+RESTARTS_PER_MONTH = 1
+
+
+def generate_rows(months, seed=42, end=None):
+    """
+    Build the rows of a synthetic log, oldest first.
+
+    Returns:
+        List of CSV rows (lists of strings), 7 or 4 columns each
+    """
+    rng = np.random.default_rng(seed)
+    end = end or datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=round(months * 30.44))
+    hours = int((end - start).total_seconds() // 3600)
+
+    # Scheduled tests: hourly with jitter; each restart moves the schedule to a new minute
+    offsets = np.arange(hours, dtype=np.int64) * 3600 + rng.integers(-90, 90, hours)
+    restarts = np.sort(rng.choice(hours, size=min(hours, int(months * RESTARTS_PER_MONTH)), replace=False))
+    for restart in restarts:
+        offsets[restart:] += int(rng.integers(-1800, 1800))
+
+    manual = rng.integers(0, hours * 3600, int(hours / 24 * MANUAL_TESTS_PER_DAY))
+    epochs = np.sort(np.concatenate([offsets, manual])) + int(start.timestamp())
+    count = len(epochs)
+
+    # Errors come in runs of a few hours
+    errors = np.zeros(count, dtype=bool)
+    for outage in rng.choice(count, size=int(months * OUTAGES_PER_MONTH), replace=False):
+        errors[outage:outage + int(rng.integers(1, 6))] = True
+
+    hour_of_day = (epochs % 86400) / 3600
+    congestion = np.clip(np.cos((hour_of_day - 21) / 24 * 2 * np.pi), 0, None)
+    download = np.clip(rng.normal(92, 9, count) - 35 * congestion, 1, None)
+    upload = np.clip(rng.normal(19, 2, count) - 4 * congestion, 0.5, None)
+    ping = 8 + rng.gamma(2, 3, count) + 20 * congestion
+    legacy = rng.random(count) < LEGACY_SHARE
+    servers = rng.integers(0, len(SERVERS), count)
+
+    rows = []
+    for i in range(count):
+        timestamp = datetime.fromtimestamp(int(epochs[i])).strftime('%Y-%m-%d %H:%M:%S')
+        if errors[i]:
+            rows.append([timestamp] + ['ERROR'] * (3 if legacy[i] else len(CSV_HEADERS) - 1))
+            continue
+        row = [timestamp, f"{download[i]:.2f}", f"{upload[i]:.2f}", f"{ping[i]:.2f}"]
+        if not legacy[i]:
+            row.extend(SERVERS[servers[i]])
+        rows.append(row)
+    return rows
+
+
+def write_log(path, months, seed=42):
+    """Write a synthetic log to path. Returns the number of data rows."""
+    rows = generate_rows(months, seed)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADERS)
+        writer.writerows(rows)
+    return len(rows)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    path = sys.argv[1]
+    months = float(sys.argv[2]) if len(sys.argv) > 2 else 12
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 42
+    rows = write_log(path, months, seed)
+    print(f"Wrote {rows:,} rows ({months:g} months) to {path}")
+
+
+if __name__ == "__main__":
+    main()
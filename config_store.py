@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Configuration Store
+Keeps a parsed JSON config file in memory, re-reading it only when the file
+changes on disk, and writes it atomically so readers never see a partial file.
+"""
+
+import os
+import json
+import tempfile
+import threading
+
+
+def copy_json(value):
+    """Deep copy of JSON data (dicts, lists, scalars); much cheaper than copy.deepcopy."""
+    if isinstance(value, dict):
+        return {key: copy_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_json(item) for item in value]
+    return value
+
+
+class ConfigStore:
+    """Cached, write-through view of one JSON config file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._config = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def _stat_signature(self):
+        stat_info = os.stat(self.path)
+        return (stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns)
+
+    def load(self, defaults=None):
+        """
+        Return a private copy of the config, re-parsing the file only if it changed.
+
+        Args:
+            defaults: Optional callable returning a default config; its top-level
+                keys fill in whatever the file is missing
+
+        Raises:
+            FileNotFoundError: If the config file doesn't exist
+            ValueError: If the file isn't valid JSON
+        """
+        with self._lock:
+            signature = self._stat_signature()
+            if signature != self._signature:
+                with open(self.path, 'r') as f:
+                    config = json.load(f)
+                self.reads += 1
+                self._config = config
+                self._signature = signature
+            # Callers modify and save what they get, so never hand out the cached object
+            config = copy_json(self._config)
+        # Defaults go into each caller's copy, never the cache another caller may read without them
+        if defaults:
+            for key, value in defaults().items():
+                config.setdefault(key, value)
+        return config
+
+    def save(self, config):
+        """
+        Atomically replace the config file: write a temp file in the same
+        directory, fsync it and rename it over the original.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            mode = os.stat(self.path).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+
+        with self._lock:
+            fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(self.path) + '.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(config, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.chmod(temp_path, mode)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+                raise
+
+            self._config = copy_json(config)
+            self._signature = self._stat_signature()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_config_store(path):
+    """Shared ConfigStore per config file path."""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ConfigStore(path)
+        return _stores[path]
@@ -0,0 +1,31 @@
+#!/bin/bash
+
+# Internet Speed Logger Daemon Runner
+# This script runs the speed logger and web interface in a single process
+
+# Set working directory
+cd /home/user01/Desktop/internet_speed_logger
+
+# Set up logging
+exec > >(logger -t internet-speed-daemon -p user.info) 2>&1
+
+echo "Internet Speed Logger Daemon starting..."
+echo "Working directory: $(pwd)"
+echo "User: $(whoami)"
+echo "Date: $(date)"
+
+if [ -d "venv" ]; then
+    source venv/bin/activate
+fi
+
+# Check if uvicorn is available (optional, falls back to werkzeug)
+python3 -c "import uvicorn" 2>/dev/null
+if [ $? -ne 0 ]; then
+    echo "uvicorn not found, installing daemon dependencies..."
+    pip3 install -r daemon_requirements.txt || echo "Continuing with werkzeug's server"
+fi
+
+echo "Starting speed logger daemon, web interface on port 5000..."
+
+# Run tests every hour and serve the web interface
+exec python3 speed_daemon.py 1.0 --port 5000
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Chart Downsampling
+Reduces long time series to a bounded number of points before they are sent
+to the browser, while keeping the visual shape (LTTB) or the extremes (min/max).
+"""
+
+import numpy as np
+
+MODES = ('lttb', 'minmax')
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets point selection.
+
+    Args:
+        x: Monotonic x values (e.g. epoch seconds)
+        y: Values to preserve the shape of
+        threshold: Maximum number of points to keep
+
+    Returns:
+        Sorted int64 array of selected indices, including the first and last
+        point whenever threshold allows two
+    """
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n, dtype=np.int64)
+    if threshold < 3:
+        return np.array([0, n - 1][:max(threshold, 0)], dtype=np.int64)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket boundaries for the n - 2 interior points
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+
+        # Average of the next bucket (or the last point for the final bucket)
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+
+        # Pick the point forming the largest triangle with the previous pick and the next average
+        px, py = x[previous], y[previous]
+        areas = np.abs((px - avg_x) * (y[start:stop] - py) - (px - x[start:stop]) * (avg_y - py))
+        previous = start + int(areas.argmax())
+        selected[i + 1] = previous
+
+    return selected
+
+
+def minmax_indices(series, max_points, x=None):
+    """
+    Min/max-preserving bucket selection.
+
+    The index range is split into equal buckets and, for every series, the
+    positions of the bucket minimum and maximum are kept, so short outage dips
+    and spikes survive any amount of reduction. A max_points below
+    2 + 2 * len(series) leaves no room for one bucket, so LTTB on the first
+    series picks the points instead.
+
+    Args:
+        series: List of equally long value arrays sharing one x axis
+        max_points: Upper bound on the number of indices returned
+        x: Shared x values for the LTTB fallback (default: the index positions)
+
+    Returns:
+        Sorted int64 array of unique selected indices
+    """
+    n = len(series[0]) if series else 0
+    if n <= max_points:
+        return np.arange(n, dtype=np.int64)
+
+    # Each bucket contributes up to 2 indices per series, plus the two endpoints
+    buckets = (max_points - 2) // (2 * len(series))
+    if buckets < 1:
+        return lttb_indices(np.arange(n) if x is None else x, series[0], max_points)
+    size = -(-n // buckets)
+    offsets = np.arange(buckets, dtype=np.int64) * size
+
+    picks = [np.array([0, n - 1], dtype=np.int64)]
+    for values in series:
+        padded = np.empty(buckets * size, dtype=np.float64)
+        padded[:n] = values
+        grid = padded.reshape(buckets, size)
+
+        padded[n:] = np.inf
+        picks.append(offsets + grid.argmin(axis=1))
+        padded[n:] = -np.inf
+        picks.append(offsets + grid.argmax(axis=1))
+
+    indices = np.unique(np.concatenate(picks))
+    return indices[indices < n]
+
+
+def downsample_indices(x, series, max_points, mode='lttb'):
+    """
+    Select at most max_points indices from series sharing the x axis.
+
+    LTTB follows the first series (download speed on the dashboard); min/max
+    keeps the extremes of every series.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of: {', '.join(MODES)}")
+    if mode == 'lttb':
+        return lttb_indices(x, series[0], max_points)
+    return minmax_indices(series, max_points, x)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Durable Writer
+Crash-safe CSV appends for the loggers. Each batch of rows goes to disk in a
+single write and is synced according to a policy. A last line torn by a power
+cut (or the NUL bytes some filesystems leave behind) is cut off before the
+next append. Rows that can't be written because the card is read-only, full
+or failing are held in memory and written with the next successful append.
+"""
+
+import io
+import os
+import csv
+import time
+import fcntl
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 'always': fsync after every append, 'batch': group commit, 'os': leave it to the page cache
+FSYNC_POLICIES = ('always', 'batch', 'os')
+# Group commit syncs once this many rows are unsynced, and otherwise at most this long after a write
+GROUP_COMMIT_ROWS = 10
+GROUP_COMMIT_SECONDS = 300
+# Rows kept in memory while the file can't be written; the oldest are dropped beyond this
+MAX_BUFFERED_ROWS = 1000
+# How far back a torn tail is searched for the last complete line
+TAIL_SCAN_BYTES = 64 * 1024
+
+
+def torn_path_for(path):
+    """Where fragments cut off a torn log are kept for inspection."""
+    return path + '.torn'
+
+
+def fsync_directory(path):
+    """Persist a file's directory entry after it was created or renamed into place."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def open_locked(path, mode='a'):
+    """
+    Open a file under an exclusive flock. If the file was replaced (e.g. by a
+    rotation holding the same lock) while waiting, the new file is opened instead.
+    """
+    while True:
+        file = open(path, mode, newline='') if 'b' not in mode else open(path, mode)
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(file.fileno()).st_ino == os.stat(path).st_ino:
+                return file
+        except FileNotFoundError:
+            pass
+        file.close()
+
+
+def repair_torn_tail(path):
+    """
+    Cut an incomplete last line, and trailing NUL bytes, off a log file. The
+    fragment is appended to <path>.torn.
+
+    Returns:
+        Number of bytes removed
+    """
+    with open(path, 'rb') as file:
+        size = file.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        start = max(0, size - TAIL_SCAN_BYTES)
+        file.seek(start)
+        tail = file.read()
+    if tail.endswith(b'\n'):
+        return 0
+
+    cut = tail.rfind(b'\n') + 1
+    fragment = tail[cut:].rstrip(b'\0')
+    if fragment:
+        with open(torn_path_for(path), 'ab') as torn:
+            torn.write(fragment + b'\n')
+    os.truncate(path, start + cut)
+    logger.warning(f"Removed a torn last line of {size - start - cut} bytes from {path}: {fragment[:80]!r}")
+    return size - start - cut
+
+
+class DurableAppender:
+    """
+    Appends CSV rows to one file with a durability policy.
+
+    Args:
+        path: CSV file
+        header: Written first if the file is empty
+        policy: One of FSYNC_POLICIES
+
+    With 'batch', an append syncs when group_rows rows are unsynced or the
+    last sync is group_seconds old; otherwise a timer syncs the file
+    group_seconds after the first unsynced write, so an idle logger's rows
+    are never unsynced for longer than that. flush() syncs at once (the
+    loggers call it on shutdown).
+    """
+
+    def __init__(self, path, header=None, policy='always', group_rows=GROUP_COMMIT_ROWS,
+                 group_seconds=GROUP_COMMIT_SECONDS, max_buffered=MAX_BUFFERED_ROWS):
+        if policy not in FSYNC_POLICIES:
+            logger.warning(f"Unknown fsync policy '{policy}', using 'always'")
+            policy = 'always'
+        self.path = path
+        self.header = header
+        self.policy = policy
+        self.group_rows = group_rows
+        self.group_seconds = group_seconds
+        self.max_buffered = max_buffered
+        self.pending = []
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def append(self, rows):
+        """
+        Write rows (lists of values) after any still buffered ones.
+
+        Raises:
+            OSError: The file isn't writable; the rows stay buffered for the next append
+        """
+        with self._lock:
+            self.pending.extend(rows)
+            try:
+                self._write_pending()
+            except OSError as e:
+                dropped = len(self.pending) - self.max_buffered
+                if dropped > 0:
+                    del self.pending[:dropped]
+                    logger.error(f"Dropped the {dropped} oldest rows buffered for {self.path}")
+                logger.warning(f"Holding {len(self.pending)} row(s) in memory until {self.path} is writable: {e}")
+                raise
+
+    def flush(self):
+        """Write buffered rows and sync anything a group commit still holds. Returns False if rows remain buffered."""
+        with self._lock:
+            try:
+                if self.pending:
+                    self._write_pending(force_sync=True)
+                elif self._unsynced:
+                    with open(self.path, 'ab') as file:
+                        os.fsync(file.fileno())
+                    self._synced()
+            except OSError as e:
+                logger.warning(f"Could not flush {self.path}: {e}")
+                return False
+            return True
+
+    def _write_pending(self, force_sync=False):
+        if not self.pending:
+            return
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self.pending)
+
+        with open_locked(self.path, 'a+b') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size and os.pread(file.fileno(), 1, size - 1) != b'\n':
+                repair_torn_tail(self.path)
+                size = os.fstat(file.fileno()).st_size
+            data = buffer.getvalue().encode('utf-8')
+            if size == 0 and self.header:
+                header = io.StringIO()
+                csv.writer(header).writerow(self.header)
+                data = header.getvalue().encode('utf-8') + data
+
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(file.fileno(), view):]
+                if force_sync or self._sync_due(len(self.pending)):
+                    os.fsync(file.fileno())
+                    self._synced()
+                elif self.policy == 'batch':
+                    self._start_timer()
+            except OSError:
+                # Don't leave half the batch behind; it is rewritten from the buffer next time
+                try:
+                    os.ftruncate(file.fileno(), size)
+                except OSError:
+                    pass
+                raise
+        self.pending = []
+
+    def _sync_due(self, rows):
+        if self.policy == 'always':
+            return True
+        if self.policy == 'os':
+            return False
+        self._unsynced += rows
+        return (self._unsynced >= self.group_rows or
+                time.monotonic() - self._last_sync >= self.group_seconds)
+
+    def _start_timer(self):
+        """Sync the group commit group_seconds from now, unless an append or flush() does first."""
+        if self._timer is None:
+            self._timer = threading.Timer(self.group_seconds, self._timer_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timer_flush(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def _synced(self):
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+File Watcher
+Calls back when watched files change, using Linux inotify when available and
+falling back to polling os.stat() elsewhere.
+"""
+
+import os
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    """Return libc with inotify functions, or None if unavailable."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError, TypeError):
+        return None
+
+
+class FileWatcher:
+    """
+    Watch a set of files and invoke `callback(path)` when one changes.
+
+    Files are watched through their parent directories, so files that are
+    created, replaced by rename or deleted later are still noticed.
+    """
+
+    def __init__(self, paths, callback, poll_interval=2.0):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background watcher thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    def _run(self):
+        libc = _load_libc()
+        if libc is not None:
+            try:
+                self._run_inotify(libc)
+                return
+            except OSError as e:
+                logger.warning(f"inotify unavailable ({e}), falling back to polling")
+        self._run_polling()
+
+    def _notify(self, path):
+        try:
+            self.callback(path)
+        except Exception as e:
+            logger.error(f"File watcher callback failed for {path}: {e}")
+
+    def _run_inotify(self, libc):
+        fd = libc.inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        try:
+            by_dir = {}
+            for path in self.paths:
+                by_dir.setdefault(os.path.dirname(path), set()).add(os.path.basename(path))
+
+            watches = {}
+            for directory, names in by_dir.items():
+                wd = libc.inotify_add_watch(fd, directory.encode(), WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {directory}')
+                watches[wd] = (directory, names)
+
+            while not self._stop.is_set():
+                ready, _, _ = select.select([fd], [], [], self.poll_interval)
+                if not ready:
+                    continue
+                buffer = os.read(fd, 64 * 1024)
+                changed = set()
+                offset = 0
+                while offset + EVENT_HEADER.size <= len(buffer):
+                    wd, mask, cookie, length = EVENT_HEADER.unpack_from(buffer, offset)
+                    name = buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length]
+                    offset += EVENT_HEADER.size + length
+                    directory, names = watches.get(wd, (None, ()))
+                    name = name.rstrip(b'\0').decode(errors='replace')
+                    if name in names:
+                        changed.add(os.path.join(directory, name))
+                # One callback per file per batch of events
+                for path in changed:
+                    self._notify(path)
+        finally:
+            os.close(fd)
+
+    def _run_polling(self):
+        def signature(path):
+            try:
+                stat_info = os.stat(path)
+                return (stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns)
+            except OSError:
+                return None
+
+        last = {path: signature(path) for path in self.paths}
+        while not self._stop.wait(self.poll_interval):
+            for path in self.paths:
+                current = signature(path)
+                if current != last[path]:
+                    last[path] = current
+                    self._notify(path)
@@ -4,12 +4,16 @@ Internet Speed Logger
 A Python script that performs internet speed tests every hour and logs results to CSV.
 """
 
-import csv
-import time
 import datetime
-import speedtest
 import os
 import logging
+from speed_storage import open_storage
+from speed_rollups import RollupStore
+from attempt_events import AttemptEventLog
+from speed_engine import get_engine, SpeedTestEngine, RateLimitedError, SETTINGS_PATH
+from speedtest_config import SpeedtestConfig
+from speed_scheduler import TestScheduler, TestHistory
+from measurement_lock import measurement_lock
 from typing import Dict, Any
 
 class InternetSpeedLogger:
@@ -42,16 +46,29 @@ class InternetSpeedLogger:
         )
         self.logger = logging.getLogger(__name__)
         
-        # Initialize CSV file with headers if it doesn't exist
-        self._initialize_csv()
+        # Storage backend (CSV or SQLite) selected in config.json
+        self.storage = open_storage(self.csv_filename, self.csv_headers)
+        self.rollups = RollupStore.for_storage(self.storage)
+        
+        # Structured attempt events read by the web dashboard
+        self.events = AttemptEventLog.for_storage(self.storage)
+        
+        # Long-lived speedtest client, reused between runs
+        self.engine = get_engine()
+        
+        # Initialize storage with headers/schema if it doesn't exist
+        self._initialize_storage()
     
-    def _initialize_csv(self) -> None:
-        """Initialize CSV file with headers if it doesn't exist."""
-        if not os.path.exists(self.csv_filename):
-            with open(self.csv_filename, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(self.csv_headers)
-            self.logger.info(f"Created new CSV file: {self.csv_filename}")
+    def _initialize_storage(self) -> None:
+        """Initialize the CSV file or database if it doesn't exist."""
+        if self.storage.initialize():
+            self.logger.info(f"Created new {self.storage.backend} log: {self.storage.location}")
+        
+        # Make sure hourly/daily/weekly rollups cover everything already logged
+        try:
+            self.rollups.sync(self.storage)
+        except Exception as e:
+            self.logger.warning(f"Failed to sync rollups: {str(e)}")
     
     def perform_speed_test(self) -> Dict[str, Any]:
         """
@@ -62,45 +79,25 @@ class InternetSpeedLogger:
         """
         try:
             self.logger.info("Starting speed test...")
+            self.events.start()
             
-            # Initialize speedtest
-            st = speedtest.Speedtest()
+            # Best server by ping, then download and upload, on the shared client
+            with measurement_lock():
+                results = self.engine.run(on_phase=self._log_phase)
             
-            # Get best server based on ping
-            st.get_best_server()
-            
-            # Perform download test
-            self.logger.info("Testing download speed...")
-            download_speed = st.download()
-            
-            # Perform upload test
-            self.logger.info("Testing upload speed...")
-            upload_speed = st.upload()
-            
-            # Get server and connection info
-            server_info = st.get_best_server()
-            
-            # Convert speeds from bits/sec to Mbps
-            download_mbps = download_speed / 1_000_000
-            upload_mbps = upload_speed / 1_000_000
-            
-            results = {
-                "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "download_speed_mbps": round(download_mbps, 2),
-                "upload_speed_mbps": round(upload_mbps, 2),
-                "ping_ms": round(server_info["latency"], 2),
-                "server_name": server_info["name"],
-                "server_country": server_info["country"],
-                "isp": st.config["client"]["isp"]
-            }
-            
-            self.logger.info(f"Speed test completed: {download_mbps:.2f} Mbps down, "
-                           f"{upload_mbps:.2f} Mbps up, {server_info['latency']:.2f} ms ping")
+            self.logger.info(f"Speed test completed: {results['download_speed_mbps']:.2f} Mbps down, "
+                           f"{results['upload_speed_mbps']:.2f} Mbps up, {results['ping_ms']:.2f} ms ping")
+            self.events.success(results["download_speed_mbps"], results["upload_speed_mbps"], results["ping_ms"],
+                                results.get("phase_seconds"))
             
             return results
             
         except Exception as e:
             self.logger.error(f"Speed test failed: {str(e)}")
+            if isinstance(e, RateLimitedError):
+                self.events.rate_limited()
+            else:
+                self.events.failure(str(e))
             # Return error data
             return {
                 "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -112,21 +109,32 @@ class InternetSpeedLogger:
                 "isp": "ERROR"
             }
     
+    def _log_phase(self, phase: str) -> None:
+        """Log the download and upload phases as the engine reaches them."""
+        if phase == "download":
+            self.logger.info("Testing download speed...")
+        elif phase == "upload":
+            self.logger.info("Testing upload speed...")
+    
     def log_to_csv(self, results: Dict[str, Any]) -> None:
         """
-        Log speed test results to CSV file.
+        Log speed test results to the configured storage backend.
         
         Args:
             results (Dict): Speed test results to log
         """
         try:
-            with open(self.csv_filename, 'a', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                row = [results[header] for header in self.csv_headers]
-                writer.writerow(row)
-            self.logger.info(f"Results logged to {self.csv_filename}")
+            self.storage.append(results)
+            self.logger.info(f"Results logged to {self.storage.location}")
         except Exception as e:
             self.logger.error(f"Failed to write to CSV: {str(e)}")
+            self.events.write_error(e)
+            return
+        
+        try:
+            self.rollups.add_result(results)
+        except Exception as e:
+            self.logger.warning(f"Failed to update rollups: {str(e)}")
     
     def run_continuous_test(self, interval_hours: int = 1) -> None:
         """
@@ -135,27 +143,35 @@ class InternetSpeedLogger:
         Args:
             interval_hours (int): Hours between tests (default: 1)
         """
-        interval_seconds = interval_hours * 3600
         self.logger.info(f"Starting continuous speed testing every {interval_hours} hour(s)")
-        self.logger.info(f"Results will be saved to: {os.path.abspath(self.csv_filename)}")
+        self.logger.info(f"Results will be saved to: {os.path.abspath(self.storage.location)}")
         self.logger.info("Press Ctrl+C to stop")
+        self.events.service_started(interval_hours)
+        scheduler = TestScheduler(SpeedtestConfig(SETTINGS_PATH), TestHistory(self.storage), interval_hours)
         
         try:
             while True:
+                # Wait for the next interval boundary (plus jitter, backoff and daily quota)
+                next_run = scheduler.next_run()
+                if next_run > datetime.datetime.now():
+                    self.logger.info(f"Next test at {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+                    scheduler.wait_until(next_run)
+                
                 # Perform speed test
                 results = self.perform_speed_test()
                 
                 # Log results to CSV
                 self.log_to_csv(results)
                 
-                # Wait for next test
-                self.logger.info(f"Waiting {interval_hours} hour(s) until next test...")
-                time.sleep(interval_seconds)
-                
         except KeyboardInterrupt:
             self.logger.info("Speed testing stopped by user")
         except Exception as e:
             self.logger.error(f"Unexpected error: {str(e)}")
+        finally:
+            # Write any results still held in memory while the log was unwritable
+            if not self.storage.flush():
+                self.logger.error("Some results could not be written before stopping")
+            self.events.service_stopped()
     
     def run_single_test(self) -> None:
         """Run a single speed test and log the results."""
@@ -190,6 +206,11 @@ def main():
     
     args = parser.parse_args()
     
+    if not SpeedTestEngine.available():
+        print("Error: the speedtest module is not installed")
+        print("Install it with: pip install speedtest-cli")
+        raise SystemExit(1)
+    
     # Create logger instance
     logger = InternetSpeedLogger(csv_filename=args.output)
     
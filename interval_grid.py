@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Interval Grid Alignment
+Picks the readings that form a regular test schedule (e.g. one per hour) out
+of a log that also holds manual tests, retries and restarts.
+
+The schedule is modelled as a grid of slots `interval` seconds apart. Its
+phase (where in the interval the scheduled tests land) is the one most
+readings agree with, estimated separately for each block of BLOCK_SLOTS slots
+so a service restart or clock jump only affects the block it happens in.
+Every slot then keeps the single reading closest to its centre, if one is
+within the tolerance.
+"""
+
+import numpy as np
+
+# Resolution of the phase estimate
+PHASE_BIN_SECONDS = 60
+# Slots per block that gets its own phase estimate (a week of hourly tests)
+BLOCK_SLOTS = 168
+# Default tolerance as a fraction of the interval (25 minutes for hourly tests)
+DEFAULT_TOLERANCE = 25 / 60
+
+
+def grid_phases(timestamps, interval, tolerance):
+    """
+    Grid phase for every reading, in seconds into the interval.
+
+    Args:
+        timestamps: Sorted int64 epoch seconds (non-empty)
+        interval: Grid spacing in seconds
+        tolerance: How far from the phase a reading still counts towards it
+
+    Returns:
+        Float64 array with the phase of each reading's block
+    """
+    bins = max(1, int(round(interval / PHASE_BIN_SECONDS)))
+    bin_width = interval / bins
+    _, blocks = np.unique((timestamps - timestamps[0]) // int(interval * BLOCK_SLOTS), return_inverse=True)
+    block_count = blocks.max() + 1
+
+    phase = np.mod(timestamps, interval).astype(np.float64)
+    phase_bin = np.minimum((phase / bin_width).astype(np.int64), bins - 1)
+    counts = np.bincount(blocks * bins + phase_bin, minlength=block_count * bins).reshape(block_count, bins)
+
+    # Readings within the tolerance of each candidate phase bin (the window wraps around the interval)
+    half = min(int(tolerance // bin_width), (bins - 1) // 2)
+    if half:
+        counts = np.concatenate([counts[:, -half:], counts, counts[:, :half]], axis=1)
+    cumulative = np.concatenate([np.zeros((block_count, 1), dtype=np.int64), np.cumsum(counts, axis=1)], axis=1)
+    support = cumulative[:, 2 * half + 1:] - cumulative[:, :bins]
+    centres = (support.argmax(axis=1) + 0.5) * bin_width
+
+    # Refine each block's phase to the mean offset of the readings that agree with it
+    offset = np.mod(phase - centres[blocks] + interval / 2, interval) - interval / 2
+    inliers = np.abs(offset) <= tolerance
+    inlier_count = np.bincount(blocks[inliers], minlength=block_count)
+    inlier_sum = np.bincount(blocks[inliers], weights=offset[inliers], minlength=block_count)
+    refined = centres + np.divide(inlier_sum, inlier_count, out=np.zeros(block_count), where=inlier_count > 0)
+    return refined[blocks]
+
+
+def grid_indices(timestamps, interval=3600, tolerance=None):
+    """
+    Readings that follow a regular schedule, one per grid slot.
+
+    Args:
+        timestamps: Sorted int64 epoch seconds
+        interval: Schedule interval in seconds
+        tolerance: Allowed distance from a slot centre in seconds
+            (default DEFAULT_TOLERANCE of the interval, at most half of it)
+
+    Returns:
+        Sorted int64 array of indices, the reading closest to each occupied slot's centre
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if not len(timestamps):
+        return np.empty(0, dtype=np.int64)
+    if tolerance is None:
+        tolerance = interval * DEFAULT_TOLERANCE
+    tolerance = min(tolerance, interval / 2)
+
+    position = (timestamps - grid_phases(timestamps, interval, tolerance)) / interval
+    slots = np.round(position).astype(np.int64)
+    deviation = np.abs(position - slots) * interval
+    candidates = np.flatnonzero(deviation <= tolerance)
+    if not len(candidates):
+        return candidates
+
+    # Slots are already nearly sorted, so the stable sort runs in about linear time
+    order = candidates[np.argsort(slots[candidates], kind='stable')]
+    sorted_slots = slots[order]
+    sorted_deviation = deviation[order]
+    starts = np.flatnonzero(np.r_[True, sorted_slots[1:] != sorted_slots[:-1]])
+    closest = np.minimum.reduceat(sorted_deviation, starts)
+
+    # First reading of each slot at the slot's smallest deviation
+    best = np.flatnonzero(sorted_deviation == np.repeat(closest, np.diff(np.r_[starts, len(order)])))
+    groups = np.searchsorted(starts, best, side='right')
+    best = best[np.r_[True, groups[1:] != groups[:-1]]]
+    return np.sort(order[best])
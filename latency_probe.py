@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Latency Probe
+Low-cost asyncio prober that measures TCP connect or UDP round-trip times to a
+few targets every few seconds, between the full speed tests, and records
+per-minute latency percentiles, jitter and packet loss.
+
+Targets are written as 'tcp://host:port' or 'udp://host:port'. UDP probes send
+a minimal DNS query, so public resolvers (udp://1.1.1.1:53) and plain echo
+servers both answer them.
+"""
+
+import os
+import csv
+import time
+import struct
+import asyncio
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROBE_SETTINGS = {
+    "enabled": False,
+    "interval_seconds": 5,
+    "timeout_seconds": 2,
+    "targets": ["tcp://1.1.1.1:443", "udp://1.1.1.1:53"]
+}
+
+LATENCY_HEADERS = [
+    "minute",
+    "target",
+    "sent",
+    "received",
+    "loss_pct",
+    "min_ms",
+    "p50_ms",
+    "p95_ms",
+    "max_ms",
+    "avg_ms",
+    "jitter_ms"
+]
+
+# DNS query for the root NS records: id 0x5350, recursion desired, one question
+DNS_PROBE = struct.pack('>HHHHHH', 0x5350, 0x0100, 1, 0, 0, 0) + b'\x00' + struct.pack('>HH', 2, 1)
+
+
+def latency_path_for(log_path):
+    """Per-minute latency log that sits next to a raw CSV log or SQLite database."""
+    return os.path.splitext(log_path)[0] + '.latency.csv'
+
+
+def parse_target(target):
+    """Split 'tcp://host:port' into ('tcp', host, port)."""
+    scheme, _, address = target.partition('://')
+    host, _, port = address.rpartition(':')
+    if scheme not in ('tcp', 'udp') or not host or not port.isdigit():
+        raise ValueError(f"Invalid probe target '{target}', expected tcp://host:port or udp://host:port")
+    return scheme, host.strip('[]'), int(port)
+
+
+async def probe_tcp(host, port, timeout):
+    """TCP connect time in milliseconds, or None on timeout/failure."""
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    elapsed = (time.perf_counter() - start) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return elapsed
+
+
+class _ReplyProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.reply = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        if not self.reply.done():
+            self.reply.set_result(time.perf_counter())
+
+    def error_received(self, exc):
+        if not self.reply.done():
+            self.reply.set_exception(exc)
+
+
+async def probe_udp(host, port, timeout):
+    """UDP request/reply round-trip time in milliseconds, or None on timeout/failure."""
+    loop = asyncio.get_running_loop()
+    try:
+        transport, protocol = await loop.create_datagram_endpoint(_ReplyProtocol, remote_addr=(host, port))
+    except OSError:
+        return None
+    try:
+        start = time.perf_counter()
+        transport.sendto(DNS_PROBE)
+        received = await asyncio.wait_for(protocol.reply, timeout)
+        return (received - start) * 1000
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        transport.close()
+
+
+def _percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[round(q * (len(sorted_values) - 1))]
+
+
+class MinuteAggregate:
+    """Probe results for one target within one wall-clock minute."""
+
+    def __init__(self, minute, target):
+        self.minute = minute
+        self.target = target
+        self.sent = 0
+        self.rtts = []
+
+    def add(self, rtt_ms):
+        self.sent += 1
+        if rtt_ms is not None:
+            self.rtts.append(rtt_ms)
+
+    def to_row(self):
+        received = len(self.rtts)
+        row = {
+            "minute": self.minute,
+            "target": self.target,
+            "sent": self.sent,
+            "received": received,
+            "loss_pct": round((self.sent - received) / self.sent * 100, 1) if self.sent else 0.0
+        }
+        if not received:
+            return {**row, **{h: '' for h in LATENCY_HEADERS[5:]}}
+
+        ordered = sorted(self.rtts)
+        # Jitter as the mean absolute difference between consecutive round trips
+        deltas = [abs(b - a) for a, b in zip(self.rtts, self.rtts[1:])]
+        row.update({
+            "min_ms": round(ordered[0], 2),
+            "p50_ms": round(_percentile(ordered, 0.5), 2),
+            "p95_ms": round(_percentile(ordered, 0.95), 2),
+            "max_ms": round(ordered[-1], 2),
+            "avg_ms": round(sum(ordered) / received, 2),
+            "jitter_ms": round(sum(deltas) / len(deltas), 2) if deltas else 0.0
+        })
+        return row
+
+
+class LatencyLog:
+    """Append-only CSV of per-minute aggregates."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, rows):
+        new_file = not os.path.exists(self.path)
+        with open(self.path, 'a', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=LATENCY_HEADERS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+
+
+class LatencyProber:
+    """
+    Probes every target once per interval and hands finished minutes to `sink`
+    (a callable taking a list of row dicts).
+    """
+
+    def __init__(self, targets, sink, interval_seconds=5, timeout_seconds=2):
+        self.targets = [(target, parse_target(target)) for target in targets]
+        self.sink = sink
+        self.interval = interval_seconds
+        self.timeout = min(timeout_seconds, interval_seconds)
+        self._current = {}
+        self._paused = threading.Event()
+
+    def pause(self):
+        """Stop probing (e.g. while a full speed test loads the link)."""
+        self._paused.set()
+
+    def resume(self):
+        self._paused.clear()
+
+    async def probe_once(self):
+        """Probe all targets concurrently. Returns {target: rtt_ms or None}."""
+        probes = {'tcp': probe_tcp, 'udp': probe_udp}
+        results = await asyncio.gather(*(
+            probes[scheme](host, port, self.timeout) for _, (scheme, host, port) in self.targets
+        ))
+        return {target: rtt for (target, _), rtt in zip(self.targets, results)}
+
+    def record(self, results, now=None):
+        """Fold one round of results into the current minute, flushing the previous one."""
+        minute = (now or datetime.now()).strftime('%Y-%m-%d %H:%M:00')
+        finished = [agg for agg in self._current.values() if agg.minute != minute]
+        if finished:
+            self._flush(finished)
+            self._current = {t: a for t, a in self._current.items() if a.minute == minute}
+
+        for target, rtt in results.items():
+            if target not in self._current:
+                self._current[target] = MinuteAggregate(minute, target)
+            self._current[target].add(rtt)
+
+    def _flush(self, aggregates):
+        try:
+            self.sink([agg.to_row() for agg in aggregates])
+        except Exception as e:
+            logger.error(f"Failed to write latency aggregates: {e}")
+
+    def flush(self):
+        """Write out the minute in progress."""
+        if self._current:
+            self._flush(list(self._current.values()))
+            self._current = {}
+
+    async def run(self, stop_event=None, rounds=None):
+        """
+        Probe until stop_event (a threading.Event) is set or `rounds` rounds
+        are done, keeping rounds aligned to the interval.
+        """
+        loop = asyncio.get_running_loop()
+        next_round = loop.time()
+        done = 0
+        try:
+            while not (stop_event and stop_event.is_set()) and (rounds is None or done < rounds):
+                if not self._paused.is_set():
+                    self.record(await self.probe_once())
+                    done += 1
+                next_round += self.interval
+                await asyncio.sleep(max(0.0, next_round - loop.time()))
+        finally:
+            self.flush()
+
+    def start_thread(self, stop_event):
+        """Run the prober on its own event loop in a daemon thread."""
+        thread = threading.Thread(
+            target=lambda: asyncio.run(self.run(stop_event)),
+            name='latency-probe',
+            daemon=True
+        )
+        thread.start()
+        return thread
+
+
+class _EchoDatagram(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(data, addr)
+
+
+async def start_echo_server(host='127.0.0.1', port=0):
+    """
+    Local stand-in target: a TCP server that accepts and closes connections
+    and a UDP echo server on the same port.
+
+    Returns:
+        (port, close) where close() shuts both down
+    """
+    async def handle(reader, writer):
+        writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    port = server.sockets[0].getsockname()[1]
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(_EchoDatagram, local_addr=(host, port))
+
+    def close():
+        server.close()
+        transport.close()
+    return port, close
+
+
+def main():
+    """Command line entry point: probe targets, or run the local echo server."""
+    parser = argparse.ArgumentParser(description="Latency / jitter / packet loss probe")
+    parser.add_argument("--target", action="append", help="tcp://host:port or udp://host:port (repeatable)")
+    parser.add_argument("--interval", type=float, default=DEFAULT_PROBE_SETTINGS["interval_seconds"], help="Seconds between probes")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_PROBE_SETTINGS["timeout_seconds"], help="Probe timeout in seconds")
+    parser.add_argument("--rounds", type=int, help="Stop after this many rounds")
+    parser.add_argument("--output", default=latency_path_for("internet_speed_log.csv"), help="Per-minute CSV output")
+    parser.add_argument("--echo-server", type=int, metavar="PORT", help="Run a local TCP/UDP echo server instead")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.echo_server is not None:
+        async def serve():
+            port, _ = await start_echo_server('127.0.0.1', args.echo_server)
+            logger.info(f"Echo server listening on tcp/udp 127.0.0.1:{port}")
+            await asyncio.Event().wait()
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        return
+
+    log = LatencyLog(args.output)
+
+    def sink(rows):
+        log.append(rows)
+        for row in rows:
+            logger.info(f"{row['minute']} {row['target']}: p50 {row['p50_ms']} ms, "
+                        f"jitter {row['jitter_ms']} ms, loss {row['loss_pct']}%")
+
+    prober = LatencyProber(args.target or DEFAULT_PROBE_SETTINGS["targets"], sink, args.interval, args.timeout)
+    try:
+        asyncio.run(prober.run(rounds=args.rounds))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Logger Control Socket
+A tiny line-delimited JSON request/response protocol on a local Unix socket,
+so the web interface can ask the running logger to reload its settings (or
+report its status) instead of restarting the systemd service.
+"""
+
+import os
+import json
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONTROL_SOCKET_PATH = os.path.join(BASE_DIR, 'speed_logger.sock')
+
+MAX_MESSAGE_BYTES = 64 * 1024
+
+
+def _read_line(conn):
+    data = b''
+    while not data.endswith(b'\n') and len(data) < MAX_MESSAGE_BYTES:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def send_control(message, path=CONTROL_SOCKET_PATH, timeout=5):
+    """
+    Send one command to the running logger and return its response.
+
+    Raises:
+        OSError: No logger is listening (FileNotFoundError, ConnectionRefusedError) or it timed out
+        ValueError: The response isn't valid JSON
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        conn.connect(path)
+        conn.sendall(json.dumps(message).encode() + b'\n')
+        return json.loads(_read_line(conn))
+
+
+class ControlServer:
+    """
+    Serves `handler(message) -> dict` on a Unix socket from a background thread.
+
+    Requests are handled one at a time; commands are expected to be quick.
+    """
+
+    def __init__(self, handler, path=CONTROL_SOCKET_PATH):
+        self.handler = handler
+        self.path = path
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Bind the socket and start serving. Returns False if another logger already owns it."""
+        if os.path.exists(self.path):
+            try:
+                send_control({'command': 'status'}, self.path, timeout=1)
+                logger.warning(f"Control socket {self.path} is in use by another logger")
+                return False
+            except (OSError, ValueError):
+                os.unlink(self.path)  # left behind by a logger that didn't shut down cleanly
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        os.chmod(self.path, 0o660)
+        self._sock.listen(4)
+        self._sock.settimeout(1.0)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve, name='logger-control', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._sock is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self._sock.close()
+        self._sock = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            with conn:
+                conn.settimeout(5)
+                try:
+                    self._handle(conn)
+                except OSError as e:
+                    logger.warning(f"Control connection failed: {e}")
+
+    def _handle(self, conn):
+        try:
+            response = self.handler(json.loads(_read_line(conn)))
+        except ValueError:
+            response = {'ok': False, 'error': 'Invalid JSON request'}
+        except Exception as e:
+            logger.error(f"Control command failed: {e}")
+            response = {'ok': False, 'error': str(e)}
+        conn.sendall(json.dumps(response).encode() + b'\n')
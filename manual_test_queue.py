@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Manual Test Queue
+Dashboard-triggered speed tests run one at a time on a single worker thread.
+Every request gets a job id whose progress (queued, then the ping, download
+and upload phases, then done or failed) can be polled. Asking for a test
+while one is already queued or running returns that job instead of starting
+a second, overlapping measurement.
+"""
+
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from speed_engine import PHASES
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept so clients can still poll their outcome
+JOB_HISTORY_SIZE = 20
+
+
+class ManualTestJob:
+    """One queued manual test and its progress."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.status = 'queued'  # queued, running, done or failed
+        self.phase = None       # current entry of speed_engine.PHASES while running
+        self.message = None
+        self.results = None
+        self.queued_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def progress(self):
+        """Fraction of the test completed, by phase."""
+        if self.status in ('done', 'failed'):
+            return 1.0
+        if self.phase not in PHASES:
+            return 0.0
+        return round(PHASES.index(self.phase) / len(PHASES), 2)
+
+    def to_dict(self):
+        def isoformat(when):
+            return when.isoformat() if when else None
+
+        return {
+            'id': self.id,
+            'status': self.status,
+            'phase': self.phase,
+            'phases': list(PHASES),
+            'progress': self.progress(),
+            'message': self.message,
+            'results': self.results,
+            'queued_at': isoformat(self.queued_at),
+            'started_at': isoformat(self.started_at),
+            'finished_at': isoformat(self.finished_at)
+        }
+
+
+class ManualTestQueue:
+    """
+    Single-worker queue of manual speed tests.
+
+    Args:
+        run_test: Callable(on_phase) -> (success, message, results) performing one test
+        on_change: Optional callable(reason) called when a job starts, changes phase or finishes
+    """
+
+    def __init__(self, run_test, on_change=None, history_size=JOB_HISTORY_SIZE):
+        self.run_test = run_test
+        self.on_change = on_change or (lambda reason: None)
+        self.history_size = history_size
+        self._jobs = OrderedDict()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self):
+        """
+        Queue a test unless one is already queued or running.
+
+        Returns:
+            (job, created) where created is False if an existing job was returned
+        """
+        with self._lock:
+            active = self._active_job()
+            if active:
+                return active, False
+
+            job = ManualTestJob()
+            self._jobs[job.id] = job
+            self._trim()
+            self._queue.put(job)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._work, name='manual-test', daemon=True)
+                self._worker.start()
+        self.on_change('manual test queued')
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_job(self):
+        """The queued or running job, or None."""
+        with self._lock:
+            return self._active_job()
+
+    def _active_job(self):
+        for job in reversed(self._jobs.values()):
+            if job.active:
+                return job
+        return None
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond history_size."""
+        for job_id in [job_id for job_id, job in self._jobs.items() if not job.active]:
+            if len(self._jobs) <= self.history_size:
+                break
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.status = 'running'
+            job.started_at = datetime.now()
+            self.on_change('manual test started')
+
+            def on_phase(phase):
+                job.phase = phase
+                self.on_change(f'manual test {phase}')
+
+            try:
+                success, job.message, job.results = self.run_test(on_phase)
+                job.status = 'done' if success else 'failed'
+            except Exception as e:
+                logger.error(f"Manual test job {job.id} failed: {e}")
+                job.status = 'failed'
+                job.message = f"Error running speed test: {str(e)}"
+            job.finished_at = datetime.now()
+            logger.info(f"Manual test job {job.id} {job.status}: {job.message}")
+            self.on_change('manual test finished')
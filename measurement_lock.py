@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Measurement Lock
+One speed test at a time per host. Both loggers and the web interface's
+manual tests take this lock around a measurement, so a manual test clicked
+during a scheduled one waits instead of splitting the link's bandwidth with
+it. It is an flock on a file next to the logs, so it works across the
+separate logger and web processes and is released if a process dies.
+"""
+
+import os
+import fcntl
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MEASUREMENT_LOCK_PATH = os.path.join(BASE_DIR, 'speed_test.lock')
+
+
+@contextmanager
+def measurement_lock(path=MEASUREMENT_LOCK_PATH):
+    """Hold the measurement lock for the duration of the block, waiting for any running test."""
+    # flock belongs to the open file, so each holder (even in the same process) opens its own
+    with open(path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.info("Another speed test is running, waiting for it to finish")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def measurement_running(path=MEASUREMENT_LOCK_PATH):
+    """True if some process currently holds the measurement lock."""
+    try:
+        with open(path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
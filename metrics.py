@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Metrics
+In-process counters and histograms for the web interface (and anything
+running in its process, e.g. the daemon's scheduler), rendered in the
+Prometheus text exposition format for /metrics and summarised as JSON for
+the admin dashboard.
+
+Values live in memory and start from zero when the process starts.
+"""
+
+import math
+import time
+import threading
+from contextlib import ContextDecorator
+
+# Bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SPEEDTEST_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120)
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric family with a fixed set of label names."""
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def series(self):
+        """(label dict, value) for every label combination seen so far."""
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labels, key)), value) for key, value in items]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_series(key, value) for key, value in items)
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_series(self, key, value):
+        return f"{self.name}{_label_text(self.labels, key)} {_number(value)}"
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call, so concurrent calls don't share a start time
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            state['counts'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def time(self, **labels):
+        """Context manager (or decorator) observing the wall time of its block."""
+        return _Timer(self, labels)
+
+    def quantile(self, state, q):
+        """Estimate a quantile from bucket counts, interpolating within the bucket like Prometheus does."""
+        if not state['count']:
+            return None
+        rank = q * state['count']
+        seen = 0
+        for i, count in enumerate(state['counts']):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i]
+                if upper == math.inf:
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-2]
+
+    def summarize(self, state):
+        return {
+            'count': state['count'],
+            'sum': state['sum'],
+            'mean': state['sum'] / state['count'] if state['count'] else None,
+            'p50': self.quantile(state, 0.5),
+            'p95': self.quantile(state, 0.95)
+        }
+
+    def _render_series(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_label_text(self.labels, key, [('le', _number(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(state['sum'])}")
+        lines.append(f"{self.name}_count{_label_text(self.labels, key)} {state['count']}")
+        return '\n'.join(lines)
+
+
+class Registry:
+    """Metric families by name; registering an existing name returns the existing metric."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help, labels, buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'speedlogger_http_request_duration_seconds',
+    'Time to build a web interface response, by route', ('route', 'method', 'status'))
+STAGE_SECONDS = REGISTRY.histogram(
+    'speedlogger_stage_duration_seconds',
+    'Time spent parsing stored results, computing statistics and serializing JSON', ('stage',))
+CACHE_REQUESTS = REGISTRY.counter(
+    'speedlogger_cache_requests_total',
+    'Cache lookups by cache and result (hit or miss)', ('cache', 'result'))
+SUBPROCESS_SPAWNS = REGISTRY.counter(
+    'speedlogger_subprocess_spawns_total',
+    'External commands started by this process', ('command',))
+SPEEDTEST_PHASE_SECONDS = REGISTRY.histogram(
+    'speedlogger_speedtest_phase_duration_seconds',
+    'Speed test phase durations reported by the loggers', ('phase',), SPEEDTEST_BUCKETS)
+SPEEDTEST_ATTEMPTS = REGISTRY.counter(
+    'speedlogger_speedtest_attempts_total',
+    'Speed test attempts reported by the loggers, by outcome', ('result',))
+
+
+def cache_lookup(cache, hit):
+    """Count one lookup in a named cache."""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def _merged(histogram, group):
+    """Histogram states summed over every label except those `group` picks out."""
+    merged = {}
+    for labels, state in histogram.series():
+        key = group(labels)
+        total = merged.setdefault(key, {'counts': [0] * len(histogram.buckets), 'sum': 0.0, 'count': 0})
+        total['counts'] = [a + b for a, b in zip(total['counts'], state['counts'])]
+        total['sum'] += state['sum']
+        total['count'] += state['count']
+    return {key: histogram.summarize(state) for key, state in sorted(merged.items())}
+
+
+def _rounded(value, scale=1, digits=2):
+    return None if value is None else round(value * scale, digits)
+
+
+def summary():
+    """JSON-friendly digest of the metrics for the admin dashboard."""
+    errors = {}
+    for labels, state in REQUEST_SECONDS.series():
+        if labels['status'].startswith('5'):
+            route = f"{labels['method']} {labels['route']}"
+            errors[route] = errors.get(route, 0) + state['count']
+
+    routes = {}
+    for route, stats in _merged(REQUEST_SECONDS, lambda l: f"{l['method']} {l['route']}").items():
+        routes[route] = {
+            'count': stats['count'],
+            'avg_ms': _rounded(stats['mean'], 1000),
+            'p50_ms': _rounded(stats['p50'], 1000),
+            'p95_ms': _rounded(stats['p95'], 1000),
+            'errors': errors.get(route, 0)
+        }
+
+    stages = {}
+    for stage, stats in _merged(STAGE_SECONDS, lambda l: l['stage']).items():
+        stages[stage] = {
+            'count': stats['count'],
+            'total_s': _rounded(stats['sum'], digits=3),
+            'avg_ms': _rounded(stats['mean'], 1000),
+            'p95_ms': _rounded(stats['p95'], 1000)
+        }
+
+    caches = {}
+    for labels, count in CACHE_REQUESTS.series():
+        cache = caches.setdefault(labels['cache'], {'hits': 0, 'misses': 0})
+        cache['hits' if labels['result'] == 'hit' else 'misses'] += count
+    for cache in caches.values():
+        cache['hit_rate'] = round(cache['hits'] / (cache['hits'] + cache['misses']), 3)
+
+    phases = {}
+    for phase, stats in _merged(SPEEDTEST_PHASE_SECONDS, lambda l: l['phase']).items():
+        phases[phase] = {
+            'count': stats['count'],
+            'avg_s': _rounded(stats['mean']),
+            'p95_s': _rounded(stats['p95'])
+        }
+
+    return {
+        'routes': routes,
+        'stages': stages,
+        'caches': dict(sorted(caches.items())),
+        'subprocesses': {labels['command']: count for labels, count in SUBPROCESS_SPAWNS.series()},
+        'speedtest_phases': phases,
+        'speedtest_attempts': {labels['result']: count for labels, count in SPEEDTEST_ATTEMPTS.series()}
+    }
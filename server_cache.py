@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Speedtest Server Selection Cache
+Remembers the closest speedtest.net servers and their recent latencies per
+ISP and client IP, so a run only re-probes the few best candidates instead of
+downloading the whole server list and pinging the closest servers every time.
+"""
+
+import os
+import time
+import statistics
+from config_store import get_config_store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_CACHE_PATH = os.path.join(BASE_DIR, 'server_cache.json')
+
+# Latencies kept per candidate and cache entries (ISP/IP pairs) kept in the file
+LATENCY_HISTORY = 5
+MAX_ENTRIES = 8
+
+# speedtest-cli scores each failed latency request as 3600 s (in a 6-way average)
+UNREACHABLE_MS = 600_000
+
+
+def cache_key(client_config):
+    """Cache key for a speedtest client config: 'ISP|IP'."""
+    client = client_config.get('client', {})
+    return f"{client.get('isp', '')}|{client.get('ip', '')}"
+
+
+def _server_ids(servers):
+    return sorted(str(s) for s in servers or [])
+
+
+def _rank_latency(candidate):
+    latencies = candidate.get('latencies') or []
+    return statistics.median(latencies) if latencies else float('inf')
+
+
+class ServerSelectionCache:
+    """Ranked speedtest server candidates per ISP/IP, persisted as JSON with a TTL."""
+
+    def __init__(self, path=SERVER_CACHE_PATH, ttl_hours=24):
+        self.store = get_config_store(path)
+        self.ttl_seconds = ttl_hours * 3600
+
+    def _load(self):
+        try:
+            return self.store.load()
+        except (FileNotFoundError, ValueError):
+            return {'entries': {}}
+
+    def candidates(self, key, preferred=None, exclude=None):
+        """
+        Ranked server dicts for a key, best first.
+
+        Returns:
+            List of server dicts, or None when there is no fresh entry made with
+            the same preferred/excluded servers
+        """
+        entry = self._load().get('entries', {}).get(key)
+        if not entry:
+            return None
+        if time.time() - entry.get('updated', 0) > self.ttl_seconds:
+            return None
+        if entry.get('preferred') != _server_ids(preferred) or entry.get('exclude') != _server_ids(exclude):
+            return None
+
+        excluded = set(_server_ids(exclude))
+        ranked = sorted(entry.get('candidates', []), key=_rank_latency)
+        servers = [c['server'] for c in ranked if str(c['server'].get('id')) not in excluded]
+        return servers or None
+
+    def store_candidates(self, key, probes, preferred=None, exclude=None):
+        """
+        Replace the entry for a key after a full server list refresh.
+
+        Args:
+            probes: List of (latency_ms, server) for every candidate probed
+        """
+        candidates = [
+            {'server': self._plain(server), 'latencies': [round(latency, 3)]}
+            for latency, server in probes
+        ]
+        self._save_entry(key, {
+            'updated': time.time(),
+            'preferred': _server_ids(preferred),
+            'exclude': _server_ids(exclude),
+            'candidates': candidates
+        })
+
+    def record_probes(self, key, probes):
+        """Append fresh latencies for re-probed candidates of an existing entry."""
+        data = self._load()
+        entry = data.get('entries', {}).get(key)
+        if not entry:
+            return
+        fresh = {str(server.get('id')): latency for latency, server in probes}
+        for candidate in entry['candidates']:
+            latency = fresh.get(str(candidate['server'].get('id')))
+            if latency is not None:
+                candidate['latencies'] = (candidate.get('latencies', []) + [round(latency, 3)])[-LATENCY_HISTORY:]
+        entry['candidates'].sort(key=_rank_latency)
+        self._save_entry(key, entry, data)
+
+    def invalidate(self, key):
+        data = self._load()
+        if data.get('entries', {}).pop(key, None) is not None:
+            self.store.save(data)
+
+    def _save_entry(self, key, entry, data=None):
+        data = data or self._load()
+        entries = data.setdefault('entries', {})
+        entries[key] = entry
+        # Keep only the most recently refreshed ISP/IP pairs
+        for stale in sorted(entries, key=lambda k: entries[k].get('updated', 0))[:-MAX_ENTRIES]:
+            del entries[stale]
+        self.store.save(data)
+
+    @staticmethod
+    def _plain(server):
+        """Server dict without the per-probe latency."""
+        return {k: v for k, v in server.items() if k != 'latency'}
@@ -14,15 +14,17 @@ echo "Working directory: $(pwd)"
 echo "User: $(whoami)"
 echo "Date: $(date)"
 
-# Check if speedtest-cli is available
-if ! command -v speedtest-cli &> /dev/null; then
+# Check if speedtest-cli is available (the Python library is used in-process, the command is the fallback)
+if python3 -c "import speedtest" &> /dev/null; then
+    echo "speedtest library found: $(python3 -c 'import speedtest; print(speedtest.__file__)')"
+elif command -v speedtest-cli &> /dev/null; then
+    echo "speedtest-cli found: $(which speedtest-cli)"
+else
     echo "ERROR: speedtest-cli not found in PATH"
     echo "Available in PATH: $PATH"
     exit 1
 fi
 
-echo "speedtest-cli found: $(which speedtest-cli)"
-
 # Check if the simple speed logger exists
 if [ ! -f "simple_speed_logger.py" ]; then
     echo "ERROR: simple_speed_logger.py not found"
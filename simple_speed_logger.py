@@ -4,13 +4,24 @@ Simple Internet Speed Logger
 A simplified version that can work with system-installed packages.
 """
 
-import csv
 import time
 import datetime
 import subprocess
 import json
-import os
 import logging
+import threading
+from speed_storage import open_storage, CONFIG_PATH
+from speed_rollups import RollupStore
+from attempt_events import AttemptEventLog
+from speed_engine import get_engine, SpeedTestEngine, SpeedTestError, RateLimitedError, SETTINGS_PATH
+from speedtest_config import SpeedtestConfig
+from latency_probe import LatencyProber, LatencyLog, latency_path_for
+from speed_scheduler import TestScheduler, TestHistory
+from config_store import get_config_store
+from file_watcher import FileWatcher
+from logger_control import ControlServer
+from measurement_lock import measurement_lock
+from metrics import SUBPROCESS_SPAWNS
 
 class SimpleSpeedLogger:
     def __init__(self, csv_filename="internet_speed_log.csv"):
@@ -29,84 +40,90 @@ class SimpleSpeedLogger:
         )
         self.logger = logging.getLogger(__name__)
         
-        # Initialize CSV file
-        self._initialize_csv()
+        # Storage backend (CSV or SQLite) selected in config.json
+        self.storage = open_storage(self.csv_filename, self.csv_headers)
+        self.rollups = RollupStore.for_storage(self.storage)
+        
+        # Structured attempt events read by the web dashboard
+        self.events = AttemptEventLog.for_storage(self.storage)
+        
+        # In-process speedtest client when the library is importable, speedtest-cli otherwise
+        self.engine = get_engine() if SpeedTestEngine.available() else None
+        
+        # Retry settings from speedtest_settings.json (reloaded live by run_continuous)
+        self.retry_settings = SpeedtestConfig(SETTINGS_PATH).config["retry_settings"]
+        
+        # Optional latency/jitter/loss prober that runs between full tests
+        self.latency_prober = None
+        
+        # Scheduling state of run_continuous, updated when the settings files change
+        self.interval_hours = None
+        self.scheduler = None
+        self.next_run = None
+        self.settings_changed = threading.Event()
+        self._settings_lock = threading.Lock()
+        self._watcher = None
+        self._control = None
+        self._initialize_storage()
     
-    def _initialize_csv(self):
-        """Initialize CSV file with headers if it doesn't exist."""
-        if not os.path.exists(self.csv_filename):
-            with open(self.csv_filename, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(self.csv_headers)
-            self.logger.info(f"Created new CSV file: {self.csv_filename}")
+    def _initialize_storage(self):
+        """Initialize the CSV file or database if it doesn't exist."""
+        if self.storage.initialize():
+            self.logger.info(f"Created new {self.storage.backend} log: {self.storage.location}")
+        
+        # Make sure hourly/daily/weekly rollups cover everything already logged
+        try:
+            self.rollups.sync(self.storage)
+        except Exception as e:
+            self.logger.warning(f"Failed to sync rollups: {str(e)}")
     
-    def perform_speed_test(self):
-        """Perform speed test using speedtest-cli command with retry logic."""
-        max_retries = 3
-        retry_delays = [30, 120, 300]  # 30s, 2m, 5m
+    def perform_speed_test(self, max_retries=None, on_phase=None):
+        """
+        Perform speed test with retry logic, in-process or via the speedtest-cli command.
+        
+        on_phase receives 'ping', 'download' and 'upload' as the in-process engine reaches them.
+        """
+        max_retries = max_retries or self.retry_settings.get("max_retries", 3)
+        # Progressive delays, 30s, 2m, 5m by default; the last one repeats if there are more retries
+        delays = self.retry_settings.get("retry_delays") or [30, 120, 300]
+        retry_delays = delays + [delays[-1]] * max(0, max_retries - len(delays))
         
         for attempt in range(max_retries):
             try:
                 self.logger.info(f"Starting speed test... (attempt {attempt + 1}/{max_retries})")
+                self.events.start(attempt + 1, max_retries)
                 
-                # Enhanced speedtest-cli command with timeout and secure connection
-                cmd = [
-                    'speedtest-cli', 
-                    '--json',
-                    '--timeout', '60',  # Reduced timeout
-                    '--secure',         # Use HTTPS
-                    '--single'          # Use single connection to reduce load
-                ]
-                
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True, 
-                    text=True, 
-                    timeout=120
-                )
-                
-                if result.returncode != 0:
-                    error_msg = result.stderr.strip()
-                    
-                    # Check for specific error types
-                    if "403" in error_msg or "Forbidden" in error_msg:
-                        self.logger.warning(f"HTTP 403 error on attempt {attempt + 1}: Rate limited")
-                        if attempt < max_retries - 1:
-                            delay = retry_delays[attempt]
-                            self.logger.info(f"Waiting {delay} seconds before retry...")
-                            time.sleep(delay)
-                            continue
-                    elif "Cannot retrieve speedtest configuration" in error_msg:
-                        self.logger.warning(f"Configuration error on attempt {attempt + 1}")
-                        if attempt < max_retries - 1:
-                            delay = retry_delays[attempt]
-                            self.logger.info(f"Waiting {delay} seconds before retry...")
-                            time.sleep(delay)
-                            continue
-                    
-                    raise Exception(f"speedtest-cli failed: {error_msg}")
-                
-                data = json.loads(result.stdout)
-                
-                # Extract data and convert to Mbps
-                download_mbps = round(data['download'] / 1_000_000, 2)
-                upload_mbps = round(data['upload'] / 1_000_000, 2)
-                ping_ms = round(data['ping'], 2)
+                # Never measure at the same time as another logger or a manual test
+                with measurement_lock():
+                    if self.engine:
+                        results = self.engine.run(on_phase=on_phase)
+                    else:
+                        results = self._run_speedtest_cli()
                 
-                results = {
-                    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "download_speed_mbps": download_mbps,
-                    "upload_speed_mbps": upload_mbps,
-                    "ping_ms": ping_ms
-                }
+                download_mbps = results["download_speed_mbps"]
+                upload_mbps = results["upload_speed_mbps"]
+                ping_ms = results["ping_ms"]
                 
                 self.logger.info(f"Speed test completed: {download_mbps} Mbps down, "
                                f"{upload_mbps} Mbps up, {ping_ms} ms ping")
+                self.events.success(download_mbps, upload_mbps, ping_ms, results.get("phase_seconds"))
                 
                 return results
                 
+            except RateLimitedError:
+                self.logger.warning(f"HTTP 403 error on attempt {attempt + 1}: Rate limited")
+                self.events.rate_limited()
+                if attempt < max_retries - 1:
+                    delay = retry_delays[attempt]
+                    self.logger.info(f"Waiting {delay} seconds before retry...")
+                    time.sleep(delay)
+                    continue
+                else:
+                    self.logger.error("Speed test rate limited after all retries")
+                    return self._error_result()
             except subprocess.TimeoutExpired:
                 self.logger.warning(f"Speed test timed out on attempt {attempt + 1}")
+                self.events.failure(f"Timed out on attempt {attempt + 1}")
                 if attempt < max_retries - 1:
                     delay = retry_delays[attempt]
                     self.logger.info(f"Waiting {delay} seconds before retry...")
@@ -117,6 +134,7 @@ class SimpleSpeedLogger:
                     return self._error_result()
             except Exception as e:
                 self.logger.warning(f"Speed test failed on attempt {attempt + 1}: {str(e)}")
+                self.events.failure(str(e))
                 if attempt < max_retries - 1:
                     delay = retry_delays[attempt]
                     self.logger.info(f"Waiting {delay} seconds before retry...")
@@ -126,6 +144,46 @@ class SimpleSpeedLogger:
                     self.logger.error(f"Speed test failed after all retries: {str(e)}")
                     return self._error_result()
     
+    def _run_speedtest_cli(self):
+        """Run one test with the speedtest-cli command (when the library can't be imported)."""
+        # Enhanced speedtest-cli command with timeout and secure connection
+        cmd = [
+            'speedtest-cli', 
+            '--json',
+            '--timeout', '60',  # Reduced timeout
+            '--secure',         # Use HTTPS
+            '--single'          # Use single connection to reduce load
+        ]
+        
+        SUBPROCESS_SPAWNS.inc(command='speedtest-cli')
+        result = subprocess.run(
+            cmd,
+            capture_output=True, 
+            text=True, 
+            timeout=120
+        )
+        
+        if result.returncode != 0:
+            error_msg = result.stderr.strip()
+            
+            # Check for specific error types
+            if "403" in error_msg or "Forbidden" in error_msg:
+                raise RateLimitedError(error_msg)
+            elif "Cannot retrieve speedtest configuration" in error_msg:
+                raise SpeedTestError("Cannot retrieve speedtest configuration")
+            
+            raise SpeedTestError(f"speedtest-cli failed: {error_msg}")
+        
+        data = json.loads(result.stdout)
+        
+        # Extract data and convert to Mbps
+        return {
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "download_speed_mbps": round(data['download'] / 1_000_000, 2),
+            "upload_speed_mbps": round(data['upload'] / 1_000_000, 2),
+            "ping_ms": round(data['ping'], 2)
+        }
+    
     def _error_result(self):
         """Return error result."""
         return {
@@ -136,15 +194,125 @@ class SimpleSpeedLogger:
         }
     
     def log_to_csv(self, results):
-        """Log results to CSV."""
+        """Log results to the configured storage backend."""
         try:
-            with open(self.csv_filename, 'a', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                row = [results[header] for header in self.csv_headers]
-                writer.writerow(row)
-            self.logger.info(f"Results logged to {self.csv_filename}")
+            self.storage.append(results)
+            self.logger.info(f"Results logged to {self.storage.location}")
         except Exception as e:
             self.logger.error(f"Failed to write to CSV: {str(e)}")
+            self.events.write_error(e)
+            return
+        
+        try:
+            self.rollups.add_result(results)
+        except Exception as e:
+            self.logger.warning(f"Failed to update rollups: {str(e)}")
+    
+    def create_latency_prober(self):
+        """Latency prober configured in speedtest_settings.json, or None if it is disabled."""
+        settings = SpeedtestConfig(SETTINGS_PATH).config.get("latency_probe", {})
+        if not settings.get("enabled") or not settings.get("targets"):
+            return None
+        
+        try:
+            prober = LatencyProber(
+                settings["targets"],
+                LatencyLog(latency_path_for(self.storage.location)).append,
+                interval_seconds=settings.get("interval_seconds", 5),
+                timeout_seconds=settings.get("timeout_seconds", 2)
+            )
+        except ValueError as e:
+            self.logger.error(f"Latency probe disabled: {str(e)}")
+            return None
+        
+        self.latency_prober = prober
+        self.logger.info(f"Probing latency to {', '.join(settings['targets'])} every {prober.interval}s")
+        return prober
+    
+    def _configured_interval(self):
+        """config.json's interval once it has been set from the admin panel, the command line interval otherwise."""
+        try:
+            test_settings = get_config_store(CONFIG_PATH).load().get("test_settings", {})
+        except (FileNotFoundError, ValueError):
+            return self.interval_hours
+        if test_settings.get("last_updated") and test_settings.get("interval_hours"):
+            return float(test_settings["interval_hours"])
+        return self.interval_hours
+    
+    def reload_settings(self):
+        """
+        Re-read speedtest_settings.json and config.json and apply them without a
+        restart: test interval and backoff to the scheduler, server preferences
+        to the engine (from its next run on) and retry settings to the next test.
+        """
+        with self._settings_lock:
+            settings = SpeedtestConfig(SETTINGS_PATH)
+            self.retry_settings = settings.config["retry_settings"]
+            if self.engine:
+                self.engine.configure(settings)
+            
+            if self.scheduler:
+                old_config = self.scheduler.settings.config
+                self.scheduler.update(settings, self._configured_interval())
+                if self.scheduler.base_interval_hours != old_config["test_interval"]["hours"]:
+                    self.logger.info(f"Test interval changed to {self.scheduler.base_interval_hours} hour(s)")
+                if settings.config != old_config:
+                    # Let a waiting run_continuous recompute its next run
+                    self.settings_changed.set()
+    
+    def handle_control(self, message):
+        """Handle a control socket command ('status' or 'reload')."""
+        command = message.get("command")
+        if command == "reload":
+            self.reload_settings()
+        elif command != "status":
+            return {"ok": False, "error": f"Unknown command '{command}'"}
+        return {
+            "ok": True,
+            "interval_hours": self.scheduler.base_interval_hours if self.scheduler else self.interval_hours,
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "testing": bool(self.engine and self.engine.is_busy())
+        }
+    
+    def start_service(self, interval_hours):
+        """
+        Set up scheduled testing: service event, scheduler, live settings
+        reload and the control socket. Undone by stop_service().
+        """
+        self.events.service_started(interval_hours)
+        self.interval_hours = interval_hours
+        self.scheduler = TestScheduler(SpeedtestConfig(SETTINGS_PATH), TestHistory(self.storage), interval_hours)
+        self.reload_settings()
+        
+        # Pick up settings changes live instead of being restarted by update_interval.sh
+        self._watcher = FileWatcher([SETTINGS_PATH, CONFIG_PATH], lambda path: self.reload_settings())
+        self._watcher.start()
+        self._control = ControlServer(self.handle_control)
+        if not self._control.start():
+            self._control = None
+    
+    def stop_service(self):
+        if self._control:
+            self._control.stop()
+        if self._watcher:
+            self._watcher.stop()
+        # Write any results still held in memory while the log was unwritable
+        if not self.storage.flush():
+            self.logger.error("Some results could not be written before stopping")
+        self.events.service_stopped()
+    
+    def run_scheduled_test(self):
+        """Run and log one test with the latency prober paused. Returns the results."""
+        # Keep probe traffic off the link (and loaded latency out of the aggregates) during a test
+        if self.latency_prober:
+            self.latency_prober.pause()
+        try:
+            results = self.perform_speed_test()
+        finally:
+            if self.latency_prober:
+                self.latency_prober.resume()
+        self.log_to_csv(results)
+        return results
     
     def run_continuous(self, interval_hours=1):
         """Run continuous speed tests."""
@@ -152,22 +320,47 @@ class SimpleSpeedLogger:
         self.logger.info(f"Starting continuous speed testing every {interval_hours} hour(s)")
         self.logger.info("Press Ctrl+C to stop")
         
+        # A zero interval is the dashboard's manual test run, not the service
+        probe_stop = threading.Event()
+        probe_thread = None
+        if interval_hours > 0:
+            self.start_service(interval_hours)
+            prober = self.create_latency_prober()
+            if prober:
+                probe_thread = prober.start_thread(probe_stop)
+        
         try:
             while True:
-                results = self.perform_speed_test()
-                self.log_to_csv(results)
-                self.logger.info(f"Waiting {interval_hours} hour(s) until next test...")
-                time.sleep(interval_seconds)
+                # Runs land on interval boundaries (plus jitter), with backoff and the daily quota applied
+                if self.scheduler:
+                    self.settings_changed.clear()
+                    self.next_run = self.scheduler.next_run()
+                    if self.next_run > datetime.datetime.now():
+                        self.logger.info(f"Next test at {self.next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+                        if not self.scheduler.wait_until(self.next_run, self.settings_changed):
+                            continue  # settings changed, recompute the next run
+                
+                self.run_scheduled_test()
+                if not self.scheduler:
+                    time.sleep(interval_seconds)
         except KeyboardInterrupt:
             self.logger.info("Speed testing stopped by user")
+        finally:
+            if probe_thread:
+                # Let the prober write out the minute in progress
+                probe_stop.set()
+                probe_thread.join(timeout=self.latency_prober.interval + self.latency_prober.timeout + 1)
+            if interval_hours > 0:
+                self.stop_service()
 
 if __name__ == "__main__":
     import sys
     
-    # Check if speedtest-cli is available
+    # Check if speedtest-cli is available (as a library or a command)
     try:
-        subprocess.run(['speedtest-cli', '--version'], 
-                      capture_output=True, check=True)
+        if not SpeedTestEngine.available():
+            subprocess.run(['speedtest-cli', '--version'], 
+                          capture_output=True, check=True)
     except (subprocess.CalledProcessError, FileNotFoundError):
         print("Error: speedtest-cli is not installed or not in PATH")
         print("Install it with: sudo apt install speedtest-cli")
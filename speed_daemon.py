@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Speed Logger Daemon
+Optional single-process mode: one asyncio event loop runs the test scheduler
+(and latency prober) and serves the web interface, so the logger and the
+dashboard share one interpreter, one speed test engine and one in-memory
+dataset instead of running as two services that only meet in the CSV file.
+
+The web app is served by uvicorn (through wsgi_adapter) when
+daemon_requirements.txt is installed, and by werkzeug's threaded server
+otherwise.
+
+Usage: python3 speed_daemon.py [interval_hours] [--host HOST] [--port PORT]
+"""
+
+import sys
+import asyncio
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+try:
+    import uvicorn
+except ImportError:  # daemon_requirements.txt not installed
+    uvicorn = None
+
+import web_interface
+from speed_engine import SpeedTestEngine
+from wsgi_adapter import ThreadedWsgiAdapter
+
+logger = logging.getLogger(__name__)
+
+# How often a pending wait checks whether the settings changed
+WAKE_POLL_SECONDS = 1.0
+# How long open connections (e.g. dashboard event streams) may delay shutdown
+SHUTDOWN_GRACE_SECONDS = 5
+
+
+async def wait_until(when, wake):
+    """
+    Sleep until the wall clock reaches `when` without blocking the loop.
+
+    Returns:
+        True if `when` was reached, False if `wake` (a threading.Event) was set first
+    """
+    while True:
+        if wake.is_set():
+            wake.clear()
+            return False
+        remaining = (when - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return True
+        await asyncio.sleep(min(remaining, WAKE_POLL_SECONDS))
+
+
+if uvicorn is not None:
+    class DaemonServer(uvicorn.Server):
+        async def shutdown(self, sockets=None):
+            # End open event streams first instead of waiting out the grace period
+            web_interface.change_notifier.close()
+            await super().shutdown(sockets=sockets)
+
+
+class SpeedDaemon:
+    """Scheduler, latency prober and web server on one event loop."""
+
+    def __init__(self, interval_hours=1, host='0.0.0.0', port=5000):
+        self.interval_hours = interval_hours
+        self.host = host
+        self.port = port
+        # The dashboard's manual test logger, so scheduled and manual tests share one engine and lock
+        self.speed_logger = web_interface.get_manual_test_logger()
+        self._probe_stop = threading.Event()
+
+    async def run_scheduler(self):
+        """Run scheduled tests forever; the blocking test itself runs in a worker thread."""
+        loop = asyncio.get_running_loop()
+        speed_logger = self.speed_logger
+        while True:
+            speed_logger.settings_changed.clear()
+            speed_logger.next_run = speed_logger.scheduler.next_run()
+            if speed_logger.next_run > datetime.now():
+                logger.info(f"Next test at {speed_logger.next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+                if not await wait_until(speed_logger.next_run, speed_logger.settings_changed):
+                    continue  # settings changed, recompute the next run
+
+            await loop.run_in_executor(None, speed_logger.run_scheduled_test)
+            # Same process as the dashboard: push the new result to /api/stream clients right away
+            web_interface.change_notifier.notify('scheduled test')
+
+    async def serve_http(self):
+        """Serve the Flask app until the server is asked to stop (Ctrl+C / SIGTERM)."""
+        if uvicorn is not None:
+            config = uvicorn.Config(ThreadedWsgiAdapter(web_interface.app), host=self.host, port=self.port,
+                                    lifespan='off', log_level='info',
+                                    timeout_graceful_shutdown=SHUTDOWN_GRACE_SECONDS)
+            await DaemonServer(config).serve()
+            return
+
+        from werkzeug.serving import make_server
+        logger.info("uvicorn not installed, serving with werkzeug's threaded server")
+        server = make_server(self.host, self.port, web_interface.app, threaded=True)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, server.serve_forever)
+        finally:
+            server.shutdown()
+
+    async def run(self):
+        self.speed_logger.start_service(self.interval_hours)
+        tasks = [asyncio.create_task(self.run_scheduler())]
+        prober = self.speed_logger.create_latency_prober()
+        if prober:
+            tasks.append(asyncio.create_task(prober.run(self._probe_stop)))
+
+        try:
+            await self.serve_http()
+        finally:
+            # End open event streams so their worker threads don't hold up the exit
+            web_interface.change_notifier.close()
+            self._probe_stop.set()
+            self.speed_logger.stop_service()
+            logger.info("Speed logger daemon stopped")
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed logger and web dashboard in one process")
+    parser.add_argument("interval_hours", nargs="?", type=float, default=1.0, help="Hours between scheduled tests")
+    parser.add_argument("--host", default="0.0.0.0", help="Address the web interface listens on")
+    parser.add_argument("--port", type=int, default=5000, help="Port the web interface listens on")
+    args = parser.parse_args()
+
+    if args.interval_hours <= 0:
+        parser.error("interval_hours must be positive")
+    if not SpeedTestEngine.available():
+        print("Error: the speedtest Python library is required for daemon mode")
+        print("Install it with: pip install speedtest-cli")
+        sys.exit(1)
+
+    daemon = SpeedDaemon(args.interval_hours, args.host, args.port)
+    logger.info(f"Starting speed logger daemon: tests every {args.interval_hours} hour(s), "
+                f"web interface on {args.host}:{args.port}")
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,645 @@
+#!/usr/bin/env python3
+"""
+Speed Data Cache
+Keeps the parsed speed test log in memory as NumPy columns and only parses rows
+appended since the last read. Compressed monthly segments of a rotated CSV log
+are parsed only when a requested time window reaches back into them.
+"""
+
+import os
+import io
+import csv
+import gzip
+import calendar
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from speed_storage import SqliteStorage, load_segment_manifest, overlapping_segments
+from metrics import STAGE_SECONDS, cache_lookup
+
+logger = logging.getLogger(__name__)
+
+SERVER_FIELDS = ['server_name', 'server_country', 'isp']
+MISSING_CODE = -1
+
+
+def datetime_to_epoch(dt):
+    """Convert a naive local datetime to the epoch seconds used by the columns."""
+    return calendar.timegm(dt.timetuple())
+
+
+def parse_timestamps(timestamps):
+    """
+    Parse 'YYYY-MM-DD HH:MM:SS' strings into int64 epoch seconds.
+
+    Timestamps are stored as naive wall-clock time, exactly as written by the
+    loggers, so no timezone conversion is applied. Unparseable values become
+    None in the fallback path.
+    """
+    try:
+        parsed = np.array(timestamps, dtype='datetime64[s]')
+        if not np.isnat(parsed).any():
+            return parsed.astype(np.int64)
+    except ValueError:
+        pass
+
+    epochs = []
+    for timestamp in timestamps:
+        try:
+            value = np.datetime64(timestamp, 's')
+            epochs.append(None if np.isnat(value) else int(value.astype(np.int64)))
+        except ValueError:
+            epochs.append(None)
+    return epochs
+
+
+def format_timestamps(epochs):
+    """Format an int64 epoch array back into 'YYYY-MM-DD HH:MM:SS' strings."""
+    if len(epochs) == 0:
+        return []
+    strings = np.datetime_as_string(np.asarray(epochs).astype('datetime64[s]'))
+    return [s.replace('T', ' ') for s in strings.tolist()]
+
+
+def as_float64(values):
+    """Widen float32 samples back to the two-decimal values stored in the CSV."""
+    return np.round(values.astype(np.float64), 2)
+
+
+class Categorical:
+    """Append-only string dictionary mapping values to integer codes."""
+
+    def __init__(self):
+        self.categories = []
+        self._codes = {}
+
+    def code(self, value):
+        if value is None:
+            return MISSING_CODE
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(value)
+            self._codes[value] = code
+        return code
+
+    def decode(self, codes):
+        categories = self.categories
+        return [categories[c] if c >= 0 else None for c in codes.tolist()]
+
+
+class SpeedFrame:
+    """
+    Immutable columnar view of speed samples sorted by timestamp.
+
+    Attributes:
+        timestamps: int64 epoch seconds
+        download, upload, ping: float32 measurements
+        codes: dict of int32 categorical codes for server_name, server_country and isp
+        has_server_info (bool): Whether the source log carries the server columns
+    """
+
+    def __init__(self, timestamps, download, upload, ping, codes, categoricals, has_server_info):
+        self.timestamps = timestamps
+        self.download = download
+        self.upload = upload
+        self.ping = ping
+        self.codes = codes
+        self.categoricals = categoricals
+        self.has_server_info = has_server_info
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def take(self, selector):
+        """Return a new frame with rows selected by a slice, mask or index array."""
+        return SpeedFrame(
+            self.timestamps[selector],
+            self.download[selector],
+            self.upload[selector],
+            self.ping[selector],
+            {field: codes[selector] for field, codes in self.codes.items()},
+            self.categoricals,
+            self.has_server_info
+        )
+
+    def locate(self, start_epoch=None, end_epoch=None):
+        """
+        Binary-search the sorted timestamp column for a time window.
+
+        Returns:
+            (start, stop) row indices covering start_epoch <= timestamp < end_epoch
+        """
+        start = 0 if start_epoch is None else int(np.searchsorted(self.timestamps, start_epoch, side='left'))
+        stop = len(self) if end_epoch is None else int(np.searchsorted(self.timestamps, end_epoch, side='left'))
+        return start, max(start, stop)
+
+    def window(self, start_epoch=None, end_epoch=None):
+        """Rows with start_epoch <= timestamp < end_epoch, as a zero-copy view."""
+        return self.take(slice(*self.locate(start_epoch, end_epoch)))
+
+    def since(self, epoch):
+        """Rows with a timestamp at or after the given epoch."""
+        return self.window(epoch)
+
+    def tail(self, count):
+        """The last `count` rows."""
+        return self.take(slice(-count, None) if count > 0 else slice(0, 0))
+
+    def timestamp_at(self, index):
+        return format_timestamps(self.timestamps[index:index + 1 or None])[0]
+
+    def to_records(self):
+        """Materialize rows as the dicts historically returned by read_speed_data()."""
+        columns = {
+            'timestamp': format_timestamps(self.timestamps),
+            'download_speed_mbps': as_float64(self.download).tolist(),
+            'upload_speed_mbps': as_float64(self.upload).tolist(),
+            'ping_ms': as_float64(self.ping).tolist()
+        }
+        if self.has_server_info:
+            for field in SERVER_FIELDS:
+                columns[field] = self.categoricals[field].decode(self.codes[field])
+
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def concat_frames(frames):
+    """
+    Join frames into one sorted frame, re-coding their categorical columns
+    into shared dictionaries.
+    """
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+
+    categoricals = {field: Categorical() for field in SERVER_FIELDS}
+    codes = {}
+    for field in SERVER_FIELDS:
+        parts = []
+        for frame in frames:
+            # The extra last entry maps MISSING_CODE (-1) to itself
+            mapping = np.array(
+                [categoricals[field].code(value) for value in frame.categoricals[field].categories] + [MISSING_CODE],
+                dtype=np.int32
+            )
+            parts.append(mapping[frame.codes[field]])
+        codes[field] = np.concatenate(parts)
+
+    combined = SpeedFrame(
+        np.concatenate([frame.timestamps for frame in frames]),
+        np.concatenate([frame.download for frame in frames]),
+        np.concatenate([frame.upload for frame in frames]),
+        np.concatenate([frame.ping for frame in frames]),
+        codes,
+        categoricals,
+        any(frame.has_server_info for frame in frames)
+    )
+    if np.any(np.diff(combined.timestamps) < 0):
+        combined = combined.take(np.argsort(combined.timestamps, kind='stable'))
+    return combined
+
+
+class SpeedColumns:
+    """Growable NumPy column store backing the cache."""
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.download = np.empty(capacity, dtype=np.float32)
+        self.upload = np.empty(capacity, dtype=np.float32)
+        self.ping = np.empty(capacity, dtype=np.float32)
+        self.codes = {field: np.empty(capacity, dtype=np.int32) for field in SERVER_FIELDS}
+        self.categoricals = {field: Categorical() for field in SERVER_FIELDS}
+
+    def _arrays(self):
+        return [self.timestamps, self.download, self.upload, self.ping] + list(self.codes.values())
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        capacity = len(self.timestamps)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        # Fresh arrays, so views held by older snapshots stay untouched
+        grown = []
+        for array in self._arrays():
+            new_array = np.empty(capacity, dtype=array.dtype)
+            new_array[:self.size] = array[:self.size]
+            grown.append(new_array)
+        self.timestamps, self.download, self.upload, self.ping = grown[:4]
+        self.codes = dict(zip(SERVER_FIELDS, grown[4:]))
+
+    def append(self, epochs, download, upload, ping, server_values):
+        """Append parsed rows; server_values maps each server field to a list of strings/None."""
+        count = len(epochs)
+        if not count:
+            return
+        self._reserve(count)
+        start, end = self.size, self.size + count
+
+        self.timestamps[start:end] = epochs
+        self.download[start:end] = download
+        self.upload[start:end] = upload
+        self.ping[start:end] = ping
+        for field in SERVER_FIELDS:
+            categorical = self.categoricals[field]
+            self.codes[field][start:end] = [categorical.code(v) for v in server_values[field]]
+        self.size = end
+
+        if np.any(np.diff(self.timestamps[max(start - 1, 0):end]) < 0):
+            # Sort into fresh arrays so older snapshots keep their view of the previous order
+            order = np.argsort(self.timestamps[:end], kind='stable')
+            resorted = []
+            for array in self._arrays():
+                new_array = np.empty_like(array)
+                new_array[:end] = array[:end][order]
+                resorted.append(new_array)
+            self.timestamps, self.download, self.upload, self.ping = resorted[:4]
+            self.codes = dict(zip(SERVER_FIELDS, resorted[4:]))
+
+    def snapshot(self, has_server_info):
+        n = self.size
+        return SpeedFrame(
+            self.timestamps[:n],
+            self.download[:n],
+            self.upload[:n],
+            self.ping[:n],
+            {field: codes[:n] for field, codes in self.codes.items()},
+            self.categoricals,
+            has_server_info
+        )
+
+
+class SpeedDataCache:
+    """
+    Process-wide cache of the parsed speed test CSV.
+
+    The file is stat'ed on every access. When size and mtime are unchanged the
+    previously built snapshot is returned as-is; when the file has grown only
+    the bytes after the last parsed offset are read. Truncation, replacement or
+    in-place edits trigger a full reload.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._version = 0
+        self._reset()
+
+    @property
+    def version(self):
+        """Counter bumped whenever the snapshot changes; call get_frame() first to refresh."""
+        return self._version
+
+    def _reset(self):
+        """Forget everything parsed so far."""
+        self._fieldnames = None
+        self._offset = 0
+        self._inode = None
+        self._size = 0
+        self._mtime_ns = 0
+        self._columns = SpeedColumns()
+        self._set_frame(self._columns.snapshot(False))
+        self._records = None
+
+    def _set_frame(self, frame):
+        self._frame = frame
+        self._version += 1
+
+    def refresh(self):
+        """Bring the snapshot (and version) up to date with the storage."""
+        with self._lock:
+            try:
+                self._refresh()
+            except Exception as e:
+                logger.error(f"Error reading speed data from {self.path}: {e}")
+
+    def get_frame(self, start_epoch=None, end_epoch=None):
+        """
+        Return the current columnar snapshot, sorted by timestamp.
+
+        A single file or database is always fully loaded, so the window is
+        ignored here; see SegmentedSpeedDataCache.
+        """
+        self.refresh()
+        return self._frame
+
+    def get_data(self):
+        """
+        Return the current snapshot as a list of row dicts, sorted by timestamp.
+
+        The list is built once per snapshot, shared between callers and must not be modified.
+        """
+        frame = self.get_frame()
+        with self._lock:
+            if self._records is None or self._records[0] is not frame:
+                self._records = (frame, frame.to_records())
+            return self._records[1]
+
+    def _refresh(self):
+        """Bring the snapshot up to date with the file on disk."""
+        try:
+            stat_info = os.stat(self.path)
+        except FileNotFoundError:
+            if self._inode is not None:
+                self._reset()
+            return
+
+        if stat_info.st_size == self._size and stat_info.st_mtime_ns == self._mtime_ns:
+            cache_lookup('speed_data', True)
+            return
+        cache_lookup('speed_data', False)
+
+        # Replaced, truncated or rewritten in place: start over
+        if (stat_info.st_ino != self._inode or
+                stat_info.st_size < self._offset or
+                stat_info.st_size == self._size):
+            self._reset()
+
+        with open(self.path, 'rb') as file:
+            file.seek(self._offset)
+            chunk = file.read(stat_info.st_size - self._offset)
+
+        # Only consume complete lines; a partially written row is picked up next time
+        end = chunk.rfind(b'\n') + 1
+        appended = self._parse_lines(chunk[:end].decode('utf-8', errors='replace'))
+
+        self._offset += end
+        self._inode = stat_info.st_ino
+        self._size = stat_info.st_size
+        self._mtime_ns = stat_info.st_mtime_ns
+
+        if appended or self._frame.has_server_info != self._has_server_info():
+            self._set_frame(self._columns.snapshot(self._has_server_info()))
+
+    def _has_server_info(self):
+        return bool(self._fieldnames) and 'server_name' in self._fieldnames
+
+    @STAGE_SECONDS.time(stage='parse')
+    def _parse_lines(self, text):
+        """Parse a block of complete CSV lines into the column store. Returns the row count added."""
+        if not text:
+            return 0
+
+        stream = io.StringIO(text, newline='')
+        if self._fieldnames is None:
+            header = next(csv.reader(stream), None)
+            if not header:
+                return 0
+            self._fieldnames = header
+
+        rows = []
+        for row in csv.DictReader(stream, fieldnames=self._fieldnames):
+            # Skip error rows
+            if row.get('download_speed_mbps') == 'ERROR':
+                continue
+            try:
+                rows.append((
+                    row['timestamp'],
+                    float(row['download_speed_mbps']),
+                    float(row['upload_speed_mbps']),
+                    float(row['ping_ms']),
+                    [row.get(field) for field in SERVER_FIELDS]
+                ))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Skipping invalid row: {row}, error: {e}")
+
+        epochs = parse_timestamps([r[0] for r in rows])
+        valid = []
+        for row, epoch in zip(rows, epochs):
+            if epoch is None:
+                logger.warning(f"Skipping row with invalid timestamp: {row[0]}")
+                continue
+            valid.append((epoch,) + row[1:4] + tuple(row[4]))
+        return self._append_rows(valid)
+
+    def _append_rows(self, rows, columns=None):
+        """Append (epoch, download, upload, ping, server_name, server_country, isp) tuples."""
+        if not rows:
+            return 0
+        if columns is None:
+            columns = self._columns
+        epochs, download, upload, ping, *servers = zip(*rows)
+        columns.append(epochs, download, upload, ping, dict(zip(SERVER_FIELDS, servers)))
+        return len(rows)
+
+
+class SqliteSpeedDataCache(SpeedDataCache):
+    """
+    Speed samples from the SQLite backend.
+
+    A windowed read (?days=) is an index range query on timestamp, so those
+    views never load the whole history; the last window read is kept until
+    the database changes. The full snapshot is built on the first unwindowed
+    read and from then on followed with id range queries on the primary key;
+    once it is in memory, windows are sliced from it instead.
+    Change detection uses PRAGMA data_version on a long-lived connection.
+    """
+
+    def __init__(self, db_path):
+        self.storage = SqliteStorage(db_path)
+        self._conn = None
+        self._full = False
+        super().__init__(db_path)
+
+    def _reset(self):
+        super()._reset()
+        self._last_id = 0
+        self._data_version = None
+        self._full_stale = True
+        self._window = None
+
+    def get_frame(self, start_epoch=None, end_epoch=None):
+        """The full snapshot, or only the rows in [start_epoch, end_epoch) when a window is given."""
+        if start_epoch is None and end_epoch is None:
+            with self._lock:
+                self._full = True
+            return super().get_frame()
+
+        self.refresh()
+        with self._lock:
+            if self._full:
+                return self._frame.window(start_epoch, end_epoch)
+            key = (self._version, start_epoch, end_epoch)
+            if self._window is None or self._window[0] != key:
+                self._window = (key, self._read_window(start_epoch, end_epoch))
+            return self._window[1]
+
+    def _read_window(self, start_epoch, end_epoch):
+        columns = SpeedColumns()
+        if self._conn is not None and os.path.exists(self.path):
+            try:
+                with STAGE_SECONDS.time(stage='parse'):
+                    rows = self.storage.read_range(start_epoch, end_epoch, conn=self._conn)
+                    self._append_rows([row[:1] + row[2:] for row in rows], columns)
+            except Exception as e:
+                logger.error(f"Error reading speed data from {self.path}: {e}")
+        return columns.snapshot(True)
+
+    def _refresh(self):
+        if not os.path.exists(self.path):
+            if self._data_version is not None:
+                self._reset()
+            return
+
+        if self._conn is None:
+            self._conn = self.storage.connect(check_same_thread=False)
+
+        data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        cache_lookup('speed_data', data_version == self._data_version)
+        if data_version != self._data_version:
+            self._data_version = data_version
+            self._full_stale = True
+            self._version += 1
+        if self._full and self._full_stale:
+            self._read_new_rows()
+            self._full_stale = False
+
+    def _read_new_rows(self):
+        max_id = self._conn.execute('SELECT MAX(id) FROM speed_tests').fetchone()[0] or 0
+        if max_id < self._last_id:
+            # Rows were deleted or the database was rebuilt
+            data_version = self._data_version
+            self._reset()
+            self._data_version = data_version
+
+        with STAGE_SECONDS.time(stage='parse'):
+            rows = self.storage.read_after(self._last_id, self._conn)
+            appended = self._append_rows([row[1:] for row in rows])
+        # A logger may commit between the MAX(id) and the read, so follow the rows actually read
+        if rows:
+            self._last_id = rows[-1][0]
+        if appended or not self._frame.has_server_info:
+            self._set_frame(self._columns.snapshot(True))
+
+
+class CompressedSegmentCache(SpeedDataCache):
+    """One gzip-compressed archive segment, parsed whole and re-read only if the file is replaced."""
+
+    def _refresh(self):
+        stat_info = os.stat(self.path)
+        if (stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns) == (self._inode, self._size, self._mtime_ns):
+            return
+        self._reset()
+        with gzip.open(self.path, 'rt', encoding='utf-8', errors='replace', newline='') as file:
+            self._parse_lines(file.read())
+        self._inode, self._size, self._mtime_ns = stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns
+        self._set_frame(self._columns.snapshot(self._has_server_info()))
+
+
+class SegmentedSpeedDataCache:
+    """
+    A CSV log with archived monthly segments (see speed_storage.rotate_csv_log).
+
+    The active file is followed incrementally by a SpeedDataCache. Segments
+    are listed by the manifest and parsed only when a requested window
+    overlaps them; the most recently used ones stay in memory, as do the last
+    few combined frames.
+    """
+
+    def __init__(self, path, max_segments=24, max_combined=4):
+        self.path = path
+        self.active = SpeedDataCache(path)
+        self.max_segments = max_segments
+        self.max_combined = max_combined
+        self._manifest = []
+        self._segments = OrderedDict()
+        self._combined = OrderedDict()
+        self._records = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        """Changes whenever the active file or the set of archived segments changes."""
+        return (self.active.version, tuple((s['file'], s['rows'], s['bytes']) for s in self._manifest))
+
+    def refresh(self):
+        self.active.refresh()
+        with self._lock:
+            self._manifest = load_segment_manifest(self.path)
+
+    def get_frame(self, start_epoch=None, end_epoch=None):
+        """
+        Snapshot of the active file plus every archived segment overlapping
+        [start_epoch, end_epoch). Rows outside the window may be included, so
+        callers still select their window from the result.
+        """
+        self.refresh()
+        active = self.active.get_frame()
+        with self._lock:
+            if not self._manifest:
+                return active
+            segments = overlapping_segments(self._manifest, start_epoch, end_epoch)
+            key = (self.version, tuple(s['file'] for s in segments))
+            frame = self._combined.get(key)
+            cache_lookup('combined_segments', frame is not None)
+            if frame is None:
+                frame = concat_frames([self._segment_frame(s['file']) for s in segments] + [self._unarchived(active)])
+                self._combined[key] = frame
+                while len(self._combined) > self.max_combined:
+                    self._combined.popitem(last=False)
+            self._combined.move_to_end(key)
+            return frame
+
+    def get_data(self):
+        """Full history as row dicts (see SpeedDataCache.get_data)."""
+        frame = self.get_frame()
+        with self._lock:
+            if self._records is None or self._records[0] is not frame:
+                self._records = (frame, frame.to_records())
+            return self._records[1]
+
+    def _unarchived(self, active):
+        """
+        The active file's rows minus those also in an archived segment.
+
+        Rows still in the active file while a rotation is half done are
+        already archived. Only rows up to the last segment's end can be such
+        duplicates, and they are matched against the archived rows themselves,
+        so backfilled or clock-skewed rows that exist only in the active file
+        are kept.
+        """
+        overlap = active.window(None, self._manifest[-1]['end_epoch'] + 1)
+        if not len(overlap):
+            return active
+        start, end = int(overlap.timestamps[0]), int(overlap.timestamps[-1]) + 1
+
+        def identities(frame):
+            return zip(frame.timestamps.tolist(), frame.download.tolist(), frame.upload.tolist(), frame.ping.tolist())
+
+        archived = set()
+        for segment in overlapping_segments(self._manifest, start, end):
+            archived.update(identities(self._segment_frame(segment['file']).window(start, end)))
+        keep = np.ones(len(active), dtype=bool)
+        keep[:len(overlap)] = [identity not in archived for identity in identities(overlap)]
+        return active.take(keep)
+
+    def _segment_frame(self, filename):
+        path = os.path.join(os.path.dirname(os.path.abspath(self.path)), filename)
+        cache = self._segments.get(path)
+        cache_lookup('csv_segments', cache is not None)
+        if cache is None:
+            cache = CompressedSegmentCache(path)
+            self._segments[path] = cache
+            while len(self._segments) > self.max_segments:
+                self._segments.popitem(last=False)
+        self._segments.move_to_end(path)
+        return cache.get_frame()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_speed_cache(path, backend='csv'):
+    """Return the shared cache for a CSV file or SQLite database, creating it on first use."""
+    with _caches_lock:
+        cache = _caches.get((backend, path))
+        if cache is None:
+            cache = SqliteSpeedDataCache(path) if backend == 'sqlite' else SegmentedSpeedDataCache(path)
+            _caches[(backend, path)] = cache
+        return cache
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Speed Test Engine
+A long-lived, in-process speed test runner built on the speedtest-cli library.
+The client configuration is fetched once and reused between runs, and the
+server choice comes from a persisted cache of ranked nearby servers, instead
+of starting a new speedtest-cli process every time.
+"""
+
+import os
+import time
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import speedtest
+except ImportError:  # speedtest-cli only installed as a command
+    speedtest = None
+
+from server_cache import ServerSelectionCache, cache_key, UNREACHABLE_MS
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SETTINGS_PATH = os.path.join(BASE_DIR, 'speedtest_settings.json')
+
+# How long the downloaded client config is reused
+CONFIG_MAX_AGE_SECONDS = 6 * 3600
+# Closest servers probed and kept as candidates when the full server list is downloaded
+CANDIDATE_SERVERS = 5
+
+PHASES = ('ping', 'download', 'upload')
+# Names the phases are timed under in results['phase_seconds'] ('ping' is mostly picking the server)
+PHASE_TIMING_NAMES = {'ping': 'server_selection', 'download': 'download', 'upload': 'upload'}
+
+
+class SpeedTestError(Exception):
+    """A speed test run failed."""
+
+
+class RateLimitedError(SpeedTestError):
+    """speedtest.net refused the request (HTTP 403)."""
+
+
+def is_rate_limited(error):
+    text = str(error)
+    return '403' in text or 'Forbidden' in text
+
+
+class PhaseTimer:
+    """Forwards phase changes to a callback and records how long each phase took."""
+
+    def __init__(self, on_phase=None):
+        self.on_phase = on_phase
+        self.seconds = {}
+        self._current = None
+        self._started = None
+
+    def __call__(self, name):
+        self.finish()
+        self._current, self._started = name, time.monotonic()
+        if self.on_phase:
+            self.on_phase(name)
+
+    def finish(self):
+        """End the current phase. Returns {timing name: seconds} for every finished phase."""
+        if self._current:
+            name = PHASE_TIMING_NAMES.get(self._current, self._current)
+            self.seconds[name] = round(time.monotonic() - self._started, 3)
+            self._current = None
+        return self.seconds
+
+
+class SpeedTestEngine:
+    """
+    Runs speed tests through one reused speedtest.Speedtest client.
+
+    Runs are serialized with a lock, so the scheduler and the web UI can share
+    an engine without measuring over each other.
+    """
+
+    def __init__(self, timeout=60, secure=True, single_connection=True,
+                 preferred_servers=None, exclude_servers=None,
+                 server_cache=None, probe_count=3, parallel_servers=1):
+        self._set_options(timeout, secure, single_connection, preferred_servers,
+                          exclude_servers, server_cache, probe_count, parallel_servers)
+
+        self._client = None
+        # One extra client per additional server in parallel mode (each keeps its own best server)
+        self._extra_clients = []
+        self._config_loaded_at = None
+        self._pending_options = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.server_list_fetches = 0
+
+    def _set_options(self, timeout=60, secure=True, single_connection=True,
+                     preferred_servers=None, exclude_servers=None,
+                     server_cache=None, probe_count=3, parallel_servers=1):
+        self.timeout = timeout
+        self.secure = secure
+        self.single_connection = single_connection
+        self.preferred_servers = list(preferred_servers or [])
+        self.exclude_servers = list(exclude_servers or [])
+        self.server_cache = server_cache
+        self.probe_count = probe_count
+        self.parallel_servers = max(1, int(parallel_servers or 1))
+
+    @staticmethod
+    def _options_from_settings(settings):
+        opts = settings.config['speedtest_options']
+        cache_hours = opts.get('server_cache_hours', 24)
+        return {
+            'timeout': opts.get('timeout') or 60,
+            'secure': opts.get('use_secure', True),
+            'single_connection': opts.get('use_single_connection', True),
+            'preferred_servers': opts.get('preferred_servers'),
+            'exclude_servers': opts.get('exclude_servers'),
+            'server_cache': ServerSelectionCache(ttl_hours=cache_hours) if cache_hours else None,
+            'probe_count': opts.get('server_probe_count', 3),
+            'parallel_servers': opts.get('parallel_servers', 1)
+        }
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Engine configured from a speedtest_config.SpeedtestConfig."""
+        return cls(**cls._options_from_settings(settings))
+
+    def configure(self, settings):
+        """
+        Take new options from a SpeedtestConfig. They are applied when the next
+        run starts, so a test in progress is never disturbed.
+        """
+        self._pending_options = self._options_from_settings(settings)
+
+    def _apply_pending_options(self):
+        options, self._pending_options = self._pending_options, None
+        if options is None:
+            return
+        if (options['timeout'], options['secure']) != (self.timeout, self.secure):
+            # Clients are created with these, so start from fresh ones
+            self._client = None
+            self._extra_clients = []
+        self._set_options(**options)
+
+    @staticmethod
+    def available():
+        """True if the speedtest library can be imported."""
+        return speedtest is not None
+
+    def is_busy(self):
+        return self._lock.locked()
+
+    def _get_client(self):
+        """The shared client, re-fetching its config when it is stale."""
+        now = time.monotonic()
+        if self._client is None:
+            self._client = speedtest.Speedtest(timeout=self.timeout, secure=self.secure)
+            self._config_loaded_at = now
+        elif now - self._config_loaded_at > CONFIG_MAX_AGE_SECONDS:
+            for client in [self._client] + self._extra_clients:
+                client.get_config()
+            self._config_loaded_at = now
+        return self._client
+
+    def _get_extra_clients(self, count):
+        """`count` additional clients for parallel mode, created on first use."""
+        while len(self._extra_clients) < count:
+            self._extra_clients.append(speedtest.Speedtest(timeout=self.timeout, secure=self.secure))
+        return self._extra_clients[:count]
+
+    @staticmethod
+    def _probe(client, servers):
+        """
+        Measure the latency of each server and make the fastest the client's best server.
+
+        Servers are probed in reverse order, so when the first (expected best)
+        server wins it is already the client's best and needs no second probe.
+
+        Returns:
+            List of (latency_ms, server) sorted fastest first, ties in list order
+        """
+        probes = []
+        # get_best_server() leaves the client pointed at the last server it probed
+        for server in reversed(servers):
+            last_probed = client.get_best_server([server])
+            probes.append((last_probed['latency'], last_probed))
+        probes.reverse()
+        probes.sort(key=lambda probe: probe[0])
+
+        if probes[0][1] is not last_probed:
+            # The last probe set the client's best server; point it at the winner instead
+            best = client.get_best_server([probes[0][1]])
+            probes[0] = (best['latency'], best)
+        return probes
+
+    def _select_servers(self, client, count=1):
+        """
+        Pick the servers to test against, fastest first.
+
+        With a fresh cache entry for this ISP/IP only the top `probe_count`
+        candidates are re-probed; otherwise (or if they are all unreachable)
+        the server list is downloaded, honoring preferred/excluded servers, and
+        the closest candidates are probed and cached. The fastest server is
+        left as the client's best server.
+
+        Returns:
+            Up to `count` reachable (latency_ms, server) pairs
+        """
+        key = cache_key(client.config)
+        cached = self.server_cache.candidates(key, self.preferred_servers, self.exclude_servers) if self.server_cache else None
+        if cached:
+            probes = self._probe(client, cached[:max(self.probe_count, count)])
+            self.server_cache.record_probes(key, probes)
+            if probes[0][0] < UNREACHABLE_MS:
+                return [probe for probe in probes if probe[0] < UNREACHABLE_MS][:count]
+            logger.warning("Cached speedtest servers unreachable, refreshing server list")
+
+        # get_servers() converts the ids in the lists it is given, so pass copies
+        client.get_servers(list(self.preferred_servers), list(self.exclude_servers))
+        client.closest = []
+        candidates = client.get_closest_servers(limit=max(CANDIDATE_SERVERS, count))
+        self.server_list_fetches += 1
+        if not candidates:
+            raise SpeedTestError("No speedtest servers available")
+
+        probes = self._probe(client, candidates)
+        if probes[0][0] >= UNREACHABLE_MS:
+            raise SpeedTestError("Unable to connect to speedtest servers to test latency")
+        if self.server_cache:
+            self.server_cache.store_candidates(key, probes, self.preferred_servers, self.exclude_servers)
+        return [probe for probe in probes if probe[0] < UNREACHABLE_MS][:count]
+
+    def reset(self):
+        """Drop the cached clients so the next run fetches config and servers again."""
+        with self._lock:
+            self._client = None
+            self._extra_clients = []
+
+    def run(self, on_phase=None):
+        """
+        Perform one speed test.
+
+        Args:
+            on_phase: Optional callable receiving 'ping', 'download' and 'upload'
+                as each phase starts
+
+        Returns:
+            Result dict with the same fields as the CSV log, plus 'phase_seconds'
+            with the duration of server selection, download and upload. In
+            parallel mode the speeds are the sum over all servers, ping and server
+            fields describe the fastest server, and 'servers' holds the per-server results.
+
+        Raises:
+            RateLimitedError: speedtest.net answered with HTTP 403
+            SpeedTestError: Any other failure
+        """
+        if speedtest is None:
+            raise SpeedTestError("speedtest module is not installed")
+
+        phase = PhaseTimer(on_phase)
+
+        with self._lock:
+            self._apply_pending_options()
+            threads = 1 if self.single_connection else None
+            client = None
+            try:
+                client = self._get_client()
+
+                phase('ping')
+                probes = self._select_servers(client, self.parallel_servers)
+                server = probes[0][1]
+                if len(probes) > 1:
+                    results = self._run_parallel(client, probes, phase, threads)
+                    results['phase_seconds'] = phase.finish()
+                    self.runs += 1
+                    return results
+
+                phase('download')
+                download = client.download(threads=threads)
+
+                phase('upload')
+                upload = client.upload(threads=threads)
+                phase.finish()
+            except Exception as e:
+                # Start from fresh clients next time in case the cached state is bad
+                self._client = None
+                self._extra_clients = []
+                if is_rate_limited(e):
+                    raise RateLimitedError(str(e)) from e
+                if self.server_cache and client is not None:
+                    # The cached servers may be the problem: download the server list next time
+                    self.server_cache.invalidate(cache_key(client.config))
+                raise SpeedTestError(str(e) or e.__class__.__name__) from e
+
+            self.runs += 1
+            return {
+                "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "download_speed_mbps": round(download / 1_000_000, 2),
+                "upload_speed_mbps": round(upload / 1_000_000, 2),
+                "ping_ms": round(server["latency"], 2),
+                "server_name": server["name"],
+                "server_country": server["country"],
+                "isp": client.config["client"]["isp"],
+                "phase_seconds": phase.seconds
+            }
+
+    def _run_parallel(self, client, probes, phase, threads):
+        """
+        Measure against several servers at once: every download runs
+        concurrently, then every upload, one client per server.
+        """
+        servers = [server for latency, server in probes]
+        clients = [client] + self._get_extra_clients(len(servers) - 1)
+
+        with ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix='speedtest') as pool:
+            # Each extra client probes its own server, which also makes it that client's best server
+            pings = [probes[0][0]] + list(pool.map(
+                lambda pair: pair[0].get_best_server([pair[1]])['latency'],
+                zip(clients[1:], servers[1:])
+            ))
+
+            phase('download')
+            downloads = list(pool.map(lambda c: c.download(threads=threads), clients))
+
+            phase('upload')
+            uploads = list(pool.map(lambda c: c.upload(threads=threads), clients))
+
+        per_server = []
+        for server, ping, download, upload in zip(servers, pings, downloads, uploads):
+            per_server.append({
+                "server_id": str(server.get("id")),
+                "server_name": server["name"],
+                "server_country": server["country"],
+                "ping_ms": round(ping, 2),
+                "download_speed_mbps": round(download / 1_000_000, 2),
+                "upload_speed_mbps": round(upload / 1_000_000, 2)
+            })
+            logger.info(f"  {server['name']}: {per_server[-1]['download_speed_mbps']} Mbps down, "
+                        f"{per_server[-1]['upload_speed_mbps']} Mbps up, {per_server[-1]['ping_ms']} ms ping")
+
+        return {
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "download_speed_mbps": round(sum(downloads) / 1_000_000, 2),
+            "upload_speed_mbps": round(sum(uploads) / 1_000_000, 2),
+            "ping_ms": round(probes[0][0], 2),
+            "server_name": servers[0]["name"],
+            "server_country": servers[0]["country"],
+            "isp": client.config["client"]["isp"],
+            "servers": per_server
+        }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Process-wide engine configured from speedtest_settings.json."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            from speedtest_config import SpeedtestConfig
+            _engine = SpeedTestEngine.from_settings(SpeedtestConfig(SETTINGS_PATH))
+        return _engine
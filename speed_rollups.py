@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Speed Test Rollups
+Per-hour, per-day and per-week aggregates of speed test results, kept next to
+the raw log and updated incrementally as each sample is written.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import argparse
+from speed_storage import open_storage, timestamp_to_epoch, epoch_to_timestamp
+from speed_stats import LogHistogram, RunningStats, MetricStats
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('download', 'upload', 'ping')
+RESULT_FIELDS = {
+    'download': 'download_speed_mbps',
+    'upload': 'upload_speed_mbps',
+    'ping': 'ping_ms'
+}
+
+# Bucket widths in seconds. Weeks start on Monday (1970-01-05 is the first Monday after the epoch).
+PERIODS = {
+    'hour': 3600,
+    'day': 86400,
+    'week': 7 * 86400
+}
+WEEK_OFFSET = 4 * 86400
+
+
+def bucket_start(epoch, period):
+    """Start epoch of the bucket containing `epoch` for the given period."""
+    width = PERIODS[period]
+    offset = WEEK_OFFSET if period == 'week' else 0
+    return epoch - ((epoch - offset) % width)
+
+
+class Aggregate(MetricStats):
+    """
+    Statistics for one metric in one bucket, stored in the rollups table as
+    count/sum/min/max/sum of squares plus the quantile sketch.
+    """
+
+    @classmethod
+    def from_row(cls, row):
+        count, total, minimum, maximum, sumsq, histogram = row
+        mean = total / count if count else 0.0
+        m2 = max(sumsq - count * mean * mean, 0.0)
+        return cls(RunningStats(count, mean, m2, minimum, maximum), LogHistogram.from_json(histogram))
+
+    def to_row(self):
+        running = self.running
+        return (running.count, running.mean * running.count, running.minimum, running.maximum,
+                running.m2 + running.count * running.mean * running.mean, self.histogram.to_json())
+
+
+def rollup_path_for(log_path):
+    """Rollup database path that sits next to a raw CSV log or SQLite database."""
+    return os.path.splitext(log_path)[0] + '.rollups.db'
+
+
+class RollupStore:
+    """SQLite-persisted rollups for every period in PERIODS."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rollups (
+            period TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            sum REAL NOT NULL,
+            min REAL,
+            max REAL,
+            sumsq REAL NOT NULL,
+            histogram TEXT NOT NULL,
+            PRIMARY KEY (period, bucket, metric)
+        );
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    @classmethod
+    def for_storage(cls, storage):
+        """Rollup store for a speed_storage backend."""
+        return cls(rollup_path_for(storage.location))
+
+    def exists(self):
+        return os.path.exists(self.db_path)
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(self.SCHEMA)
+        return conn
+
+    def add_result(self, results):
+        """
+        Fold one logger result dict into every rollup period.
+
+        Error results are ignored. Returns True if the sample was added.
+        """
+        try:
+            values = {metric: float(results[field]) for metric, field in RESULT_FIELDS.items()}
+        except (ValueError, KeyError, TypeError):
+            return False
+        self.add_samples([(timestamp_to_epoch(results['timestamp']), values)])
+        return True
+
+    def add_samples(self, samples):
+        """Fold (epoch, {metric: value}) samples into the stored aggregates."""
+        pending = {}
+        for epoch, values in samples:
+            for period in PERIODS:
+                bucket = bucket_start(epoch, period)
+                for metric in METRICS:
+                    key = (period, bucket, metric)
+                    if key not in pending:
+                        pending[key] = Aggregate()
+                    pending[key].add(values[metric])
+
+        conn = self.connect()
+        try:
+            with conn:
+                for key, aggregate in pending.items():
+                    row = conn.execute(
+                        "SELECT count, sum, min, max, sumsq, histogram FROM rollups "
+                        "WHERE period = ? AND bucket = ? AND metric = ?", key
+                    ).fetchone()
+                    if row:
+                        stored = Aggregate.from_row(row)
+                        stored.merge(aggregate)
+                        aggregate = stored
+                    conn.execute(
+                        "INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        key + aggregate.to_row()
+                    )
+        finally:
+            conn.close()
+
+    def sample_count(self):
+        """Number of samples folded in so far."""
+        if not self.exists():
+            return 0
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                "SELECT SUM(count) FROM rollups WHERE period = 'week' AND metric = 'download'"
+            ).fetchone()
+            return row[0] or 0
+        finally:
+            conn.close()
+
+    def rebuild(self, samples):
+        """Replace all rollups with aggregates of the given (epoch, {metric: value}) samples."""
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM rollups")
+        finally:
+            conn.close()
+        self.add_samples(samples)
+
+    def sync(self, storage):
+        """
+        Rebuild from the raw log if the rollups don't cover exactly the stored samples.
+
+        Returns True if a rebuild happened.
+        """
+        samples = list(storage.iter_samples())
+        if len(samples) == self.sample_count():
+            return False
+        logger.info(f"Rebuilding rollups from {len(samples)} samples in {storage.location}")
+        self.rebuild(samples)
+        return True
+
+    def _rows(self, period, start_epoch, end_epoch, metric=None):
+        """(bucket, metric, *stored columns) rows for a period within [start_epoch, end_epoch), by bucket."""
+        clauses, params = ['period = ?'], [period]
+        if start_epoch is not None:
+            clauses.append('bucket >= ?')
+            params.append(bucket_start(start_epoch, period))
+        if end_epoch is not None:
+            clauses.append('bucket < ?')
+            params.append(end_epoch)
+        if metric is not None:
+            clauses.append('metric = ?')
+            params.append(metric)
+
+        conn = self.connect()
+        try:
+            return conn.execute(
+                "SELECT bucket, metric, count, sum, min, max, sumsq, histogram FROM rollups "
+                f"WHERE {' AND '.join(clauses)} ORDER BY bucket", params
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def query(self, period, start_epoch=None, end_epoch=None):
+        """
+        Bucket summaries for a period within [start_epoch, end_epoch).
+
+        Returns:
+            List of {'bucket': epoch, 'download': {...}, 'upload': {...}, 'ping': {...}} sorted by bucket
+        """
+        if not self.exists():
+            return []
+        buckets = {}
+        for bucket, metric, *values in self._rows(period, start_epoch, end_epoch):
+            buckets.setdefault(bucket, {'bucket': bucket})[metric] = Aggregate.from_row(values).summary()
+        return [buckets[b] for b in sorted(buckets)]
+
+    def total(self, period, metric, start_epoch=None, end_epoch=None):
+        """One metric's Aggregate merged over the buckets query() returns for the same range."""
+        total = Aggregate()
+        if self.exists():
+            for _, _, *values in self._rows(period, start_epoch, end_epoch, metric):
+                total.merge(Aggregate.from_row(values))
+        return total
+
+
+def main():
+    """Command line entry point to rebuild or inspect rollups."""
+    parser = argparse.ArgumentParser(description="Speed test rollups")
+    parser.add_argument("command", choices=["rebuild", "show"])
+    parser.add_argument("--log", default="internet_speed_log.csv", help="Raw CSV log (default: internet_speed_log.csv)")
+    parser.add_argument("--period", choices=sorted(PERIODS), default="day", help="Period for 'show'")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    storage = open_storage(args.log)
+    store = RollupStore.for_storage(storage)
+    if args.command == "rebuild":
+        store.rebuild(list(storage.iter_samples()))
+        print(f"Rebuilt {store.db_path} from {store.sample_count()} samples")
+    else:
+        for bucket in store.query(args.period):
+            print(epoch_to_timestamp(bucket['bucket']), json.dumps({m: bucket[m] for m in METRICS}))
+
+
+if __name__ == "__main__":
+    main()
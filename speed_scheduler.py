@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Speed Test Scheduler
+Decides when the next scheduled speed test runs. Runs land on wall-clock
+boundaries of the test interval (e.g. on the hour) plus a random jitter, so
+they don't drift by the test duration and many loggers don't hit
+speedtest.net at the same second. The failure history comes from the stored
+results, which drive the adaptive backoff, cooldown and daily quota in
+speedtest_settings.json.
+"""
+
+import math
+import time
+import random
+import logging
+from datetime import datetime, timedelta
+from speed_storage import EPOCH
+
+logger = logging.getLogger(__name__)
+
+# Longest single sleep while waiting, so wall-clock jumps (NTP, suspend) are noticed
+MAX_SLEEP_SECONDS = 60
+
+
+def count_recent_failures(outcomes, reset_success_count):
+    """
+    Failed tests since the last run of `reset_success_count` consecutive
+    successes, so a single good result doesn't end a backoff.
+
+    Args:
+        outcomes: List of (datetime, succeeded), oldest first
+    """
+    failures = 0
+    successes = 0
+    for _, succeeded in reversed(outcomes):
+        if succeeded:
+            successes += 1
+            if successes >= reset_success_count:
+                break
+        else:
+            failures += 1
+            successes = 0
+    return failures
+
+
+class TestHistory:
+    """Recent test outcomes read from a speed_storage backend."""
+
+    def __init__(self, storage, window=200):
+        self.storage = storage
+        self.window = window
+
+    def outcomes(self):
+        """List of (datetime, succeeded) for the most recent tests, oldest first."""
+        try:
+            return [
+                (EPOCH + timedelta(seconds=epoch), succeeded)
+                for epoch, succeeded in self.storage.recent_outcomes(self.window)
+            ]
+        except Exception as e:
+            logger.warning(f"Could not read test history: {e}")
+            return []
+
+    def recent_failures(self, reset_success_count):
+        return count_recent_failures(self.outcomes(), reset_success_count)
+
+
+def next_boundary(when, interval):
+    """
+    First multiple of `interval` counted from local midnight that is not
+    before `when`. The grid restarts at midnight when the interval doesn't
+    divide a day.
+    """
+    midnight = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    slots = math.ceil((when - midnight) / interval)
+    return min(midnight + slots * interval, midnight + timedelta(days=1))
+
+
+class TestScheduler:
+    """
+    Computes the next run time from a SpeedtestConfig and a TestHistory.
+
+    Args:
+        settings: speedtest_config.SpeedtestConfig
+        history: TestHistory
+        interval_hours: Base interval overriding test_interval.hours (e.g. from the command line)
+    """
+
+    def __init__(self, settings, history, interval_hours=None, rng=None):
+        self.history = history
+        self.rng = rng or random.Random()
+        self.update(settings, interval_hours)
+
+    def update(self, settings, interval_hours=None):
+        """Switch to reloaded settings and/or a new base interval."""
+        self.settings = settings
+        self.settings.history = self.history
+        if interval_hours is not None:
+            self.settings.config["test_interval"]["hours"] = interval_hours
+
+    @property
+    def base_interval_hours(self):
+        return self.settings.config["test_interval"]["hours"]
+
+    def interval(self):
+        """Current interval including any adaptive backoff, never below min_interval."""
+        test_interval = self.settings.config["test_interval"]
+        hours = max(self.settings.get_optimal_interval(), test_interval.get("min_interval", 0))
+        return timedelta(hours=hours)
+
+    def next_run(self, now=None):
+        """
+        When the next test should start.
+
+        A logger that hasn't tested for a whole interval runs now; otherwise
+        the next boundary at least half an interval after the last test is
+        used, pushed back by the failure cooldown and the daily quota. Either
+        way jitter (at most one interval) is added, so loggers restarted
+        together still spread out.
+        """
+        now = now or datetime.now()
+        config = self.settings.config
+        interval = self.interval()
+        outcomes = self.history.outcomes()
+        last_test = outcomes[-1][0] if outcomes else None
+
+        run_at = now
+        if last_test is not None and now - last_test < interval:
+            run_at = next_boundary(max(now, last_test + interval / 2), interval)
+
+        cooldown_until = self._cooldown_until(outcomes)
+        if cooldown_until and cooldown_until > run_at:
+            run_at = next_boundary(cooldown_until, interval)
+
+        run_at = self._apply_daily_quota(run_at, outcomes)
+
+        jitter_seconds = min(config["test_interval"].get("jitter_minutes", 0) * 60, interval.total_seconds())
+        return run_at + timedelta(seconds=self.rng.uniform(0, jitter_seconds))
+
+    def _cooldown_until(self, outcomes):
+        """End of the extended wait after repeated failures, or None."""
+        rate_limiting = self.settings.config["rate_limiting"]
+        if not rate_limiting["adaptive_interval"] or not outcomes or outcomes[-1][1]:
+            return None
+        failures = count_recent_failures(outcomes, rate_limiting["reset_success_count"])
+        if failures < rate_limiting["error_threshold"]:
+            return None
+        return outcomes[-1][0] + timedelta(hours=rate_limiting["cooldown_hours"])
+
+    def _apply_daily_quota(self, run_at, outcomes):
+        """Move run_at to the next day once max_daily_tests have run on its day."""
+        limit = self.settings.config["test_interval"].get("max_daily_tests")
+        if not limit:
+            return run_at
+        tests_that_day = sum(1 for timestamp, _ in outcomes if timestamp.date() == run_at.date())
+        if tests_that_day < limit:
+            return run_at
+        return datetime.combine(run_at.date() + timedelta(days=1), datetime.min.time())
+
+    @staticmethod
+    def wait_until(when, wake=None):
+        """
+        Sleep until the wall clock reaches `when`.
+
+        Args:
+            wake: Optional threading.Event that ends the wait early (e.g. settings changed)
+
+        Returns:
+            True if `when` was reached, False if woken early
+        """
+        while True:
+            remaining = (when - datetime.now()).total_seconds()
+            if remaining <= 0:
+                return True
+            if wake is None:
+                time.sleep(min(remaining, MAX_SLEEP_SECONDS))
+            elif wake.wait(min(remaining, MAX_SLEEP_SECONDS)):
+                wake.clear()
+                return False
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Speed Statistics
+Single-pass, mergeable statistics for one speed test metric: count, mean and
+variance (Welford's update, combined across batches with Chan's formula),
+min/max, and a log-bucketed quantile sketch for percentiles.
+
+An accumulator can be fed one sample at a time (the rollups, as each result
+is logged) or a NumPy array at a time, and two accumulators merge into
+exactly what one fed both inputs would hold, so hourly buckets combine into
+days and weeks without revisiting the samples. Sketch percentiles are kept
+within the observed min/max. For arrays already in memory (the dashboard
+statistics) summarize_values gives the same summary with exact percentiles.
+"""
+
+import json
+import math
+import numpy as np
+
+# Percentiles reported by MetricStats.summary()
+QUANTILES = (('p5', 0.05), ('p50', 0.5), ('p95', 0.95))
+
+
+class LogHistogram:
+    """
+    Sparse log-bucketed histogram used as a mergeable quantile sketch.
+
+    Each positive value falls into bin floor(log(v) / log(GAMMA)), so any
+    quantile is reported within about 1% relative error regardless of how many
+    samples or merged buckets went into it.
+    """
+
+    GAMMA = 1.02
+
+    def __init__(self, bins=None, zeros=0):
+        self.bins = bins or {}
+        self.zeros = zeros
+
+    @property
+    def count(self):
+        return self.zeros + sum(self.bins.values())
+
+    def add(self, value, count=1):
+        if value <= 0:
+            self.zeros += count
+            return
+        index = math.floor(math.log(value) / math.log(self.GAMMA))
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def add_array(self, values):
+        """Add every value of a NumPy array."""
+        values = np.asarray(values, dtype=np.float64)
+        positive = values[values > 0]
+        self.zeros += len(values) - len(positive)
+        if not len(positive):
+            return
+        indices = np.floor(np.log(positive) / math.log(self.GAMMA)).astype(np.int64)
+        for index, count in zip(*(a.tolist() for a in np.unique(indices, return_counts=True))):
+            self.bins[index] = self.bins.get(index, 0) + count
+
+    def merge(self, other):
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zeros += other.zeros
+
+    def count_below(self, value):
+        """Approximate number of samples below value, interpolating within the bin that holds it."""
+        if value <= 0:
+            return 0
+        position = math.log(value) / math.log(self.GAMMA)
+        index = math.floor(position)
+        below = sum(count for i, count in self.bins.items() if i < index)
+        return self.zeros + below + round(self.bins.get(index, 0) * (position - index))
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        """Several quantiles (ascending) in one pass over the sorted bins."""
+        total = self.count
+        if not total:
+            return [None] * len(qs)
+        # Nearest-rank position among the sorted samples
+        ranks = [round(q * (total - 1)) for q in qs]
+        results = []
+        seen = self.zeros
+        bins = iter(sorted(self.bins))
+        index = None
+        for rank in ranks:
+            while rank >= seen:
+                index = next(bins, None)
+                if index is None:
+                    break
+                seen += self.bins[index]
+            if rank < self.zeros:
+                results.append(0.0)
+            else:
+                # Geometric midpoint of the bin
+                results.append(self.GAMMA ** ((index if index is not None else max(self.bins)) + 0.5))
+        return results
+
+    def to_json(self):
+        return json.dumps({'z': self.zeros, 'b': self.bins}, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text):
+        raw = json.loads(text) if text else {}
+        return cls({int(k): v for k, v in raw.get('b', {}).items()}, raw.get('z', 0))
+
+
+class RunningStats:
+    """Count, mean, sum of squared deviations (M2), min and max of a stream of values."""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=None, maximum=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def add_array(self, values):
+        """Add a NumPy array of values as one batch."""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        mean = float(values.mean())
+        self.merge(RunningStats(len(values), mean, float(np.square(values - mean).sum()),
+                                float(values.min()), float(values.max())))
+
+    def merge(self, other):
+        if not other.count:
+            return
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.minimum, self.maximum = other.minimum, other.maximum
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def variance(self):
+        """Population variance."""
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def stddev(self):
+        return math.sqrt(max(self.variance, 0.0))
+
+
+class MetricStats:
+    """RunningStats plus a quantile sketch for one metric."""
+
+    def __init__(self, running=None, histogram=None):
+        self.running = running or RunningStats()
+        self.histogram = histogram or LogHistogram()
+
+    @classmethod
+    def from_values(cls, values):
+        stats = cls()
+        stats.add_array(values)
+        return stats
+
+    @property
+    def count(self):
+        return self.running.count
+
+    def add(self, value):
+        self.running.add(value)
+        self.histogram.add(value)
+
+    def add_array(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.running.add_array(values)
+        self.histogram.add_array(values)
+
+    def merge(self, other):
+        self.running.merge(other.running)
+        self.histogram.merge(other.histogram)
+
+    def summary(self):
+        """JSON-friendly summary: count, avg, min, max, stddev and QUANTILES."""
+        if not self.count:
+            return {'count': 0}
+        values = self.histogram.quantiles([q for _, q in QUANTILES])
+        # Bucket midpoints can fall just outside the samples' range
+        return _summary(self.running, [min(max(v, self.running.minimum), self.running.maximum) for v in values])
+
+
+def summarize_values(values):
+    """
+    The same summary as MetricStats.summary() for an array already in memory,
+    with exact percentiles instead of the sketch's.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return {'count': 0}
+    running = RunningStats()
+    running.add_array(values)
+    return _summary(running, np.percentile(values, [q * 100 for _, q in QUANTILES]).tolist())
+
+
+def _summary(running, quantile_values):
+    summary = {
+        'count': running.count,
+        'avg': round(running.mean, 2),
+        'min': round(running.minimum, 2),
+        'max': round(running.maximum, 2),
+        'stddev': round(running.stddev, 2)
+    }
+    for (name, _), value in zip(QUANTILES, quantile_values):
+        summary[name] = round(value, 2)
+    return summary
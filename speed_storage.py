@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+"""
+Speed Test Storage
+Pluggable storage backends for speed test results: the classic flat CSV file
+and an indexed SQLite database, plus a one-shot CSV importer.
+
+The CSV log is split by month. The active file holds the current month as
+plain CSV; earlier months are moved into gzip-compressed segments next to it
+(internet_speed_log.2024-05.csv.gz), listed with their time range and row
+count in internet_speed_log.segments.json.
+"""
+
+import io
+import os
+import csv
+import gzip
+import sqlite3
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from config_store import get_config_store
+from durable_writer import DurableAppender, open_locked, repair_torn_tail, fsync_directory
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(BASE_DIR, 'config.json')
+
+DEFAULT_STORAGE_SETTINGS = {
+    'backend': 'csv',
+    'sqlite_file': 'internet_speed_log.db',
+    'csv_rotation': 'monthly',  # or 'none' to keep a single ever-growing CSV
+    'csv_fsync': 'always'       # 'batch' (group commit) or 'os' (no fsync), see durable_writer
+}
+
+CSV_HEADERS = [
+    "timestamp",
+    "download_speed_mbps",
+    "upload_speed_mbps",
+    "ping_ms",
+    "server_name",
+    "server_country",
+    "isp"
+]
+
+# Per-server results of a parallel multi-server test, stored next to the main row
+SERVER_RESULT_HEADERS = [
+    "timestamp",
+    "server_id",
+    "server_name",
+    "server_country",
+    "ping_ms",
+    "download_speed_mbps",
+    "upload_speed_mbps"
+]
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Generous upper bound on a CSV row's length, used to size tail reads
+TAIL_BYTES_PER_ROW = 256
+EPOCH = datetime(1970, 1, 1)
+
+
+def timestamp_to_epoch(timestamp):
+    """Convert a 'YYYY-MM-DD HH:MM:SS' wall-clock timestamp to epoch seconds (no timezone shift)."""
+    return int((datetime.strptime(timestamp, TIMESTAMP_FORMAT) - EPOCH).total_seconds())
+
+
+def epoch_to_timestamp(epoch):
+    """Inverse of timestamp_to_epoch."""
+    return (EPOCH + timedelta(seconds=int(epoch))).strftime(TIMESTAMP_FORMAT)
+
+
+def servers_path_for(csv_path):
+    """Per-server results CSV that sits next to the main CSV log."""
+    return os.path.splitext(csv_path)[0] + '.servers.csv'
+
+
+def segment_manifest_path_for(csv_path):
+    """Manifest of the compressed monthly segments archived from a CSV log."""
+    return os.path.splitext(csv_path)[0] + '.segments.json'
+
+
+def segment_path_for(csv_path, month):
+    """Compressed segment holding one month ('YYYY-MM') of a CSV log."""
+    return f"{os.path.splitext(csv_path)[0]}.{month}.csv.gz"
+
+
+def load_segment_manifest(csv_path):
+    """
+    Archived segments of a CSV log, oldest first.
+
+    Returns:
+        List of {'file', 'month', 'start_epoch', 'end_epoch', 'rows', 'bytes'}
+        dicts; 'file' is relative to the log's directory
+    """
+    try:
+        manifest = get_config_store(segment_manifest_path_for(csv_path)).load()
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        logger.error(f"Error loading segment manifest: {e}")
+        return []
+    return sorted(manifest.get('segments', []), key=lambda segment: segment['month'])
+
+
+def overlapping_segments(segments, start_epoch=None, end_epoch=None):
+    """Segments with rows inside [start_epoch, end_epoch)."""
+    return [
+        segment for segment in segments
+        if (start_epoch is None or segment['end_epoch'] >= start_epoch) and
+           (end_epoch is None or segment['start_epoch'] < end_epoch)
+    ]
+
+
+def csv_log_parts(csv_path, start_epoch=None, end_epoch=None):
+    """
+    Files holding a CSV log's rows in time order: the archived segments
+    overlapping [start_epoch, end_epoch), then the active file.
+    """
+    directory = os.path.dirname(os.path.abspath(csv_path))
+    segments = overlapping_segments(load_segment_manifest(csv_path), start_epoch, end_epoch)
+    parts = [os.path.join(directory, segment['file']) for segment in segments]
+    if os.path.exists(csv_path):
+        parts.append(csv_path)
+    return parts
+
+
+def open_csv_text(path):
+    """Open the active CSV log or a compressed segment for reading."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', newline='')
+
+
+def _row_month(row):
+    """'YYYY-MM' of a CSV row, or None if its timestamp doesn't parse."""
+    try:
+        timestamp_to_epoch(row[0])
+    except (ValueError, IndexError):
+        return None
+    return row[0][:7]
+
+
+def _write_csv_file(path, header, rows, compress=False):
+    """Atomically replace `path` with a CSV file (gzip-compressed if requested), keeping its permissions."""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = 0o644
+
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            stream = gzip.GzipFile(fileobj=raw, mode='wb') if compress else raw
+            text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+            writer = csv.writer(text)
+            writer.writerow(header)
+            writer.writerows(rows)
+            text.flush()
+            text.detach()
+            if compress:
+                stream.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+        fsync_directory(path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _write_segment(csv_path, month, header, rows):
+    """Write (or merge into) one month's compressed segment. Returns its manifest entry."""
+    path = segment_path_for(csv_path, month)
+    if os.path.exists(path):
+        # Late rows for an archived month, or a rotation interrupted before the active file was replaced
+        with open_csv_text(path) as file:
+            reader = csv.reader(file)
+            old_header = next(reader, None) or header
+            old_rows = [[dict(zip(old_header, row)).get(name, '') for name in header] for row in reader]
+        seen = set(map(tuple, old_rows))
+        rows = sorted(old_rows + [row for row in rows if tuple(row) not in seen], key=lambda row: row[0])
+
+    _write_csv_file(path, header, rows, compress=True)
+    timestamps = [row[0] for row in rows if _row_month(row)]
+    return {
+        'file': os.path.basename(path),
+        'month': month,
+        'start_epoch': timestamp_to_epoch(min(timestamps)),
+        'end_epoch': timestamp_to_epoch(max(timestamps)),
+        'rows': len(rows),
+        'bytes': os.path.getsize(path)
+    }
+
+
+def rotate_csv_log(csv_path, before_month=None):
+    """
+    Move the rows of months before `before_month` ('YYYY-MM', default: the
+    current month) out of the active CSV into compressed monthly segments and
+    record them in the manifest.
+
+    Segments and manifest are written before the active file is replaced, so
+    an interruption never loses rows; the next rotation merges any duplicates.
+
+    Returns:
+        Number of rows archived
+    """
+    before_month = before_month or datetime.now().strftime('%Y-%m')
+    if not os.path.exists(csv_path):
+        return 0
+
+    with open(csv_path, 'r', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return 0
+        keep, months = [], {}
+        for row in reader:
+            month = _row_month(row)
+            if month and month < before_month:
+                months.setdefault(month, []).append(row)
+            else:
+                keep.append(row)
+    if not months:
+        return 0
+
+    segments = {segment['month']: segment for segment in load_segment_manifest(csv_path)}
+    for month, rows in sorted(months.items()):
+        segments[month] = _write_segment(csv_path, month, header, rows)
+    get_config_store(segment_manifest_path_for(csv_path)).save({
+        'version': 1,
+        'segments': [segments[month] for month in sorted(segments)]
+    })
+    _write_csv_file(csv_path, header, keep)
+
+    archived = sum(len(rows) for rows in months.values())
+    logger.info(f"Archived {archived} rows of {csv_path} into {len(months)} monthly segment(s)")
+    return archived
+
+
+def load_storage_settings(config_path=CONFIG_PATH):
+    """Read the 'storage' section of config.json, falling back to defaults."""
+    settings = dict(DEFAULT_STORAGE_SETTINGS)
+    try:
+        settings.update(get_config_store(config_path).load().get('storage') or {})
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Error loading storage settings: {e}")
+    return settings
+
+
+class CsvStorage:
+    """
+    Append-only CSV file, one row per speed test.
+
+    With monthly rotation, the first row of a new month moves the previous
+    months out of the file into compressed segments (see rotate_csv_log).
+    Rows are written through a DurableAppender with the given fsync policy.
+    """
+
+    backend = 'csv'
+
+    def __init__(self, csv_path, headers=None, rotation=None, fsync='always'):
+        self.csv_path = csv_path
+        self.headers = headers or CSV_HEADERS
+        self.rotation = rotation
+        self.writer = DurableAppender(csv_path, self.headers, fsync)
+        self.servers_writer = DurableAppender(servers_path_for(csv_path), SERVER_RESULT_HEADERS, fsync)
+
+    @property
+    def location(self):
+        return self.csv_path
+
+    def initialize(self):
+        """
+        Create the CSV file with headers if it doesn't exist, or repair a last
+        line torn by a crash if it does. Returns True if created.
+        """
+        if os.path.exists(self.csv_path):
+            with open_locked(self.csv_path):
+                repair_torn_tail(self.csv_path)
+            return False
+        _write_csv_file(self.csv_path, self.headers, [])
+        return True
+
+    def append(self, results):
+        """
+        Append one result dict.
+
+        Per-server results of a multi-server test go to a separate
+        <log>.servers.csv so the main log keeps its columns.
+
+        Raises:
+            OSError: The log isn't writable; the row is kept in memory and
+                written by the next append or flush()
+        """
+        if self.rotation == 'monthly':
+            try:
+                self._rotate_for(results['timestamp'][:7])
+            except Exception as e:
+                logger.warning(f"Failed to rotate {self.csv_path}: {e}")
+
+        self.writer.append([[results[header] for header in self.headers]])
+
+        if results.get('servers'):
+            self.servers_writer.append([
+                [results['timestamp']] + [server[h] for h in SERVER_RESULT_HEADERS[1:]]
+                for server in results['servers']
+            ])
+
+    def flush(self):
+        """Write rows still buffered in memory and sync pending group commits. Returns False if some remain buffered."""
+        return self.writer.flush() & self.servers_writer.flush()
+
+    def rotate(self, before_month=None):
+        """rotate_csv_log() under the append lock. Returns the number of rows archived."""
+        with open_locked(self.csv_path):
+            return rotate_csv_log(self.csv_path, before_month)
+
+    def _rotate_for(self, month):
+        """Archive earlier months once a row for `month` ('YYYY-MM') is about to be written."""
+        if not os.path.exists(self.csv_path):
+            return
+        first_month = None
+        with open(self.csv_path, 'r', newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            # Skip blank or damaged rows (e.g. a torn write) up to the first parseable one
+            for row in reader:
+                first_month = _row_month(row)
+                if first_month:
+                    break
+        if first_month and first_month < month:
+            self.rotate(month)
+
+    @staticmethod
+    def _outcomes(rows):
+        outcomes = []
+        for row in rows:
+            try:
+                epoch = timestamp_to_epoch(row[0])
+            except (ValueError, IndexError):
+                continue  # header or damaged row
+            try:
+                succeeded = len(row) >= 4 and all(float(value) >= 0 for value in row[1:4])
+            except ValueError:  # 'ERROR' measurements
+                succeeded = False
+            outcomes.append((epoch, succeeded))
+        return outcomes
+
+    def recent_outcomes(self, limit):
+        """
+        (epoch, succeeded) for the last `limit` tests, oldest first, failed tests
+        included. Only the end of the file is read, plus the latest archived
+        segments when the active file is shorter than that.
+        """
+        outcomes = []
+        if os.path.exists(self.csv_path):
+            with open(self.csv_path, 'rb') as file:
+                size = file.seek(0, os.SEEK_END)
+                start = max(0, size - limit * TAIL_BYTES_PER_ROW)
+                file.seek(start)
+                lines = file.read().decode('utf-8', errors='replace').splitlines()
+            if start > 0:
+                lines = lines[1:]  # partial first line
+            outcomes = self._outcomes(csv.reader(lines))
+
+        directory = os.path.dirname(os.path.abspath(self.csv_path))
+        for segment in reversed(load_segment_manifest(self.csv_path)):
+            if len(outcomes) >= limit:
+                break
+            with open_csv_text(os.path.join(directory, segment['file'])) as file:
+                outcomes = self._outcomes(csv.reader(file)) + outcomes
+        return outcomes[-limit:]
+
+    def iter_samples(self):
+        """Yield (epoch, {'download', 'upload', 'ping'}) for every successful, valid row, archived months included."""
+        for path in csv_log_parts(self.csv_path):
+            with open_csv_text(path) as file:
+                for row in csv.DictReader(file):
+                    try:
+                        yield timestamp_to_epoch(row['timestamp']), {
+                            'download': float(row['download_speed_mbps']),
+                            'upload': float(row['upload_speed_mbps']),
+                            'ping': float(row['ping_ms'])
+                        }
+                    except (ValueError, KeyError, TypeError):
+                        continue
+
+
+class SqliteStorage:
+    """
+    SQLite database in WAL mode with a timestamp index.
+
+    Timestamps are stored as integer epoch seconds of the logger's wall-clock
+    time. Failed tests are stored with status 'error' and NULL measurements
+    instead of the 'ERROR' strings used in the CSV.
+    """
+
+    backend = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS speed_tests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'ok',
+            download_speed_mbps REAL,
+            upload_speed_mbps REAL,
+            ping_ms REAL,
+            server_name TEXT,
+            server_country TEXT,
+            isp TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_speed_tests_timestamp ON speed_tests (timestamp);
+        CREATE TABLE IF NOT EXISTS speed_test_servers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            test_id INTEGER NOT NULL REFERENCES speed_tests (id),
+            server_id TEXT,
+            server_name TEXT,
+            server_country TEXT,
+            ping_ms REAL,
+            download_speed_mbps REAL,
+            upload_speed_mbps REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_speed_test_servers_test ON speed_test_servers (test_id);
+    """
+
+    COLUMNS = ('timestamp', 'status', 'download_speed_mbps', 'upload_speed_mbps',
+               'ping_ms', 'server_name', 'server_country', 'isp')
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    @property
+    def location(self):
+        return self.db_path
+
+    def connect(self, check_same_thread=True):
+        """Open a connection with the pragmas every reader and writer should use."""
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=check_same_thread)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def initialize(self):
+        """Create the database and schema if needed. Returns True if the file was created."""
+        created = not os.path.exists(self.db_path)
+        conn = self.connect()
+        try:
+            conn.executescript(self.SCHEMA)
+        finally:
+            conn.close()
+        return created
+
+    @staticmethod
+    def to_row(results):
+        """Map a logger result dict to a speed_tests row tuple."""
+        values = [results.get(key) for key in CSV_HEADERS[1:]]
+        if 'ERROR' in values[:3]:
+            return (timestamp_to_epoch(results['timestamp']), 'error') + (None,) * len(values)
+        measurements = tuple(float(v) for v in values[:3])
+        return (timestamp_to_epoch(results['timestamp']), 'ok') + measurements + tuple(values[3:])
+
+    def append(self, results):
+        """Insert one result dict, and its per-server results if any (raises on database errors)."""
+        if not results.get('servers'):
+            self.append_many([self.to_row(results)])
+            return
+
+        placeholders = ', '.join('?' * len(self.COLUMNS))
+        server_columns = SERVER_RESULT_HEADERS[1:]
+        conn = self.connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    f"INSERT INTO speed_tests ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+                    self.to_row(results)
+                )
+                conn.executemany(
+                    f"INSERT INTO speed_test_servers (test_id, {', '.join(server_columns)}) "
+                    f"VALUES (?, {', '.join('?' * len(server_columns))})",
+                    [(cursor.lastrowid,) + tuple(server[c] for c in server_columns) for server in results['servers']]
+                )
+        finally:
+            conn.close()
+
+    def append_many(self, rows):
+        placeholders = ', '.join('?' * len(self.COLUMNS))
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO speed_tests ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+                    rows
+                )
+        finally:
+            conn.close()
+
+    def read_after(self, last_id, conn=None):
+        """Successful rows with id greater than last_id, in insertion order."""
+        own_conn = conn is None
+        conn = conn or self.connect()
+        try:
+            return conn.execute(
+                "SELECT id, timestamp, download_speed_mbps, upload_speed_mbps, ping_ms, "
+                "server_name, server_country, isp FROM speed_tests "
+                "WHERE id > ? AND status = 'ok' ORDER BY id",
+                (last_id,)
+            ).fetchall()
+        finally:
+            if own_conn:
+                conn.close()
+
+    def read_range(self, start_epoch=None, end_epoch=None, include_errors=False, conn=None):
+        """Rows within [start_epoch, end_epoch) ordered by timestamp, using the timestamp index."""
+        clauses, params = [], []
+        if start_epoch is not None:
+            clauses.append('timestamp >= ?')
+            params.append(int(start_epoch))
+        if end_epoch is not None:
+            clauses.append('timestamp < ?')
+            params.append(int(end_epoch))
+        if not include_errors:
+            clauses.append("status = 'ok'")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        own_conn = conn is None
+        conn = conn or self.connect()
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM speed_tests {where} ORDER BY timestamp",
+                params
+            )
+            for row in cursor:
+                yield row
+        finally:
+            if own_conn:
+                conn.close()
+
+    def flush(self):
+        """Nothing is buffered: every insert is committed."""
+        return True
+
+    def recent_outcomes(self, limit):
+        """(epoch, succeeded) for the last `limit` tests, oldest first, failed tests included."""
+        if not os.path.exists(self.db_path):
+            return []
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT timestamp, status FROM speed_tests ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [(epoch, status == 'ok') for epoch, status in reversed(rows)]
+
+    def iter_samples(self):
+        """Yield (epoch, {'download', 'upload', 'ping'}) for every successful row."""
+        if not os.path.exists(self.db_path):
+            return
+        for row in self.read_range():
+            yield row[0], {'download': row[2], 'upload': row[3], 'ping': row[4]}
+
+    def import_csv(self, csv_path):
+        """
+        One-shot import of an existing CSV log, archived monthly segments included.
+
+        Returns:
+            Tuple of (imported_rows, skipped_rows)
+        """
+        self.initialize()
+        rows, skipped = [], 0
+        for path in csv_log_parts(csv_path):
+            with open_csv_text(path) as file:
+                for row in csv.DictReader(file):
+                    try:
+                        rows.append(self.to_row(row))
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.warning(f"Skipping invalid row: {row}, error: {e}")
+                        skipped += 1
+        self.append_many(rows)
+        return len(rows), skipped
+
+
+def open_storage(csv_filename, headers=None, config_path=CONFIG_PATH):
+    """
+    Open the storage backend selected in config.json.
+
+    Args:
+        csv_filename (str): CSV log path used by the csv backend
+        headers (list): CSV columns written by the calling logger
+    """
+    settings = load_storage_settings(config_path)
+    if settings.get('backend') == 'sqlite':
+        db_path = settings.get('sqlite_file') or DEFAULT_STORAGE_SETTINGS['sqlite_file']
+        if not os.path.isabs(db_path):
+            db_path = os.path.join(os.path.dirname(os.path.abspath(csv_filename)), db_path)
+        return SqliteStorage(db_path)
+    return CsvStorage(csv_filename, headers, settings.get('csv_rotation'), settings.get('csv_fsync', 'always'))
+
+
+def main():
+    """Command line entry point for the CSV importer."""
+    parser = argparse.ArgumentParser(description="Speed test storage tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import-csv", help="Import a CSV log into a SQLite database")
+    import_parser.add_argument("csv_file", help="Source CSV file")
+    import_parser.add_argument("db_file", help="Target SQLite database")
+
+    rotate_parser = subparsers.add_parser("rotate-csv", help="Move earlier months of a CSV log into compressed segments")
+    rotate_parser.add_argument("csv_file", help="Active CSV log")
+    rotate_parser.add_argument("--before", help="Archive months before YYYY-MM (default: the current month)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "import-csv":
+        storage = SqliteStorage(args.db_file)
+        imported, skipped = storage.import_csv(args.csv_file)
+        print(f"Imported {imported} rows into {args.db_file} ({skipped} invalid rows skipped)")
+    elif args.command == "rotate-csv":
+        archived = CsvStorage(args.csv_file).rotate(args.before)
+        segments = load_segment_manifest(args.csv_file)
+        print(f"Archived {archived} rows; {len(segments)} segment(s) listed in {segment_manifest_path_for(args.csv_file)}")
+
+
+if __name__ == "__main__":
+    main()
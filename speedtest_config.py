@@ -9,13 +9,16 @@ import os
 from datetime import datetime, timedelta
 
 class SpeedtestConfig:
-    def __init__(self, config_file="speedtest_settings.json"):
+    def __init__(self, config_file="speedtest_settings.json", history=None):
         self.config_file = config_file
+        # speed_scheduler.TestHistory providing the stored results' failure history
+        self.history = history
         self.default_config = {
             "test_interval": {
                 "hours": 1.0,  # Test every hour (recommended)
                 "min_interval": 0.25,  # Minimum 15 minutes between tests
-                "max_daily_tests": 24  # Maximum tests per day
+                "max_daily_tests": 24,  # Maximum tests per day
+                "jitter_minutes": 5  # Random delay after each scheduled slot
             },
             "retry_settings": {
                 "max_retries": 3,
@@ -28,7 +31,16 @@ class SpeedtestConfig:
                 "use_secure": True,
                 "use_single_connection": True,
                 "preferred_servers": [],  # Empty = auto-select
-                "exclude_servers": []
+                "exclude_servers": [],
+                "server_cache_hours": 24,  # Reuse ranked nearby servers for this long (0 = off)
+                "server_probe_count": 3,  # Cached candidates re-probed before each test
+                "parallel_servers": 1  # >1 measures against that many servers at once and sums throughput
+            },
+            "latency_probe": {
+                "enabled": False,  # Probe latency/jitter/loss between full tests
+                "interval_seconds": 5,
+                "timeout_seconds": 2,
+                "targets": ["tcp://1.1.1.1:443", "udp://1.1.1.1:53"]  # tcp://host:port or udp://host:port
             },
             "rate_limiting": {
                 "adaptive_interval": True,  # Increase interval on repeated failures
@@ -87,20 +99,21 @@ class SpeedtestConfig:
         if self.config["rate_limiting"]["adaptive_interval"]:
             # Check recent failure history
             failure_count = self._get_recent_failures()
-            if failure_count >= self.config["rate_limiting"]["error_threshold"]:
+            threshold = self.config["rate_limiting"]["error_threshold"]
+            if failure_count >= threshold:
                 # Increase interval after repeated failures
-                multiplier = self.config["rate_limiting"]["backoff_multiplier"]
-                adapted_interval = base_interval * (multiplier ** (failure_count - 2))
+                multiplier = self.config["retry_settings"]["backoff_multiplier"]
+                adapted_interval = base_interval * (multiplier ** (failure_count - threshold + 1))
                 max_interval = 6.0  # Cap at 6 hours
-                return min(adapted_interval, max_interval)
+                return max(base_interval, min(adapted_interval, max_interval))
         
         return base_interval
     
     def _get_recent_failures(self):
-        """Count recent failures (would need to be implemented with actual failure tracking)."""
-        # This would integrate with your logging system
-        # For now, return 0 (no failures)
-        return 0
+        """Count failed tests since the last `reset_success_count` consecutive successes."""
+        if self.history is None:
+            return 0
+        return self.history.recent_failures(self.config["rate_limiting"]["reset_success_count"])
     
     def get_speedtest_command(self):
         """Generate optimized speedtest command."""
@@ -0,0 +1,50 @@
+import os
+import json
+from datetime import datetime, timedelta
+
+from attempt_events import AttemptEventTail
+
+
+def write_events(path, *events, mode='a'):
+    with open(path, mode) as f:
+        for kind, timestamp in events:
+            f.write(json.dumps({'timestamp': timestamp.isoformat(timespec='seconds'), 'event': kind}) + '\n')
+
+
+def test_observer_skips_events_already_in_the_log(tmp_path):
+    path = str(tmp_path / 'log.events.jsonl')
+    now = datetime.now().astimezone()
+    write_events(path, ('success', now - timedelta(hours=2)), ('failure', now - timedelta(hours=1)))
+
+    tail = AttemptEventTail(path)
+    seen = []
+    tail.on_event = seen.append
+    tail.refresh()
+    assert seen == [] and len(tail.events) == 2
+
+    write_events(path, ('success', now - timedelta(hours=3)))
+    tail.refresh()
+    assert [event['event'] for event in seen] == ['success']
+
+
+def test_observer_counts_only_new_events_after_rotation(tmp_path):
+    path = str(tmp_path / 'log.events.jsonl')
+    now = datetime.now().astimezone()
+    tail = AttemptEventTail(path)
+    seen = []
+    tail.on_event = seen.append
+
+    write_events(path, ('start', now + timedelta(seconds=1)), ('success', now + timedelta(seconds=2)))
+    tail.refresh()
+    assert len(seen) == 2
+
+    # Rotated to a new file holding a new event, then replaced by one holding only old events
+    os.rename(path, path + '.1')
+    write_events(path, ('failure', now + timedelta(seconds=3)))
+    tail.refresh()
+    assert [event['event'] for event in seen] == ['start', 'success', 'failure']
+
+    write_events(path + '.tmp', ('success', now + timedelta(seconds=1)), ('failure', now + timedelta(seconds=3)), mode='w')
+    os.rename(path + '.tmp', path)
+    tail.refresh()
+    assert len(seen) == 3
@@ -0,0 +1,31 @@
+import json
+
+from config_store import ConfigStore
+
+
+def write_config(path, config):
+    with open(path, 'w') as f:
+        json.dump(config, f)
+
+
+def test_defaults_apply_after_a_load_without_defaults(tmp_path):
+    path = tmp_path / 'config.json'
+    write_config(path, {'admin': {'username': 'admin'}})
+    store = ConfigStore(str(path))
+
+    assert 'storage' not in store.load()
+    config = store.load(lambda: {'storage': {'backend': 'csv'}, 'admin': {'username': 'default'}})
+
+    assert config['storage'] == {'backend': 'csv'}
+    assert config['admin'] == {'username': 'admin'}
+    assert store.reads == 1
+
+
+def test_defaults_do_not_leak_into_later_loads(tmp_path):
+    path = tmp_path / 'config.json'
+    write_config(path, {})
+    store = ConfigStore(str(path))
+
+    store.load(lambda: {'storage': {'backend': 'csv'}})
+
+    assert store.load() == {}
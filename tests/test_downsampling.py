@@ -0,0 +1,25 @@
+import numpy as np
+
+from downsampling import downsample_indices, lttb_indices, minmax_indices
+
+
+def test_minmax_never_returns_more_than_max_points():
+    rng = np.random.default_rng(1)
+    series = [rng.random(1000) for _ in range(3)]
+    for max_points in range(1, 20):
+        assert len(minmax_indices(series, max_points)) <= max_points
+
+
+def test_minmax_keeps_extremes_when_there_is_room():
+    values = np.ones(1000)
+    values[123], values[456] = -5.0, 5.0
+    indices = minmax_indices([values], 10)
+    assert len(indices) <= 10
+    assert {0, 123, 456, 999} <= set(indices.tolist())
+
+
+def test_lttb_honours_thresholds_below_three():
+    y = np.arange(100, dtype=np.float64)
+    assert lttb_indices(y, y, 2).tolist() == [0, 99]
+    assert lttb_indices(y, y, 1).tolist() == [0]
+    assert len(downsample_indices(y, [y, y, y], 5, 'minmax')) <= 5
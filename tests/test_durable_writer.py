@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+import durable_writer
+from durable_writer import DurableAppender, torn_path_for
+
+
+@pytest.fixture
+def fsyncs(monkeypatch):
+    """Count fsync calls made by the writer."""
+    calls = []
+    fsync = durable_writer.os.fsync
+    monkeypatch.setattr(durable_writer.os, 'fsync', lambda fd: calls.append(fd) or fsync(fd))
+    return calls
+
+
+def read(path):
+    with open(path) as file:
+        return file.read()
+
+
+def test_batch_policy_syncs_idle_rows_within_group_seconds(tmp_path, fsyncs):
+    writer = DurableAppender(str(tmp_path / 'log.csv'), ['a', 'b'], 'batch', group_rows=3, group_seconds=0.1)
+    writer._last_sync = time.monotonic()
+    writer.append([[1, 2]])
+    assert fsyncs == [] and writer._unsynced == 1
+
+    # No further append comes; the timer syncs the row
+    deadline = time.monotonic() + 2
+    while writer._unsynced and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(fsyncs) == 1 and writer._unsynced == 0
+
+    # Reaching group_rows syncs immediately and disarms the timer
+    writer.append([[3, 4], [5, 6], [7, 8]])
+    assert len(fsyncs) == 2 and writer._timer is None
+    assert read(writer.path) == 'a,b\n1,2\n3,4\n5,6\n7,8\n'
+
+
+def test_a_torn_last_line_is_moved_aside_before_appending(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    with open(path, 'wb') as file:
+        file.write(b'a,b\n1,2\n3,\0\0\0')
+
+    DurableAppender(path, ['a', 'b']).append([[5, 6]])
+    assert read(path) == 'a,b\n1,2\n5,6\n'
+    assert read(torn_path_for(path)) == '3,\n'
+
+
+def test_rows_stay_buffered_while_the_file_is_unwritable(tmp_path, monkeypatch):
+    path = str(tmp_path / 'log.csv')
+    writer = DurableAppender(path, ['a', 'b'], max_buffered=2)
+    open_locked = durable_writer.open_locked
+
+    def read_only(*args):
+        raise OSError(30, 'Read-only file system')
+
+    monkeypatch.setattr(durable_writer, 'open_locked', read_only)
+    for value in (1, 2, 3):
+        with pytest.raises(OSError):
+            writer.append([[value, value]])
+    # Beyond max_buffered the oldest rows are dropped
+    assert writer.pending == [[2, 2], [3, 3]]
+    assert not writer.flush()
+
+    monkeypatch.setattr(durable_writer, 'open_locked', open_locked)
+    writer.append([[4, 4]])
+    assert writer.pending == []
+    assert read(path) == 'a,b\n2,2\n3,3\n4,4\n'
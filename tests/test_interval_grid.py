@@ -0,0 +1,61 @@
+import numpy as np
+
+from interval_grid import BLOCK_SLOTS, grid_indices
+
+HOUR = 3600
+# 2026-01-01 00:00 UTC, on an hour boundary
+START = 1767225600
+
+
+def picked(timestamps, **kwargs):
+    timestamps = np.array(timestamps, dtype=np.int64)
+    return timestamps[grid_indices(timestamps, **kwargs)].tolist()
+
+
+def hourly(hours, minute=5, start_hour=0):
+    return [START + (start_hour + hour) * HOUR + minute * 60 for hour in range(hours)]
+
+
+def test_manual_tests_and_retries_are_left_out():
+    scheduled = hourly(24)
+    extra = [scheduled[3] + 30 * 60, scheduled[10] + 120, scheduled[17] + 31 * 60]
+    assert picked(sorted(scheduled + extra)) == scheduled
+    assert grid_indices([]).tolist() == []
+
+
+def test_gaps_leave_slots_empty():
+    scheduled = hourly(48)
+    with_gaps = scheduled[:10] + scheduled[20:30] + scheduled[31:]
+    assert picked(with_gaps) == with_gaps
+
+
+def test_early_and_late_readings_fill_empty_slots_within_the_tolerance():
+    scheduled = hourly(24)
+    early = scheduled[5] - 20 * 60
+    late = scheduled[12] + 24 * 60
+    too_late = scheduled[18] + 28 * 60
+    timestamps = scheduled[:5] + [early] + scheduled[6:12] + [late] + scheduled[13:18] + [too_late] + scheduled[19:]
+    assert picked(timestamps) == [t for t in timestamps if t != too_late]
+
+    # With the on-time reading present, the slot keeps it over an early one
+    assert picked(sorted(scheduled + [early])) == scheduled
+    # A tighter tolerance drops the late reading
+    assert late not in picked(timestamps, tolerance=10 * 60)
+
+
+def test_each_block_follows_its_own_phase_after_a_restart():
+    # A week at :05, then the service restarts and tests land at :40
+    first_week = hourly(BLOCK_SLOTS)
+    second_week = hourly(BLOCK_SLOTS, minute=40, start_hour=BLOCK_SLOTS)
+    stray = second_week[50] - 35 * 60  # a manual test at :05 during the second week
+    assert picked(sorted(first_week + second_week + [stray])) == first_week + second_week
+
+
+def test_a_denser_schedule_keeps_one_reading_per_slot():
+    # The interval changed from an hour to 20 minutes halfway through
+    hourly_part = hourly(24)
+    dense_part = [START + 24 * HOUR + 5 * 60 + step * 20 * 60 for step in range(70)]
+    result = picked(hourly_part + dense_part)
+    assert result[:24] == hourly_part
+    assert result[24:] == dense_part[::3]
+    assert picked(dense_part, interval=20 * 60) == dense_part
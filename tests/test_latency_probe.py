@@ -0,0 +1,56 @@
+import asyncio
+
+from latency_probe import LatencyProber, MinuteAggregate, start_echo_server
+
+
+def probe_rounds(rounds, stop_server=False):
+    """Probe a local echo server over TCP and UDP; returns the per-minute rows by target."""
+    rows = []
+
+    async def main():
+        port, close = await start_echo_server()
+        if stop_server:
+            close()
+            await asyncio.sleep(0.05)
+        targets = [f'tcp://127.0.0.1:{port}', f'udp://127.0.0.1:{port}']
+        prober = LatencyProber(targets, rows.extend, interval_seconds=0.05, timeout_seconds=0.3)
+        try:
+            await prober.run(rounds=rounds)
+        finally:
+            close()
+        return targets
+
+    targets = asyncio.run(main())
+    return {scheme: [row for row in rows if row['target'] == target]
+            for scheme, target in zip(('tcp', 'udp'), targets)}
+
+
+def test_probes_measure_round_trips_to_the_echo_server():
+    for scheme, rows in probe_rounds(4).items():
+        # The rounds may straddle a minute boundary
+        assert sum(row['sent'] for row in rows) == 4, scheme
+        assert sum(row['received'] for row in rows) == 4, scheme
+        for row in rows:
+            assert row['loss_pct'] == 0.0
+            assert 0 <= row['min_ms'] <= row['p50_ms'] <= row['p95_ms'] <= row['max_ms'] < 300
+            assert row['min_ms'] <= row['avg_ms'] <= row['max_ms']
+            assert 0 <= row['jitter_ms'] <= row['max_ms'] - row['min_ms']
+
+
+def test_a_stopped_server_counts_as_loss():
+    for scheme, rows in probe_rounds(2, stop_server=True).items():
+        assert sum(row['sent'] for row in rows) == 2, scheme
+        for row in rows:
+            assert (row['received'], row['loss_pct']) == (0, 100.0)
+            assert row['p50_ms'] == row['jitter_ms'] == ''
+
+
+def test_minute_aggregate_jitter_and_loss():
+    aggregate = MinuteAggregate('2026-01-01 10:00:00', 'tcp://192.0.2.1:443')
+    for rtt in (10.0, 14.0, None, 11.0):
+        aggregate.add(rtt)
+    row = aggregate.to_row()
+    assert (row['sent'], row['received'], row['loss_pct']) == (4, 3, 25.0)
+    assert (row['min_ms'], row['p50_ms'], row['max_ms'], row['avg_ms']) == (10.0, 11.0, 14.0, 11.67)
+    # Mean absolute difference between consecutive answered probes
+    assert row['jitter_ms'] == 3.5
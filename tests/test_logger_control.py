@@ -0,0 +1,87 @@
+import os
+import socket
+import stat
+
+import pytest
+
+import web_interface
+from logger_control import ControlServer, send_control
+
+
+@pytest.fixture
+def control(tmp_path):
+    """A control server on a temporary socket with a logger-like handler."""
+    state = {'interval_hours': 1.0, 'reloads': 0}
+
+    def handler(message):
+        if message.get('command') == 'reload':
+            state['reloads'] += 1
+        elif message.get('command') != 'status':
+            return {'ok': False, 'error': f"Unknown command '{message.get('command')}'"}
+        return {'ok': True, 'interval_hours': state['interval_hours']}
+
+    server = ControlServer(handler, str(tmp_path / 'ctl.sock'))
+    assert server.start()
+    yield server, state
+    server.stop()
+
+
+def test_reload_round_trips_over_the_socket(control):
+    server, state = control
+    assert send_control({'command': 'reload'}, server.path) == {'ok': True, 'interval_hours': 1.0}
+    assert state['reloads'] == 1
+    assert send_control({'command': 'restart'}, server.path) == {'ok': False, 'error': "Unknown command 'restart'"}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(server.path)
+        conn.sendall(b'not json\n')
+        assert conn.recv(4096) == b'{"ok": false, "error": "Invalid JSON request"}\n'
+
+
+def test_a_live_socket_is_not_taken_over_but_a_stale_one_is(control, tmp_path):
+    server, _ = control
+    assert not ControlServer(lambda message: {'ok': True}, server.path).start()
+
+    stale = str(tmp_path / 'stale.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as orphan:
+        orphan.bind(stale)
+    replacement = ControlServer(lambda message: {'ok': True}, stale)
+    assert replacement.start()
+    assert send_control({'command': 'status'}, stale) == {'ok': True}
+    replacement.stop()
+    assert not os.path.exists(stale)
+
+
+@pytest.fixture
+def update_script(tmp_path, monkeypatch):
+    """update_interval.sh in the web interface's data dir, recording its argument."""
+    monkeypatch.setattr(web_interface, 'DATA_DIR', str(tmp_path))
+    script = tmp_path / 'update_interval.sh'
+    script.write_text(f'#!/bin/sh\necho "$1" > {tmp_path / "restarted"}\n')
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+    return tmp_path / 'restarted'
+
+
+def test_interval_changes_go_through_the_running_logger(control, update_script, monkeypatch):
+    server, state = control
+    monkeypatch.setattr(web_interface, 'send_control', lambda message: send_control(message, server.path))
+    state['interval_hours'] = 2.0
+
+    assert web_interface.update_service_interval(2.0)
+    assert state['reloads'] == 1
+    assert not update_script.exists()
+
+
+def test_interval_changes_fall_back_to_the_update_script(control, update_script, tmp_path, monkeypatch):
+    # A logger that kept its old interval
+    server, _ = control
+    monkeypatch.setattr(web_interface, 'send_control', lambda message: send_control(message, server.path))
+    assert web_interface.update_service_interval(2.0)
+    assert update_script.read_text() == '2.0\n'
+
+    # No logger listening at all
+    update_script.unlink()
+    missing = str(tmp_path / 'missing.sock')
+    monkeypatch.setattr(web_interface, 'send_control', lambda message: send_control(message, missing))
+    assert web_interface.update_service_interval(3.0)
+    assert update_script.read_text() == '3.0\n'
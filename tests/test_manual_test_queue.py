@@ -0,0 +1,66 @@
+import threading
+
+from manual_test_queue import ManualTestQueue
+
+
+def wait_finished(job, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if not job.active:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"job still {job.status}")
+
+
+def test_requests_while_a_test_is_queued_or_running_share_its_job():
+    started, release = threading.Event(), threading.Event()
+    changes = []
+
+    def run_test(on_phase):
+        started.set()
+        on_phase('download')
+        release.wait(5)
+        return True, 'ok', {'download_speed_mbps': 90.0}
+
+    test_queue = ManualTestQueue(run_test, changes.append)
+    job, created = test_queue.submit()
+    assert created
+    assert started.wait(5)
+
+    # Concurrent clicks while the test runs all get the same job
+    results = []
+    clicks = [threading.Thread(target=lambda: results.append(test_queue.submit())) for _ in range(8)]
+    for click in clicks:
+        click.start()
+    for click in clicks:
+        click.join()
+    assert results == [(job, False)] * 8
+    assert job.to_dict()['phase'] == 'download' and job.progress() == 0.33
+
+    release.set()
+    wait_finished(job)
+    assert (job.status, job.results) == ('done', {'download_speed_mbps': 90.0})
+    assert {'manual test queued', 'manual test started', 'manual test download'} <= set(changes)
+    assert changes[-1] == 'manual test finished'
+
+    # A finished job no longer absorbs requests
+    second, created = test_queue.submit()
+    assert created and second is not job
+    wait_finished(second)
+
+
+def test_failing_tests_finish_their_job_and_old_jobs_are_forgotten():
+    def run_test(on_phase):
+        raise RuntimeError('no route to host')
+
+    test_queue = ManualTestQueue(run_test, history_size=2)
+    jobs = []
+    for _ in range(3):
+        job, created = test_queue.submit()
+        assert created
+        wait_finished(job)
+        jobs.append(job)
+
+    assert jobs[0].status == 'failed'
+    assert jobs[0].message == 'Error running speed test: no route to host'
+    assert test_queue.get(jobs[0].id) is None
+    assert [test_queue.get(job.id) for job in jobs[1:]] == jobs[1:]
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from measurement_lock import measurement_lock, measurement_running
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_holders_in_one_process_take_turns(tmp_path):
+    path = str(tmp_path / 'speed_test.lock')
+    order = []
+
+    def second_test():
+        with measurement_lock(path):
+            order.append('second')
+
+    with measurement_lock(path):
+        assert measurement_running(path)
+        waiter = threading.Thread(target=second_test)
+        waiter.start()
+        time.sleep(0.1)
+        order.append('first done')
+    waiter.join(5)
+
+    assert order == ['first done', 'second']
+    assert not measurement_running(path)
+
+
+def test_the_lock_excludes_other_processes_and_dies_with_them(tmp_path):
+    path = str(tmp_path / 'speed_test.lock')
+    holder = subprocess.Popen(
+        [sys.executable, '-c',
+         'import sys\n'
+         'from measurement_lock import measurement_lock\n'
+         'with measurement_lock(sys.argv[1]):\n'
+         '    print("locked", flush=True)\n'
+         '    sys.stdin.read()\n',
+         path],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=REPO_DIR
+    )
+    try:
+        assert holder.stdout.readline() == 'locked\n'
+        assert measurement_running(path)
+    finally:
+        holder.kill()
+        holder.wait()
+
+    # flock is released with the process, even when it is killed
+    assert not measurement_running(path)
+    with measurement_lock(path):
+        pass
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import server_cache
+from server_cache import ServerSelectionCache, UNREACHABLE_MS
+
+KEY = 'Afrihost|192.0.2.1'
+
+
+def server(number):
+    return {'id': str(number), 'name': f'Server {number}', 'latency': 99.0}
+
+
+def test_candidates_expire_after_the_ttl(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(server_cache, 'time', SimpleNamespace(time=lambda: now[0]))
+    cache = ServerSelectionCache(str(tmp_path / 'server_cache.json'), ttl_hours=1)
+    cache.store_candidates(KEY, [(8.0, server(1)), (12.0, server(2))])
+
+    assert cache.candidates(KEY) == [{'id': '1', 'name': 'Server 1'}, {'id': '2', 'name': 'Server 2'}]
+    now[0] += 3600
+    assert len(cache.candidates(KEY)) == 2
+    now[0] += 1
+    assert cache.candidates(KEY) is None
+
+
+def test_candidates_need_the_same_server_preferences(tmp_path):
+    cache = ServerSelectionCache(str(tmp_path / 'server_cache.json'))
+    cache.store_candidates(KEY, [(8.0, server(1)), (12.0, server(2))], preferred=[1, 2])
+
+    assert cache.candidates(KEY, preferred=['2', '1']) is not None
+    assert cache.candidates(KEY) is None
+    assert cache.candidates(KEY, preferred=[1, 2], exclude=[1]) is None
+    assert cache.candidates('Other ISP|192.0.2.9', preferred=[1, 2]) is None
+
+
+def test_reprobes_rerank_by_median_latency_and_invalidate_drops_the_entry(tmp_path):
+    cache = ServerSelectionCache(str(tmp_path / 'server_cache.json'))
+    cache.store_candidates(KEY, [(8.0, server(1)), (12.0, server(2))])
+
+    cache.record_probes(KEY, [(UNREACHABLE_MS, server(1)), (11.0, server(2))])
+    assert [s['id'] for s in cache.candidates(KEY)] == ['2', '1']
+    cache.record_probes(KEY, [(7.0, server(1))])
+    assert [s['id'] for s in cache.candidates(KEY)] == ['1', '2']
+
+    cache.invalidate(KEY)
+    assert cache.candidates(KEY) is None
@@ -0,0 +1,183 @@
+import os
+
+import numpy as np
+
+from speed_data import SpeedDataCache, parse_timestamps
+
+HEADER = 'timestamp,download_speed_mbps,upload_speed_mbps,ping_ms,server_name,server_country,isp\n'
+
+
+def row(timestamp, download=90.0, server='Vox'):
+    return f'{timestamp},{download},20.0,10.0,{server},South Africa,Afrihost\n'
+
+
+def write(path, text, mode='a'):
+    with open(path, mode) as f:
+        f.write(text)
+
+
+def test_appended_rows_are_parsed_incrementally(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    write(path, HEADER + row('2026-01-01 10:00:00') + row('2026-01-01 11:00:00'), 'w')
+    cache = SpeedDataCache(path)
+    first = cache.get_frame()
+    version = cache.version
+    assert len(first) == 2
+
+    # Unchanged size and mtime: the same snapshot object
+    assert cache.get_frame() is first and cache.version == version
+
+    offset = cache._offset
+    write(path, row('2026-01-01 12:00:00', 50.0) + '2026-01-01 13:00')
+    frame = cache.get_frame()
+    assert len(frame) == 3 and cache.version > version
+    # Only the complete new line was consumed; the partial one waits for its newline
+    assert cache._offset == offset + len(row('2026-01-01 12:00:00', 50.0))
+    assert len(first) == 2
+
+    write(path, ':00,60.0,20.0,10.0,Vox,South Africa,Afrihost\n')
+    assert cache.get_frame().download.tolist() == [90.0, 90.0, 50.0, 60.0]
+
+
+def test_truncated_or_replaced_file_is_reloaded(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    write(path, HEADER + row('2026-01-01 10:00:00') + row('2026-01-01 11:00:00'), 'w')
+    cache = SpeedDataCache(path)
+    assert len(cache.get_frame()) == 2
+
+    write(path, HEADER + row('2026-02-01 10:00:00', 40.0), 'w')
+    assert cache.get_frame().download.tolist() == [40.0]
+
+    replacement = str(tmp_path / 'new.csv')
+    write(replacement, HEADER + row('2026-03-01 10:00:00', 30.0) + row('2026-03-01 11:00:00', 31.0), 'w')
+    os.replace(replacement, path)
+    assert cache.get_frame().download.tolist() == [30.0, 31.0]
+
+    os.remove(path)
+    assert len(cache.get_frame()) == 0
+
+
+def test_window_boundaries(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    write(path, HEADER + ''.join(row(f'2026-01-01 {hour:02d}:00:00') for hour in range(10, 15)), 'w')
+    frame = SpeedDataCache(path).get_frame()
+    ten, twelve, fourteen = parse_timestamps(['2026-01-01 10:00:00', '2026-01-01 12:00:00', '2026-01-01 14:00:00'])
+
+    # Start inclusive, end exclusive
+    assert frame.locate(twelve, fourteen) == (2, 4)
+    assert frame.locate() == (0, 5)
+    assert frame.locate(fourteen + 1) == (5, 5)
+    assert frame.locate(fourteen, ten) == (4, 4)
+    assert np.array_equal(frame.window(ten, twelve).timestamps, frame.timestamps[:2])
+    assert len(frame.since(twelve)) == 3
+    assert len(frame.since(twelve + 1)) == 2
+    assert len(frame.since(ten - 3600)) == 5
+    assert len(frame.tail(2)) == 2 and len(frame.tail(0)) == 0
+
+
+def test_columns_use_compact_dtypes_and_shared_code_tables(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    write(path, HEADER + row('2026-01-01 10:00:00', 91.25, 'Vox') + row('2026-01-01 11:00:00', 88.5, 'Rain')
+          + row('2026-01-01 12:00:00', 70.0, 'Vox') + '2026-01-01 13:00:00,ERROR,ERROR,ERROR,,,\n', 'w')
+    frame = SpeedDataCache(path).get_frame()
+
+    assert frame.timestamps.dtype == np.int64
+    assert frame.download.dtype == frame.upload.dtype == frame.ping.dtype == np.float32
+    assert all(codes.dtype == np.int32 for codes in frame.codes.values())
+    # ERROR rows are left out; repeated server names share one code
+    assert len(frame) == 3
+    assert frame.codes['server_name'].tolist() == [0, 1, 0]
+    assert frame.categoricals['server_name'].categories == ['Vox', 'Rain']
+    assert frame.categoricals['server_name'].decode(np.array([1, -1], dtype=np.int32)) == ['Rain', None]
+
+
+def test_to_records_round_trips_the_csv_rows(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    write(path, HEADER + row('2026-01-01 10:00:00', 91.25, 'Vox') + row('2026-01-01 11:00:00', 88.57, 'Rain'), 'w')
+    assert SpeedDataCache(path).get_data() == [
+        {'timestamp': '2026-01-01 10:00:00', 'download_speed_mbps': 91.25, 'upload_speed_mbps': 20.0,
+         'ping_ms': 10.0, 'server_name': 'Vox', 'server_country': 'South Africa', 'isp': 'Afrihost'},
+        {'timestamp': '2026-01-01 11:00:00', 'download_speed_mbps': 88.57, 'upload_speed_mbps': 20.0,
+         'ping_ms': 10.0, 'server_name': 'Rain', 'server_country': 'South Africa', 'isp': 'Afrihost'}
+    ]
+
+    # Legacy 4-column logs have no server fields in their records
+    legacy = str(tmp_path / 'legacy.csv')
+    write(legacy, 'timestamp,download_speed_mbps,upload_speed_mbps,ping_ms\n2026-01-01 10:00:00,91.25,20.0,10.0\n', 'w')
+    assert SpeedDataCache(legacy).get_data() == [
+        {'timestamp': '2026-01-01 10:00:00', 'download_speed_mbps': 91.25, 'upload_speed_mbps': 20.0, 'ping_ms': 10.0}
+    ]
+
+
+def test_sqlite_rows_committed_during_a_refresh_are_read_once(tmp_path):
+    from speed_data import SqliteSpeedDataCache
+    from speed_storage import SqliteStorage
+
+    db_path = str(tmp_path / 'log.db')
+    storage = SqliteStorage(db_path)
+    storage.initialize()
+    result = {'timestamp': '2026-01-01 10:00:00', 'download_speed_mbps': 90.0, 'upload_speed_mbps': 20.0,
+              'ping_ms': 10.0, 'server_name': 'Vox', 'server_country': 'South Africa', 'isp': 'Afrihost'}
+    storage.append(result)
+
+    cache = SqliteSpeedDataCache(db_path)
+    read_after = cache.storage.read_after
+
+    def read_after_racing_a_logger(last_id, conn):
+        # The logger commits right after the cache took MAX(id)
+        storage.append(dict(result, timestamp='2026-01-01 11:00:00'))
+        cache.storage.read_after = read_after
+        return read_after(last_id, conn)
+
+    cache.storage.read_after = read_after_racing_a_logger
+    assert len(cache.get_frame()) == 2
+
+    storage.append(dict(result, timestamp='2026-01-01 12:00:00'))
+    assert len(cache.get_frame()) == 3
+
+
+def test_sqlite_windows_are_range_queries_until_the_full_history_is_read(tmp_path):
+    from speed_data import SqliteSpeedDataCache, parse_timestamps
+    from speed_storage import SqliteStorage
+
+    db_path = str(tmp_path / 'log.db')
+    storage = SqliteStorage(db_path)
+    storage.initialize()
+    result = {'download_speed_mbps': 90.0, 'upload_speed_mbps': 20.0, 'ping_ms': 10.0,
+              'server_name': 'Vox', 'server_country': 'South Africa', 'isp': 'Afrihost'}
+    for hour in (9, 10, 11):
+        storage.append(dict(result, timestamp=f'2026-01-01 {hour:02d}:00:00'))
+    start, end = parse_timestamps(['2026-01-01 10:00:00', '2026-01-01 11:00:00'])
+
+    cache = SqliteSpeedDataCache(db_path)
+    window = cache.get_frame(start, end)
+    assert list(window.timestamps) == [start]
+    assert window.to_records()[0]['server_name'] == 'Vox'
+    # Only the window was read; the id-based snapshot is still empty
+    assert cache._last_id == 0 and len(cache._frame) == 0
+    assert cache.get_frame(start, end) is window
+
+    storage.append(dict(result, timestamp='2026-01-01 10:30:00'))
+    assert len(cache.get_frame(start, end)) == 2
+
+    assert len(cache.get_frame()) == 4
+    assert list(cache.get_frame(start).timestamps) == [start, start + 1800, end]
+
+
+def test_segmented_cache_drops_only_rows_already_archived(tmp_path):
+    from speed_data import SegmentedSpeedDataCache
+    from speed_storage import rotate_csv_log
+
+    path = str(tmp_path / 'log.csv')
+    january = row('2026-01-10 10:00:00', 80.0) + row('2026-01-20 10:00:00', 81.0)
+    write(path, HEADER + january + row('2026-02-01 10:00:00', 82.0), 'w')
+    assert rotate_csv_log(path, before_month='2026-02') == 2
+    cache = SegmentedSpeedDataCache(path)
+    assert cache.get_frame().download.tolist() == [80.0, 81.0, 82.0]
+
+    # A rotation interrupted before the active file was replaced leaves the January rows in it,
+    # next to a backfilled January row that only the active file has
+    replacement = str(tmp_path / 'replacement.csv')
+    write(replacement, HEADER + january + row('2026-01-15 10:00:00', 70.0) + row('2026-02-01 10:00:00', 82.0), 'w')
+    os.replace(replacement, path)
+    assert cache.get_frame().download.tolist() == [80.0, 70.0, 81.0, 82.0]
@@ -0,0 +1,196 @@
+from types import SimpleNamespace
+
+import pytest
+
+import speed_engine
+from server_cache import ServerSelectionCache
+from speed_engine import SpeedTestEngine, SpeedTestError, RateLimitedError
+
+SERVERS = [
+    {'id': str(number), 'name': f'Server {number}', 'country': 'South Africa', 'host': f's{number}.example:8080'}
+    for number in range(1, 6)
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSpeedtest:
+    """speedtest.Speedtest stand-in: latencies and speeds per server id, time taken from a FakeClock."""
+
+    instances = []
+
+    def __init__(self, timeout=10, secure=False):
+        self.timeout = timeout
+        self.secure = secure
+        self.config = {'client': {'isp': 'Afrihost', 'ip': '192.0.2.1'}}
+        self.best = None
+        self.instances.append(self)
+
+    def get_config(self):
+        pass
+
+    def get_servers(self, servers=None, exclude=None):
+        pass
+
+    def get_closest_servers(self, limit=5):
+        return [dict(server) for server in SERVERS[:limit]]
+
+    def get_best_server(self, servers):
+        self.clock.now += 1
+        self.probed.append(servers[0]['id'])
+        server = dict(servers[0], latency=self.latencies.get(servers[0]['id'], 10.0))
+        self.best = server
+        return server
+
+    def download(self, threads=None):
+        self.clock.now += 10
+        return self._measure(self.downloads)
+
+    def upload(self, threads=None):
+        self.clock.now += 4
+        return self._measure(self.uploads)
+
+    def _measure(self, speeds):
+        speed = speeds.get(self.best['id'], 50_000_000)
+        if isinstance(speed, Exception):
+            raise speed
+        return speed
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(speed_engine, 'time', SimpleNamespace(monotonic=clock))
+    FakeSpeedtest.instances = []
+    FakeSpeedtest.probed = []
+    FakeSpeedtest.clock = clock
+    FakeSpeedtest.latencies = {'1': 8.0, '2': 12.0, '3': 15.0, '4': 20.0, '5': 25.0}
+    FakeSpeedtest.downloads = {}
+    FakeSpeedtest.uploads = {}
+    monkeypatch.setattr(speed_engine, 'speedtest', SimpleNamespace(Speedtest=FakeSpeedtest))
+    return FakeSpeedtest
+
+
+def settings(**options):
+    return SimpleNamespace(config={'speedtest_options': dict({'server_cache_hours': 0}, **options)})
+
+
+def test_run_times_each_phase(fake):
+    fake.downloads = {'1': 93_456_000}
+    fake.uploads = {'1': 21_000_000}
+    phases = []
+
+    result = SpeedTestEngine().run(on_phase=phases.append)
+    assert phases == ['ping', 'download', 'upload']
+    # Five closest servers probed one second each; the fastest was probed last, so no re-probe
+    assert result['phase_seconds'] == {'server_selection': 5.0, 'download': 10.0, 'upload': 4.0}
+    assert (result['download_speed_mbps'], result['upload_speed_mbps'], result['ping_ms']) == (93.46, 21.0, 8.0)
+    assert (result['server_name'], result['isp']) == ('Server 1', 'Afrihost')
+
+
+def test_failed_runs_raise_and_start_from_a_fresh_client(fake):
+    engine = SpeedTestEngine()
+    fake.downloads = {'1': RuntimeError('connection reset')}
+    with pytest.raises(SpeedTestError, match='connection reset'):
+        engine.run()
+    assert engine.runs == 0
+
+    fake.downloads = {'1': RuntimeError('HTTP Error 403: Forbidden')}
+    with pytest.raises(RateLimitedError):
+        engine.run()
+
+    fake.downloads = {}
+    assert engine.run()['download_speed_mbps'] == 50.0
+    assert len(fake.instances) == 3 and engine.runs == 1
+
+
+def test_configure_applies_on_the_next_run(fake):
+    engine = SpeedTestEngine(timeout=60)
+    engine.run()
+
+    engine.configure(settings(server_probe_count=2))
+    assert engine.probe_count == 3
+    engine.run()
+    assert engine.probe_count == 2
+    assert len(fake.instances) == 1
+
+    # A new timeout needs a new client
+    engine.configure(settings(timeout=30))
+    assert engine.timeout == 60
+    engine.run()
+    assert len(fake.instances) == 2 and fake.instances[-1].timeout == 30
+
+
+def test_parallel_runs_sum_throughput_over_reachable_servers(fake):
+    fake.latencies['2'] = speed_engine.UNREACHABLE_MS
+    fake.downloads = {'1': 40_000_000, '3': 30_000_000, '4': 20_000_000}
+    fake.uploads = {'1': 10_000_000, '3': 5_000_000, '4': 5_000_000}
+
+    result = SpeedTestEngine(parallel_servers=3).run()
+    assert [server['server_name'] for server in result['servers']] == ['Server 1', 'Server 3', 'Server 4']
+    assert (result['download_speed_mbps'], result['upload_speed_mbps']) == (90.0, 20.0)
+    assert [server['download_speed_mbps'] for server in result['servers']] == [40.0, 30.0, 20.0]
+    # Ping and server fields describe the fastest server
+    assert (result['ping_ms'], result['server_name']) == (8.0, 'Server 1')
+    assert set(result['phase_seconds']) == {'server_selection', 'download', 'upload'}
+    assert len(fake.instances) == 3
+
+
+def test_parallel_runs_fail_whole_when_one_server_fails(fake):
+    engine = SpeedTestEngine(parallel_servers=2)
+    fake.uploads = {'2': RuntimeError('upload timed out')}
+    with pytest.raises(SpeedTestError, match='upload timed out'):
+        engine.run()
+    assert engine.runs == 0
+
+    # Every client is replaced after a failure
+    fake.uploads = {}
+    assert engine.run()['download_speed_mbps'] == 100.0
+    assert len(fake.instances) == 4
+
+
+def test_probes_run_last_to_first_and_reprobe_only_a_later_winner(fake):
+    client = FakeSpeedtest()
+    probes = SpeedTestEngine._probe(client, SERVERS[:3])
+    assert fake.probed == ['3', '2', '1']
+    assert [server['id'] for latency, server in probes] == ['1', '2', '3']
+    assert client.best['id'] == '1'
+
+    fake.probed.clear()
+    fake.latencies['3'] = 5.0
+    probes = SpeedTestEngine._probe(client, SERVERS[:3])
+    assert fake.probed == ['3', '2', '1', '3']
+    assert client.best['id'] == '3' and probes[0][1]['id'] == '3'
+
+    # Equal latencies keep the list's order
+    fake.probed.clear()
+    fake.latencies.update({'1': 10.0, '2': 10.0, '3': 10.0})
+    probes = SpeedTestEngine._probe(client, SERVERS[:3])
+    assert [server['id'] for latency, server in probes] == ['1', '2', '3']
+    assert fake.probed == ['3', '2', '1']
+
+
+def test_cached_servers_are_reused_until_a_run_fails(fake, tmp_path):
+    engine = SpeedTestEngine(server_cache=ServerSelectionCache(str(tmp_path / 'server_cache.json')), probe_count=2)
+    engine.run()
+    assert engine.server_list_fetches == 1
+
+    fake.probed.clear()
+    assert engine.run()['server_name'] == 'Server 1'
+    assert engine.server_list_fetches == 1
+    assert fake.probed == ['2', '1']
+
+    fake.downloads = {'1': RuntimeError('connection reset')}
+    with pytest.raises(SpeedTestError):
+        engine.run()
+    assert engine.server_cache.candidates('Afrihost|192.0.2.1') is None
+
+    fake.downloads = {}
+    engine.run()
+    assert engine.server_list_fetches == 2
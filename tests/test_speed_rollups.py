@@ -0,0 +1,30 @@
+import random
+
+from speed_rollups import LogHistogram, RollupStore
+
+
+def test_histogram_counts_samples_below_a_value():
+    histogram = LogHistogram()
+    for value in (0.0, 10.0, 20.0, 30.0, 40.0):
+        histogram.add(value)
+    assert histogram.count_below(0) == 0
+    assert histogram.count_below(5) == 1
+    assert histogram.count_below(25) == 3
+    assert histogram.count_below(100) == 5
+
+
+def test_total_merges_buckets_and_distribution_bands_add_up(tmp_path):
+    rng = random.Random(3)
+    epochs = [1_700_000_000 + i * 3600 for i in range(24 * 10)]
+    speeds = [rng.uniform(20, 120) for _ in epochs]
+    store = RollupStore(str(tmp_path / 'log.rollups.db'))
+    store.rebuild([(epoch, {'download': speed, 'upload': speed / 5, 'ping': 10.0}) for epoch, speed in zip(epochs, speeds)])
+
+    total = store.total('day', 'download')
+    assert total.count == len(speeds)
+
+    below = [total.histogram.count_below(share * 100) for share in (1, 0.75, 0.5)]
+    assert below == sorted(below, reverse=True)
+    for estimate, share in zip(below, (1, 0.75, 0.5)):
+        exact = sum(speed < share * 100 for speed in speeds)
+        assert abs(estimate - exact) <= 0.02 * len(speeds)
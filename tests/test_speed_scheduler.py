@@ -0,0 +1,41 @@
+import random
+from datetime import datetime, timedelta
+
+import speed_scheduler
+from speedtest_config import SpeedtestConfig
+
+
+class StaticHistory:
+    def __init__(self, outcomes=()):
+        self._outcomes = list(outcomes)
+
+    def outcomes(self):
+        return self._outcomes
+
+    def recent_failures(self, reset_success_count):
+        return 0
+
+
+def make_scheduler(tmp_path, outcomes=(), **test_interval):
+    settings = SpeedtestConfig(str(tmp_path / 'speedtest_settings.json'))
+    settings.config['test_interval'].update(test_interval)
+    return speed_scheduler.TestScheduler(settings, StaticHistory(outcomes), rng=random.Random(7))
+
+
+def test_immediate_run_is_jittered(tmp_path):
+    now = datetime(2026, 1, 1, 12, 30)
+    scheduler = make_scheduler(tmp_path, jitter_minutes=5)
+    runs = [scheduler.next_run(now) for _ in range(20)]
+    assert all(now <= run <= now + timedelta(minutes=5) for run in runs)
+    assert len(set(runs)) > 1
+
+
+def test_jitter_is_bounded_by_the_interval(tmp_path):
+    now = datetime(2026, 1, 1, 12, 30)
+    scheduler = make_scheduler(tmp_path, hours=0.25, min_interval=0.25, jitter_minutes=60)
+    for _ in range(20):
+        assert scheduler.next_run(now) <= now + timedelta(minutes=15)
+    last_test = now - timedelta(minutes=5)
+    scheduler.history = StaticHistory([(last_test, True)])
+    for _ in range(20):
+        assert scheduler.next_run(now) <= datetime(2026, 1, 1, 12, 45) + timedelta(minutes=15)
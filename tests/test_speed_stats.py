@@ -0,0 +1,36 @@
+import numpy as np
+
+from speed_stats import LogHistogram, MetricStats, summarize_values
+
+
+def test_sketch_percentiles_stay_within_observed_range():
+    constant = MetricStats.from_values(np.full(50, 100.0)).summary()
+    assert constant['p5'] == constant['p50'] == constant['p95'] == 100.0
+
+    spread = MetricStats.from_values(np.linspace(0.5, 10.0, 200)).summary()
+    assert spread['min'] <= spread['p5'] <= spread['p95'] <= spread['max'] == 10.0
+
+
+def test_merged_sketch_percentiles_stay_within_observed_range():
+    merged = MetricStats.from_values(np.full(10, 100.0))
+    merged.merge(MetricStats.from_values(np.full(10, 100.0)))
+    assert merged.summary()['p95'] == 100.0
+
+
+def test_summarize_values_uses_exact_percentiles():
+    values = np.arange(1, 101, dtype=np.float64)
+    summary = summarize_values(values)
+    assert summary['p50'] == round(float(np.percentile(values, 50)), 2)
+    assert summary['p95'] == round(float(np.percentile(values, 95)), 2)
+    assert summarize_values(np.full(5, 100.0))['p5'] == 100.0
+    assert summarize_values(np.array([]))['count'] == 0
+
+
+def test_quantiles_past_the_last_bin_report_the_top_bin():
+    histogram = LogHistogram()
+    histogram.add_array(np.array([1.0, 10.0, 100.0]))
+    top = LogHistogram.GAMMA ** (max(histogram.bins) + 0.5)
+    assert histogram.quantile(1.0) == top
+    # A rank beyond the samples runs out of bins and falls back to the highest one
+    assert histogram.quantiles([0.5, 1.5]) == [histogram.quantile(0.5), top]
+    assert LogHistogram().quantile(0.5) is None
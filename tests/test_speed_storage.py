@@ -0,0 +1,27 @@
+import csv
+
+from speed_storage import CsvStorage, CSV_HEADERS, load_segment_manifest
+
+
+def result(timestamp, download=90.0):
+    return {'timestamp': timestamp, 'download_speed_mbps': download, 'upload_speed_mbps': 20.0, 'ping_ms': 10.0,
+            'server_name': 'Vox', 'server_country': 'South Africa', 'isp': 'Afrihost'}
+
+
+def test_monthly_rotation_looks_past_damaged_leading_rows(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADERS)
+        writer.writerow([])
+        writer.writerow(['2026-01-1'])
+        writer.writerow([result('2026-01-10 10:00:00')[header] for header in CSV_HEADERS])
+
+    storage = CsvStorage(path, rotation='monthly')
+    storage.append(result('2026-02-01 10:00:00'))
+
+    assert [segment['month'] for segment in load_segment_manifest(path)] == ['2026-01']
+    with open(path, newline='') as file:
+        timestamps = [row[0] for row in csv.reader(file) if row]
+    assert timestamps[0] == 'timestamp' and timestamps[-1] == '2026-02-01 10:00:00'
+    assert '2026-01-10 10:00:00' not in timestamps
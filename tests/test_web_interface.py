@@ -0,0 +1,193 @@
+import csv
+import io
+import subprocess
+import zlib
+
+import pytest
+
+import web_interface
+from attempt_events import AttemptEventLog, events_path_for
+from speed_storage import rotate_csv_log
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(web_interface, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(web_interface, 'CSV_PATH', str(tmp_path / 'internet_speed_log.csv'))
+    monkeypatch.setattr(web_interface, 'CONFIG_PATH', str(tmp_path / 'config.json'))
+    web_interface.response_cache._entries.clear()
+    web_interface.stream_update_cache._entries.clear()
+    return web_interface.app.test_client()
+
+
+def write_log(path, header, rows):
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def test_metrics_are_served_to_local_clients(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'speedlogger_http_request_duration_seconds' in response.data
+
+
+def test_metrics_need_an_admin_session_from_elsewhere(client):
+    remote = {'REMOTE_ADDR': '192.168.1.50'}
+    assert client.get('/metrics', environ_base=remote).status_code == 403
+
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    assert client.get('/metrics', environ_base=remote).status_code == 200
+
+
+def test_filtered_csv_streams_gzip_across_segments(client, tmp_path):
+    header = ['timestamp', 'download_speed_mbps', 'upload_speed_mbps', 'ping_ms', 'server_name', 'server_country', 'isp']
+    write_log(str(tmp_path / 'internet_speed_log.csv'), header, [
+        ['2026-01-10 10:00:00', '80.0', '20.0', '10.0', 'Vox', 'South Africa', 'Afrihost'],
+        ['2026-01-20 10:00:00', '81.0', '20.0', '10.0', 'Vox', 'South Africa', 'Afrihost'],
+        ['2026-02-01 10:00:00', '82.0', '20.0', '10.0', 'Rain', 'South Africa', 'Afrihost'],
+        ['2026-02-02 10:00:00', '83.0', '20.0', '10.0', 'Rain', 'South Africa', 'Afrihost'],
+    ])
+    assert rotate_csv_log(str(tmp_path / 'internet_speed_log.csv'), before_month='2026-02') == 2
+
+    # A bare end date covers that whole day; the January rows come from the archived segment
+    response = client.get('/download/filtered-csv?start=2026-01-15&end=2026-02-01'
+                          '&columns=timestamp,download_speed_mbps,server_name&gzip=1')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/gzip'
+    assert '.csv.gz' in response.headers['Content-Disposition']
+    text = zlib.decompress(response.data, wbits=31).decode('utf-8')
+    assert list(csv.reader(io.StringIO(text))) == [
+        ['timestamp', 'download_speed_mbps', 'server_name'],
+        ['2026-01-20 10:00:00', '81.0', 'Vox'],
+        ['2026-02-01 10:00:00', '82.0', 'Rain'],
+    ]
+
+
+def test_filtered_csv_rejects_bad_filters(client, tmp_path):
+    write_log(str(tmp_path / 'internet_speed_log.csv'), ['timestamp', 'download_speed_mbps', 'upload_speed_mbps', 'ping_ms'],
+              [['2026-01-10 10:00:00', '80.0', '20.0', '10.0']])
+    assert client.get('/download/filtered-csv?columns=timestamp,isp').status_code == 400
+    assert client.get('/download/filtered-csv?start=10/01/2026').status_code == 400
+    assert client.get('/download/filtered-csv?start=2026-02-01').status_code == 404
+
+
+def test_full_csv_download_joins_segments_under_the_active_header(client, tmp_path):
+    csv_path = str(tmp_path / 'internet_speed_log.csv')
+    write_log(csv_path, ['timestamp', 'download_speed_mbps', 'upload_speed_mbps', 'ping_ms'], [
+        ['2026-01-10 10:00:00', '80.0', '20.0', '10.0'],
+        ['2026-02-01 10:00:00', '82.0', '20.0', '10.0'],
+    ])
+    rotate_csv_log(csv_path, before_month='2026-02')
+    # The active file has since gained the server columns
+    header = ['timestamp', 'download_speed_mbps', 'upload_speed_mbps', 'ping_ms', 'server_name', 'server_country', 'isp']
+    write_log(csv_path, header, [
+        ['2026-02-01 10:00:00', '82.0', '20.0', '10.0', '', '', ''],
+        ['2026-02-02 10:00:00', '83.0', '20.0', '10.0', 'Vox', 'South Africa', 'Afrihost'],
+    ])
+
+    response = client.get('/download/csv')
+    assert response.status_code == 200
+    assert list(csv.reader(io.StringIO(response.data.decode('utf-8')))) == [
+        header,
+        ['2026-01-10 10:00:00', '80.0', '20.0', '10.0', '', '', ''],
+        ['2026-02-01 10:00:00', '82.0', '20.0', '10.0', '', '', ''],
+        ['2026-02-02 10:00:00', '83.0', '20.0', '10.0', 'Vox', 'South Africa', 'Afrihost'],
+    ]
+
+
+def test_json_responses_carry_etags_until_the_data_changes(client, tmp_path):
+    csv_path = str(tmp_path / 'internet_speed_log.csv')
+    header = ['timestamp', 'download_speed_mbps', 'upload_speed_mbps', 'ping_ms']
+    write_log(csv_path, header, [['2026-01-10 10:00:00', '80.0', '20.0', '10.0']])
+
+    first = client.get('/api/data')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    hits = web_interface.response_cache.hits
+    revalidated = client.get('/api/data', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == etag
+    assert web_interface.response_cache.hits == hits + 1
+
+    # A new row changes get_data_version(), so the cached body and its ETag are replaced
+    with open(csv_path, 'a', newline='') as file:
+        csv.writer(file).writerow(['2026-01-11 10:00:00', '90.0', '20.0', '10.0'])
+    changed = client.get('/api/data', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert len(changed.get_json()['data']) == 2
+
+
+def test_stream_updates_share_one_build_per_change(client, tmp_path, monkeypatch):
+    write_log(str(tmp_path / 'internet_speed_log.csv'), ['timestamp', 'download_speed_mbps', 'upload_speed_mbps', 'ping_ms'], [
+        ['2026-01-10 10:00:00', '80.0', '20.0', '10.0'],
+        ['2026-01-11 10:00:00', '90.0', '20.0', '10.0'],
+    ])
+    calls = []
+    monkeypatch.setattr(web_interface, 'get_attempts_status', lambda: calls.append(1) or {'recent_attempts': []})
+    first, second = web_interface.parse_timestamps(['2026-01-10 10:00:00', '2026-01-11 10:00:00'])
+
+    behind, last_epoch = web_interface.build_stream_update(None, int(first), generation=1)
+    current, _ = web_interface.build_stream_update(None, int(second), generation=1)
+    assert len(calls) == 1
+    assert [sample['download_speed_mbps'] for sample in behind['samples']] == [90.0]
+    assert last_epoch == second
+    assert current['samples'] == []
+    assert current['stats'] == behind['stats']
+
+    web_interface.build_stream_update(None, int(second), generation=2)
+    assert len(calls) == 2
+
+
+JOURNAL = (
+    "2026-01-10T10:00:00+0200 host python3[42]: Starting speed test...\n"
+    "2026-01-10T10:00:30+0200 host python3[42]: Speed test completed: 80.5 Mbps down, 20.1 Mbps up, 9.8 ms ping\n"
+    "2026-01-10T11:00:00+0200 host python3[42]: Speed test failed: timed out\n"
+)
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    """Stubbed journalctl/systemctl; records the commands run."""
+    ran = []
+
+    def run(cmd, **kwargs):
+        ran.append(cmd[0])
+        stdout = JOURNAL if cmd[0] == 'journalctl' else 'active\n'
+        return subprocess.CompletedProcess(cmd, 0, stdout=stdout, stderr='')
+
+    monkeypatch.setattr(subprocess, 'run', run)
+    return ran
+
+
+@pytest.mark.parametrize('event_log', ['missing', 'empty'])
+def test_attempts_fall_back_to_the_journal_without_events(client, tmp_path, commands, event_log):
+    if event_log == 'empty':
+        open(events_path_for(str(tmp_path / 'internet_speed_log.csv')), 'w').close()
+
+    status = web_interface.get_attempts_status()
+    assert commands == ['journalctl', 'systemctl']
+    assert [(a['status'], a['message']) for a in status['recent_attempts']] == [
+        ('failed', 'Failed: timed out'),
+        ('success', 'Success: 80.5 Mbps down, 20.1 Mbps up, 9.8 ms ping'),
+        ('started', 'Speed test started'),
+    ]
+    assert status['recent_attempts'][0]['timestamp_readable'] == '2026-01-10 11:00:00'
+    assert status['service_running'] is True
+
+
+def test_attempts_come_from_the_event_log_when_it_has_events(client, tmp_path, commands):
+    log = AttemptEventLog(events_path_for(str(tmp_path / 'internet_speed_log.csv')))
+    log.service_started(1)
+    log.success(90.0, 20.0, 10.0)
+
+    status = web_interface.get_attempts_status()
+    assert commands == []
+    assert status['recent_attempts'][0]['message'] == 'Success: 90.0 Mbps down, 20.0 Mbps up, 10.0 ms ping'
+    assert status['service_running'] is True
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from flask import Flask, Response, request
+
+from wsgi_adapter import ThreadedWsgiAdapter
+
+
+def scope(path='/', query=b'', method='GET', headers=()):
+    return {
+        'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'query_string': query, 'root_path': '',
+        'headers': list(headers), 'client': ('127.0.0.1', 50000), 'server': ('localhost', 5000)
+    }
+
+
+def serve(app, request_scope, body=b'', disconnect_after=None, sent=None):
+    """
+    Run one request through the adapter. The client disconnects once it has
+    received `disconnect_after` body messages. Returns the messages sent.
+    """
+    sent = [] if sent is None else sent
+
+    async def main():
+        disconnect = asyncio.Event()
+        requests = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            bodies = [m for m in sent if m['type'] == 'http.response.body']
+            if disconnect_after is not None and len(bodies) >= disconnect_after:
+                disconnect.set()
+
+        await asyncio.wait_for(ThreadedWsgiAdapter(app)(request_scope, receive, send), 5)
+
+    asyncio.run(main())
+    return sent
+
+
+def test_request_and_response_headers_are_translated():
+    app = Flask(__name__)
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        response = Response(f"{request.args['q']}|{request.get_data().decode()}|{request.headers['X-Tag']}|"
+                            f"{request.remote_addr}", mimetype='text/plain', status=201)
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    sent = serve(app, scope('/echo', b'q=1', 'POST', [(b'content-type', b'text/plain'), (b'x-tag', b'a'),
+                                                      (b'x-tag', b'b')]), body=b'payload')
+    start = sent[0]
+    assert start['type'] == 'http.response.start' and start['status'] == 201
+    headers = dict(start['headers'])
+    assert headers[b'content-type'] == b'text/plain; charset=utf-8'
+    assert headers[b'x-accel-buffering'] == b'no'
+    # Repeated request headers are joined with commas, as WSGI servers do
+    assert b''.join(m['body'] for m in sent[1:]) == b'1|payload|a,b|127.0.0.1'
+    assert sent[-1]['more_body'] is False
+
+
+def test_streamed_chunks_are_sent_as_produced_until_the_client_disconnects():
+    produced = []
+    closed = threading.Event()
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/event-stream')])
+
+        def events():
+            try:
+                for number in range(1000):
+                    produced.append(number)
+                    yield f"data: {number}\n\n".encode()
+                    time.sleep(0.01)
+            finally:
+                closed.set()
+        return events()
+
+    sent = serve(app, scope('/api/stream'), disconnect_after=3)
+    bodies = [m['body'] for m in sent if m['type'] == 'http.response.body']
+    assert bodies[:3] == [b'data: 0\n\n', b'data: 1\n\n', b'data: 2\n\n']
+    # The generator stopped at its next chunk after the disconnect and was closed
+    assert len(produced) < 10
+    assert closed.wait(1)
+
+
+def test_errors_before_the_response_propagate_without_sending_anything():
+    def app(environ, start_response):
+        raise RuntimeError('broken view')
+
+    sent = []
+    with pytest.raises(RuntimeError, match='broken view'):
+        serve(app, scope(), sent=sent)
+    assert sent == []
+
+
+def test_errors_while_streaming_end_the_response_and_propagate():
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+
+        def chunks():
+            yield b'partial'
+            raise RuntimeError('stream failed')
+        return chunks()
+
+    sent = []
+    with pytest.raises(RuntimeError, match='stream failed'):
+        serve(app, scope(), sent=sent)
+    # The server sees the exception and drops the connection without a final empty body
+    assert sent[1:] == [{'type': 'http.response.body', 'body': b'partial', 'more_body': True}]
@@ -5,15 +5,46 @@ A Flask web application for viewing speed test results with charts and CSV downl
 """
 
 import os
+import io
 import csv
+import zlib
 import json
 import hashlib
+import ipaddress
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
 from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, send_file, request, redirect, url_for, flash, session
+from flask import Flask, render_template, jsonify, send_file, request, redirect, url_for, flash, session, Response, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
 import pandas as pd
+import numpy as np
 import logging
+from speed_storage import DEFAULT_STORAGE_SETTINGS, epoch_to_timestamp, load_segment_manifest, csv_log_parts, open_csv_text
+from speed_rollups import RollupStore, rollup_path_for, PERIODS
+from speed_stats import summarize_values
+from downsampling import downsample_indices, MODES as DOWNSAMPLE_MODES
+from interval_grid import grid_indices
+from speed_data import get_speed_cache, datetime_to_epoch, parse_timestamps, format_timestamps, as_float64
+from file_watcher import FileWatcher
+from attempt_events import events_path_for, get_event_tail
+from config_store import get_config_store
+from logger_control import send_control
+from manual_test_queue import ManualTestQueue
+from metrics import (REGISTRY, REQUEST_SECONDS, STAGE_SECONDS, SUBPROCESS_SPAWNS, SPEEDTEST_PHASE_SECONDS,
+                     SPEEDTEST_ATTEMPTS, cache_lookup, summary as metrics_summary)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with serialization time recorded for /metrics."""
+    
+    def response(self, *args, **kwargs):
+        with STAGE_SECONDS.time(stage='serialize'):
+            return super().response(*args, **kwargs)
 
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 app.config['SECRET_KEY'] = 'internet-speed-logger-2025'
 app.config['DEBUG'] = True  # Use FLASK_DEBUG instead of FLASK_ENV
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)  # 24 hour session
@@ -32,13 +63,16 @@ DATA_DIR = os.path.dirname(os.path.abspath(__file__))
 CSV_PATH = os.path.join(DATA_DIR, CSV_FILE)
 CONFIG_PATH = os.path.join(DATA_DIR, CONFIG_FILE)
 
+# Ranges longer than this are charted from daily rollups unless ?resolution= says otherwise
+ROLLUP_AUTO_DAYS = 31
+
 # Default admin credentials (change these!)
 DEFAULT_ADMIN_USERNAME = 'admin'
 DEFAULT_ADMIN_PASSWORD = 'speedtest123'  # This will be hashed
 
-def load_config():
-    """Load configuration from JSON file."""
-    default_config = {
+def default_config():
+    """Configuration used when config.json is missing keys or doesn't exist."""
+    return {
         'admin': {
             'username': DEFAULT_ADMIN_USERNAME,
             'password_hash': hashlib.sha256(DEFAULT_ADMIN_PASSWORD.encode()).hexdigest()
@@ -53,30 +87,27 @@ def load_config():
             'manual_cooldown_minutes': 15,
             'last_updated': None,
             'last_manual_test': None
-        }
+        },
+        'storage': dict(DEFAULT_STORAGE_SETTINGS)
     }
-    
+
+def load_config():
+    """Load configuration from JSON file (kept in memory until the file changes)."""
     try:
-        if os.path.exists(CONFIG_PATH):
-            with open(CONFIG_PATH, 'r') as f:
-                config = json.load(f)
-            # Merge with defaults for any missing keys
-            for key in default_config:
-                if key not in config:
-                    config[key] = default_config[key]
-            return config
-        else:
-            save_config(default_config)
-            return default_config
+        # Missing keys are merged in from the defaults
+        return get_config_store(CONFIG_PATH).load(default_config)
+    except FileNotFoundError:
+        config = default_config()
+        save_config(config)
+        return config
     except Exception as e:
         logger.error(f"Error loading config: {e}")
-        return default_config
+        return default_config()
 
 def save_config(config):
-    """Save configuration to JSON file."""
+    """Save configuration to JSON file (atomically, via a temp file and rename)."""
     try:
-        with open(CONFIG_PATH, 'w') as f:
-            json.dump(config, f, indent=2)
+        get_config_store(CONFIG_PATH).save(config)
         return True
     except Exception as e:
         logger.error(f"Error saving config: {e}")
@@ -98,51 +129,206 @@ def require_admin_login(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
-def read_speed_data():
-    """Read speed test data from CSV file."""
+def is_local_request():
+    """True for requests from this machine, e.g. a Prometheus server or exporter running on the Pi."""
     try:
-        if not os.path.exists(CSV_PATH):
-            return []
-        
-        data = []
-        with open(CSV_PATH, 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                # Skip error rows
-                if row['download_speed_mbps'] == 'ERROR':
-                    continue
-                
-                try:
-                    # Parse and validate data
-                    entry = {
-                        'timestamp': row['timestamp'],
-                        'download_speed_mbps': float(row['download_speed_mbps']),
-                        'upload_speed_mbps': float(row['upload_speed_mbps']),
-                        'ping_ms': float(row['ping_ms'])
-                    }
-                    
-                    # Add additional fields if they exist
-                    if 'server_name' in row:
-                        entry['server_name'] = row['server_name']
-                    if 'server_country' in row:
-                        entry['server_country'] = row['server_country']
-                    if 'isp' in row:
-                        entry['isp'] = row['isp']
-                    
-                    data.append(entry)
-                except (ValueError, KeyError) as e:
-                    logger.warning(f"Skipping invalid row: {row}, error: {e}")
-                    continue
-        
-        # Sort by timestamp
-        data.sort(key=lambda x: x['timestamp'])
-        return data
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
+
+def get_storage_backend():
+    """Return (backend, path) of the configured speed test storage."""
+    storage = load_config()['storage']
+    if storage.get('backend') == 'sqlite':
+        db_path = storage.get('sqlite_file') or DEFAULT_STORAGE_SETTINGS['sqlite_file']
+        return 'sqlite', os.path.join(DATA_DIR, db_path)
+    return 'csv', CSV_PATH
+
+def get_data_cache():
+    """Return the shared in-memory cache for the configured storage backend."""
+    backend, path = get_storage_backend()
+    return get_speed_cache(path, backend)
+
+def get_rollup_store():
+    """Return the rollup store kept next to the configured raw log."""
+    return RollupStore(rollup_path_for(get_storage_backend()[1]))
+
+class ResponseCache:
+    """Small thread-safe LRU of rendered JSON bodies and their ETags."""
     
-    except Exception as e:
-        logger.error(f"Error reading CSV file: {e}")
-        return []
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            cache_lookup('response', entry is not None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+response_cache = ResponseCache()
+
+def get_data_version():
+    """Cheap version of everything a JSON API response depends on: dataset snapshot and config file."""
+    cache = get_data_cache()
+    cache.refresh()
+    try:
+        config_mtime = os.stat(CONFIG_PATH).st_mtime_ns
+    except OSError:
+        config_mtime = None
+    return (cache.path, cache.version, config_mtime)
+
+def conditional_json(ttl=60):
+    """
+    Decorator adding a response cache, strong ETags and If-None-Match handling to a JSON route.
+    
+    Bodies are cached per route, query string and data version. `ttl` bounds how
+    long a body is reused for responses that also depend on the clock (relative
+    ?days= windows, cooldowns, journal output). Unchanged bodies keep the same
+    ETag across refreshes, so pollers get a 304 without a body.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = (
+                request.path,
+                tuple(sorted(request.args.items(multi=True))),
+                get_data_version(),
+                int(time.time() // ttl)
+            )
+            entry = response_cache.get(key)
+            if entry is None:
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = (hashlib.sha1(body).hexdigest(), body, response.mimetype)
+                response_cache.put(key, entry)
+            
+            etag, body, mimetype = entry
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = app.response_class(body, mimetype=mimetype)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+class ChangeNotifier:
+    """Generation counter that wakes /api/stream clients when data or test state changes."""
+    
+    def __init__(self):
+        self.generation = 0
+        self.closed = False
+        self._condition = threading.Condition()
+    
+    def notify(self, reason=None):
+        with self._condition:
+            self.generation += 1
+            self._condition.notify_all()
+        logger.debug(f"Change notification {self.generation}: {reason}")
+    
+    def close(self):
+        """Wake every stream for the last time so it ends (server shutdown)."""
+        self.closed = True
+        self.notify('shutdown')
+    
+    def wait(self, generation, timeout):
+        """Block until the generation moves past `generation`; False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.generation != generation, timeout)
+
+change_notifier = ChangeNotifier()
+_change_watcher = None
+_change_watcher_lock = threading.Lock()
+
+def start_change_watcher():
+    """Start (once) the file watcher feeding change_notifier from the log and config files."""
+    global _change_watcher
+    with _change_watcher_lock:
+        if _change_watcher is None:
+            storage = load_config()['storage']
+            db_path = os.path.join(DATA_DIR, storage.get('sqlite_file') or DEFAULT_STORAGE_SETTINGS['sqlite_file'])
+            paths = [CSV_PATH, db_path, db_path + '-wal', CONFIG_PATH,
+                     events_path_for(CSV_PATH), events_path_for(db_path)]
+            _change_watcher = FileWatcher(paths, lambda path: change_notifier.notify(os.path.basename(path)))
+            _change_watcher.start()
+    return _change_watcher
+
+def read_speed_data():
+    """Read speed test data from storage (served from the shared in-memory cache)."""
+    return get_data_cache().get_data()
+
+def read_speed_frame(start_epoch=None, end_epoch=None):
+    """
+    Read speed test data as a columnar SpeedFrame (served from the shared in-memory cache).
+    
+    A window skips archived CSV segments outside it; the frame may still hold
+    rows outside the window, so callers select it themselves.
+    """
+    return get_data_cache().get_frame(start_epoch, end_epoch)
+
+def days_cutoff_epoch(days):
+    """Epoch of the start of a `days` long window ending now."""
+    return datetime_to_epoch(datetime.now() - timedelta(days=days))
+
+def get_event_log_tail():
+    """Return the shared in-memory tail of the loggers' attempt event log."""
+    tail = get_event_tail(events_path_for(get_storage_backend()[1]))
+    tail.on_event = observe_attempt_event
+    return tail
+
+def observe_attempt_event(event):
+    """Count a logger event's outcome and phase durations in the speed test metrics."""
+    kind = event.get('event')
+    if kind in ('success', 'failure', 'rate_limited'):
+        SPEEDTEST_ATTEMPTS.inc(result=kind)
+    for phase, seconds in (event.get('phase_seconds') or {}).items():
+        SPEEDTEST_PHASE_SECONDS.observe(seconds, phase=phase)
 
 def get_recent_test_attempts(limit=5):
+    """Get recent test attempts from the loggers' event log, or the systemd journal for older installs."""
+    tail = get_event_log_tail()
+    tail.refresh()
+    if not tail.has_events():
+        return get_journal_test_attempts(limit)
+    
+    attempts = [
+        {field: event.get(field) for field in ('timestamp', 'status', 'message', 'type')}
+        for event in tail.recent(limit)
+    ]
+    add_readable_timestamps(attempts)
+    return attempts
+
+def add_readable_timestamps(attempts):
+    """Add timestamp_readable and timestamp_relative to attempts with ISO timestamps."""
+    for attempt in attempts:
+        try:
+            dt = datetime.fromisoformat(attempt['timestamp'].replace('Z', '+00:00'))
+            attempt['timestamp_readable'] = dt.strftime('%Y-%m-%d %H:%M:%S')
+            attempt['timestamp_relative'] = get_relative_time(dt)
+        except:
+            attempt['timestamp_readable'] = attempt['timestamp']
+            attempt['timestamp_relative'] = 'Unknown'
+
+def get_journal_test_attempts(limit=5):
     """Get recent test attempts from systemd journal logs."""
     import subprocess
     import re
@@ -160,6 +346,7 @@ def get_recent_test_attempts(limit=5):
             '-o', 'short-iso'
         ]
         
+        SUBPROCESS_SPAWNS.inc(command='journalctl')
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
         
         if result.returncode != 0:
@@ -244,14 +431,7 @@ def get_recent_test_attempts(limit=5):
         attempts.sort(key=lambda x: x['timestamp'], reverse=True)
         
         # Convert timestamps to more readable format
-        for attempt in attempts[:limit]:
-            try:
-                dt = datetime.fromisoformat(attempt['timestamp'].replace('Z', '+00:00'))
-                attempt['timestamp_readable'] = dt.strftime('%Y-%m-%d %H:%M:%S')
-                attempt['timestamp_relative'] = get_relative_time(dt)
-            except:
-                attempt['timestamp_readable'] = attempt['timestamp']
-                attempt['timestamp_relative'] = 'Unknown'
+        add_readable_timestamps(attempts[:limit])
         
         return attempts[:limit]
         
@@ -279,133 +459,112 @@ def get_relative_time(dt):
     except:
         return "Unknown"
 
-def filter_hourly_readings(data, tolerance_minutes=25):
+def hourly_reading_mask(timestamps, tolerance_minutes=25, interval_hours=1):
     """
-    Filter readings to include only those that are approximately 60 minutes apart.
+    Vectorized core of filter_hourly_readings.
+    
+    Args:
+        timestamps: Sorted int64 epoch seconds
+        tolerance_minutes: Allowed deviation from the scheduled time
+        interval_hours: Test interval the readings should follow
+    
+    Returns:
+        Boolean mask selecting the reading closest to each scheduled slot (see interval_grid)
+    """
+    mask = np.zeros(len(timestamps), dtype=bool)
+    mask[grid_indices(timestamps, interval_hours * 3600, tolerance_minutes * 60)] = True
+    return mask
+
+def filter_hourly_readings(data, tolerance_minutes=25, interval_hours=1):
+    """
+    Filter readings to include only those that follow the test interval (hourly by default).
     
     Args:
         data: List of speed test readings with timestamp field
-        tolerance_minutes: Allowed deviation from 60 minutes (default: 25 minutes to handle clock drift)
+        tolerance_minutes: Allowed deviation from the scheduled time (default: 25 minutes to handle clock drift)
+        interval_hours: Test interval the readings should follow
     
     Returns:
-        List of readings that form a consistent hourly sequence
+        List of readings that form a consistent interval sequence
     """
     if not data:
         return []
     
-    from datetime import datetime, timedelta
-    
-    # Convert tolerance to timedelta
-    tolerance = timedelta(minutes=tolerance_minutes)
-    target_interval = timedelta(hours=1)
-    
-    filtered_readings = []
-    
-    # Always include the first reading as our baseline
-    if data:
-        filtered_readings.append(data[0])
-        
-        if len(data) == 1:
-            return filtered_readings
-    
-    # Parse the first timestamp
-    try:
-        baseline_timestamp = datetime.strptime(data[0]['timestamp'], '%Y-%m-%d %H:%M:%S')
-    except ValueError:
+    epochs = parse_timestamps([entry['timestamp'] for entry in data])
+    if epochs[0] is None:
         # If parsing fails, return original data
         return data
     
-    # Check each subsequent reading against our baseline + N hours
-    for entry in data[1:]:
-        try:
-            current_timestamp = datetime.strptime(entry['timestamp'], '%Y-%m-%d %H:%M:%S')
-            
-            # Calculate how many hours this should be from the baseline
-            time_from_baseline = current_timestamp - baseline_timestamp
-            total_hours = time_from_baseline.total_seconds() / 3600
-            
-            # Check if this aligns with any hourly interval (1h, 2h, 3h, etc.)
-            closest_hour = round(total_hours)
-            
-            # Only consider if it's at least 1 hour from baseline
-            if closest_hour >= 1:
-                expected_timestamp = baseline_timestamp + timedelta(hours=closest_hour)
-                
-                # Check if current reading is within tolerance of expected hourly time
-                min_time = expected_timestamp - tolerance
-                max_time = expected_timestamp + tolerance
-                
-                if min_time <= current_timestamp <= max_time:
-                    # This reading aligns with an hourly interval
-                    filtered_readings.append(entry)
-            
-        except ValueError:
-            # Skip readings with invalid timestamps
-            continue
-    
-    return filtered_readings
+    # Skip readings with invalid timestamps
+    valid = [i for i, epoch in enumerate(epochs) if epoch is not None]
+    indices = grid_indices(np.array([epochs[i] for i in valid], dtype=np.int64),
+                           interval_hours * 3600, tolerance_minutes * 60)
+    return [data[valid[i]] for i in indices]
 
-def get_statistics(data):
-    """Calculate statistics from speed data using honest hourly averaging."""
-    if not data:
+@STAGE_SECONDS.time(stage='stats')
+def get_statistics(data, interval_hours=None):
+    """Calculate statistics from a SpeedFrame using honest hourly averaging."""
+    if not len(data):
         return {}
+    if interval_hours is None:
+        interval_hours = load_config()['test_settings']['interval_hours']
     
-    # Filter data to include only hourly readings for honest averaging
-    hourly_data = filter_hourly_readings(data)
+    # Filter data to include only readings on the test schedule for honest averaging
+    hourly_data = data.take(grid_indices(data.timestamps, interval_hours * 3600))
     
-    # Use all data for total count, but hourly data for averages
-    all_downloads = [entry['download_speed_mbps'] for entry in data]
-    all_uploads = [entry['upload_speed_mbps'] for entry in data]
-    all_pings = [entry['ping_ms'] for entry in data]
-    
-    # Use hourly data for honest averages
-    if hourly_data:
-        hourly_downloads = [entry['download_speed_mbps'] for entry in hourly_data]
-        hourly_uploads = [entry['upload_speed_mbps'] for entry in hourly_data]
-        hourly_pings = [entry['ping_ms'] for entry in hourly_data]
-    else:
-        # Fallback to all data if no hourly pattern found
-        hourly_downloads = all_downloads
-        hourly_uploads = all_uploads
-        hourly_pings = all_pings
+    # Use all data for total count and min/max, hourly data for honest averages
+    # (fall back to all data if no hourly pattern found)
+    averaged = hourly_data if len(hourly_data) else data
     
     stats = {
         'total_tests': len(data),
-        'hourly_tests': len(hourly_data),
-        'download': {
-            'avg': round(sum(hourly_downloads) / len(hourly_downloads), 2) if hourly_downloads else 0,
-            'min': round(min(all_downloads), 2),
-            'max': round(max(all_downloads), 2)
-        },
-        'upload': {
-            'avg': round(sum(hourly_uploads) / len(hourly_uploads), 2) if hourly_uploads else 0,
-            'min': round(min(all_uploads), 2),
-            'max': round(max(all_uploads), 2)
-        },
-        'ping': {
-            'avg': round(sum(hourly_pings) / len(hourly_pings), 2) if hourly_pings else 0,
-            'min': round(min(all_pings), 2),
-            'max': round(max(all_pings), 2)
-        },
-        # Additional info about filtering
-        'averaging_method': 'hourly_filtered' if len(hourly_data) < len(data) else 'all_data',
-        'excluded_readings': len(data) - len(hourly_data)
+        'hourly_tests': len(hourly_data)
     }
+    for name in ('download', 'upload', 'ping'):
+        all_values = as_float64(getattr(data, name))
+        # Spread and percentiles describe the same hourly readings as the average
+        summary = summarize_values(as_float64(getattr(averaged, name)))
+        stats[name] = {
+            'avg': summary['avg'],
+            'min': round(float(all_values.min()), 2),
+            'max': round(float(all_values.max()), 2),
+            'stddev': summary['stddev'],
+            'p5': summary['p5'],
+            'p50': summary['p50'],
+            'p95': summary['p95']
+        }
     
-    if data:
-        stats['first_test'] = data[0]['timestamp']
-        stats['last_test'] = data[-1]['timestamp']
+    # Additional info about filtering
+    stats['averaging_method'] = 'hourly_filtered' if len(hourly_data) < len(data) else 'all_data'
+    stats['excluded_readings'] = len(data) - len(hourly_data)
     
-    if hourly_data and len(hourly_data) > 1:
-        stats['first_hourly_test'] = hourly_data[0]['timestamp']
-        stats['last_hourly_test'] = hourly_data[-1]['timestamp']
+    stats['first_test'] = data.timestamp_at(0)
+    stats['last_test'] = data.timestamp_at(-1)
+    
+    if len(hourly_data) > 1:
+        stats['first_hourly_test'] = hourly_data.timestamp_at(0)
+        stats['last_hourly_test'] = hourly_data.timestamp_at(-1)
     
     return stats
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    """Observe the request's latency under its route pattern (streamed bodies only until headers)."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route,
+                                method=request.method, status=response.status_code)
+    return response
+
 @app.route('/')
 def dashboard():
     """Main dashboard page."""
-    data = read_speed_data()
+    data = read_speed_frame()
     stats = get_statistics(data)
     config = load_config()
     
@@ -450,13 +609,15 @@ def admin_logout():
 def admin_dashboard():
     """Admin dashboard page."""
     config = load_config()
-    data = read_speed_data()
+    data = read_speed_frame()
     stats = get_statistics(data)
+    get_event_log_tail().refresh()
     
     return render_template('admin_dashboard.html',
                          config=config,
                          stats=stats,
-                         total_tests=len(data))
+                         total_tests=len(data),
+                         metrics=metrics_summary())
 
 @app.route('/admin/update-packages', methods=['POST'])
 @require_admin_login
@@ -516,7 +677,7 @@ def update_settings():
             # Only update service if interval actually changed
             if old_interval != new_interval:
                 if update_service_interval(new_interval):
-                    flash(f'Settings updated successfully. Test interval: {new_interval}h, Manual cooldown: {new_cooldown}min. Service restarted.', 'success')
+                    flash(f'Settings updated successfully. Test interval: {new_interval}h, Manual cooldown: {new_cooldown}min. Service updated.', 'success')
                 else:
                     flash(f'Configuration saved but failed to restart service. Please restart manually.', 'warning')
             else:
@@ -567,29 +728,35 @@ def change_password():
 
 @app.route('/api/manual-test', methods=['POST'])
 def api_manual_test():
-    """API endpoint to trigger manual speed test."""
+    """API endpoint to queue a manual speed test; poll /api/manual-test/<job_id> for progress."""
     try:
-        can_test, cooldown_remaining = can_run_manual_test()
-        
-        if not can_test:
-            return jsonify({
-                'success': False,
-                'message': f'Please wait {cooldown_remaining} more minutes before running another test'
-            }), 429
+        test_queue = get_manual_test_queue()
         
-        # Run the test in background
-        import threading
-        
-        def run_test():
-            success, message = run_manual_speed_test()
-            logger.info(f"Manual test result: {success}, {message}")
-        
-        test_thread = threading.Thread(target=run_test)
-        test_thread.daemon = True
-        test_thread.start()
+        # Check and start the cooldown in one step so concurrent clicks can't both get through
+        with _manual_test_submit_lock:
+            job = test_queue.active_job()
+            if job:
+                return jsonify({
+                    'success': True,
+                    'job_id': job.id,
+                    'job': job.to_dict(),
+                    'message': 'A speed test is already running. Results will appear in the dashboard shortly.'
+                })
+            
+            can_test, cooldown_remaining = can_run_manual_test()
+            if not can_test:
+                return jsonify({
+                    'success': False,
+                    'message': f'Please wait {cooldown_remaining} more minutes before running another test'
+                }), 429
+            
+            record_manual_test_start()
+            job, _ = test_queue.submit()
         
         return jsonify({
             'success': True,
+            'job_id': job.id,
+            'job': job.to_dict(),
             'message': 'Speed test started. Results will appear in the dashboard shortly.'
         })
         
@@ -611,7 +778,8 @@ def api_manual_test_status():
             'can_test': can_test,
             'cooldown_remaining': cooldown_remaining,
             'cooldown_minutes': config['test_settings'].get('manual_cooldown_minutes', 15),
-            'last_manual_test': config['test_settings'].get('last_manual_test')
+            'last_manual_test': config['test_settings'].get('last_manual_test'),
+            'job': active_manual_test_job()
         })
         
     except Exception as e:
@@ -622,8 +790,26 @@ def api_manual_test_status():
             'error': str(e)
         }), 500
 
+@app.route('/api/manual-test/<job_id>')
+def api_manual_test_job(job_id):
+    """API endpoint with the status and progress of one queued manual test."""
+    job = get_manual_test_queue().get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown speed test job'}), 404
+    return jsonify(job.to_dict())
+
 def update_service_interval(new_interval_hours):
-    """Update the systemd service with new interval."""
+    """Apply a new interval to the running logger, restarting the service only as a fallback."""
+    # The logger reloads config.json itself; asking it over the control socket confirms the change
+    try:
+        response = send_control({'command': 'reload'})
+        if response.get('ok') and response.get('interval_hours') == new_interval_hours:
+            logger.info(f"Logger picked up new interval of {new_interval_hours} hours without a restart")
+            return True
+        logger.warning(f"Logger did not apply the new interval: {response}")
+    except (OSError, ValueError) as e:
+        logger.info(f"Logger control socket unavailable ({e}), restarting the service instead")
+    
     try:
         import subprocess
         
@@ -631,6 +817,7 @@ def update_service_interval(new_interval_hours):
         update_script = os.path.join(DATA_DIR, 'update_interval.sh')
         
         if os.path.exists(update_script):
+            SUBPROCESS_SPAWNS.inc(command='update_interval.sh')
             result = subprocess.run([update_script, str(new_interval_hours)], 
                                   capture_output=True, text=True, timeout=30)
             
@@ -675,59 +862,77 @@ def can_run_manual_test():
         logger.error(f"Error checking manual test cooldown: {e}")
         return True, 0
 
-def run_manual_speed_test():
-    """Execute a manual speed test."""
+_manual_test_loggers = {}
+_manual_test_loggers_lock = threading.Lock()
+
+def get_manual_test_logger():
+    """Logger used for dashboard-triggered tests, shared so its speed test engine is reused."""
+    key = get_storage_backend()
+    with _manual_test_loggers_lock:
+        if key not in _manual_test_loggers:
+            from simple_speed_logger import SimpleSpeedLogger
+            _manual_test_loggers[key] = SimpleSpeedLogger(CSV_PATH)
+        return _manual_test_loggers[key]
+
+_manual_test_queue = None
+_manual_test_queue_lock = threading.Lock()
+_manual_test_submit_lock = threading.Lock()
+
+def get_manual_test_queue():
+    """Single-worker queue running dashboard-triggered tests one at a time."""
+    global _manual_test_queue
+    with _manual_test_queue_lock:
+        if _manual_test_queue is None:
+            _manual_test_queue = ManualTestQueue(run_manual_speed_test, change_notifier.notify)
+        return _manual_test_queue
+
+def active_manual_test_job():
+    """The queued or running manual test as a dict, or None."""
+    job = get_manual_test_queue().active_job()
+    return job.to_dict() if job else None
+
+def record_manual_test_start():
+    """Start the manual test cooldown when a test is queued rather than when it finishes."""
+    config = load_config()
+    config['test_settings']['last_manual_test'] = datetime.now().isoformat()
+    save_config(config)
+
+def run_manual_speed_test(on_phase=None):
+    """
+    Execute a manual speed test in-process and log it like a scheduled one.
+    
+    Returns:
+        (success, message, results)
+    """
     try:
-        import subprocess
-        import tempfile
-        
-        # Create a temporary script to run the speed test
-        manual_test_script = """#!/bin/bash
-cd /home/user01/Desktop/internet_speed_logger
-python3 simple_speed_logger.py 0 2>&1
-"""
-        
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as f:
-            f.write(manual_test_script)
-            script_path = f.name
-        
-        # Make script executable
-        subprocess.run(['chmod', '+x', script_path])
-        
-        # Run the test with timeout
-        result = subprocess.run([script_path], capture_output=True, text=True, timeout=120)
+        test_logger = get_manual_test_logger()
         
-        # Clean up
-        subprocess.run(['rm', '-f', script_path])
+        # One attempt: the user is waiting, and the cooldown protects against retries
+        results = test_logger.perform_speed_test(max_retries=1, on_phase=on_phase)
+        test_logger.log_to_csv(results)
         
-        # Update last manual test time
-        config = load_config()
-        config['test_settings']['last_manual_test'] = datetime.now().isoformat()
-        save_config(config)
-        
-        if result.returncode == 0:
+        if results['download_speed_mbps'] != 'ERROR':
             logger.info("Manual speed test completed successfully")
-            return True, "Speed test completed successfully"
+            return True, "Speed test completed successfully", results
         else:
-            logger.error(f"Manual speed test failed: {result.stderr}")
-            return False, f"Speed test failed: {result.stderr}"
+            logger.error("Manual speed test failed")
+            return False, "Speed test failed, see recent test attempts for details", results
             
-    except subprocess.TimeoutExpired:
-        return False, "Speed test timed out (took longer than 2 minutes)"
     except Exception as e:
         logger.error(f"Error running manual speed test: {e}")
-        return False, f"Error running speed test: {str(e)}"
+        return False, f"Error running speed test: {str(e)}", None
 
+@STAGE_SECONDS.time(stage='stats')
 def get_package_performance(data, package):
     """Analyze performance against subscription package."""
-    if not data or not package:
+    if not len(data) or not package:
         return {}
     
     download_target = package['download']
     upload_target = package['upload']
     
-    download_meets = sum(1 for entry in data if entry['download_speed_mbps'] >= download_target)
-    upload_meets = sum(1 for entry in data if entry['upload_speed_mbps'] >= upload_target)
+    download_meets = int(np.count_nonzero(as_float64(data.download) >= download_target))
+    upload_meets = int(np.count_nonzero(as_float64(data.upload) >= upload_target))
     
     total_tests = len(data)
     
@@ -742,25 +947,49 @@ def get_package_performance(data, package):
     
     return performance
 
+def get_speed_distribution(total, count_below, target, approximate=False):
+    """
+    Count download results against the package's download target.
+    
+    Args:
+        total: Number of download results
+        count_below: Function giving how many of them are below a speed
+        target: Package download target in Mbps
+        approximate: Whether count_below is an estimate (rollup sketches)
+    
+    Returns:
+        {'target', 'counts': [above, near, below, poor], 'approximate'} for results at or
+        above the target, at 75-100% of it, at 50-75% and under 50%, or None without a target.
+        The counts always add up to total.
+    """
+    if not target or target <= 0:
+        return None
+    
+    below = [count_below(target * share) for share in (1, 0.75, 0.5)]
+    return {
+        'target': target,
+        'counts': [total - below[0], below[0] - below[1], below[1] - below[2], below[2]],
+        'approximate': approximate
+    }
+
 @app.route('/api/data')
+@conditional_json()
 def api_data():
     """API endpoint to get speed test data as JSON."""
-    data = read_speed_data()
     config = load_config()
     
     # Get query parameters for filtering
     days = request.args.get('days', type=int)
     limit = request.args.get('limit', type=int)
+    data = read_speed_frame(days_cutoff_epoch(days) if days else None)
     
     # Filter by days if specified
     if days:
-        cutoff_date = datetime.now() - timedelta(days=days)
-        data = [entry for entry in data 
-                if datetime.strptime(entry['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_date]
+        data = data.since(days_cutoff_epoch(days))
     
     # Limit results if specified
     if limit:
-        data = data[-limit:]
+        data = data.tail(limit)
     
     # Calculate package performance
     package_performance = get_package_performance(data, config['subscription_package'])
@@ -769,7 +998,7 @@ def api_data():
     can_test, cooldown_remaining = can_run_manual_test()
     
     return jsonify({
-        'data': data,
+        'data': data.to_records(),
         'stats': get_statistics(data),
         'package_performance': package_performance,
         'manual_test': {
@@ -784,91 +1013,273 @@ def api_data():
     })
 
 @app.route('/api/chart-data')
+@conditional_json()
 def api_chart_data():
     """API endpoint optimized for chart display."""
-    data = read_speed_data()
-    
     # Get query parameters
     days = request.args.get('days', default=7, type=int)
+    resolution = request.args.get('resolution', default='auto')
+    max_points = request.args.get('max_points', type=int)
+    downsample = request.args.get('downsample', default='lttb')
+    
+    if downsample not in DOWNSAMPLE_MODES:
+        return jsonify({'error': f"downsample must be one of: {', '.join(DOWNSAMPLE_MODES)}"}), 400
+    
+    if resolution == 'auto':
+        resolution = 'day' if days > ROLLUP_AUTO_DAYS else 'raw'
+    
+    target = load_config()['subscription_package'].get('download')
+    
+    # Long ranges: one point per rollup bucket instead of every sample
+    if resolution in PERIODS:
+        rollup_store = get_rollup_store()
+        if rollup_store.exists():
+            cutoff = days_cutoff_epoch(days)
+            buckets = rollup_store.query(resolution, cutoff)
+            # The pie counts tests, so it comes from the buckets' sketches rather than their averages
+            download = rollup_store.total(resolution, 'download', cutoff)
+            distribution = get_speed_distribution(download.count, download.histogram.count_below, target, approximate=True)
+            return jsonify(rollup_chart_data(buckets, resolution, distribution))
+    
+    cutoff = days_cutoff_epoch(days)
+    data = read_speed_frame(cutoff)
     
     # Filter by days
-    cutoff_date = datetime.now() - timedelta(days=days)
-    filtered_data = [entry for entry in data 
-                    if datetime.strptime(entry['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_date]
+    filtered_data = data.since(cutoff)
+    sample_count = len(filtered_data)
+    # Counted before downsampling so the pie reflects every test in the window
+    download = as_float64(filtered_data.download)
+    distribution = get_speed_distribution(
+        len(download), lambda speed: int(np.count_nonzero(download < speed)), target)
+    
+    # Reduce to at most max_points while keeping the shape (lttb) or the extremes (minmax)
+    if max_points and sample_count > max_points:
+        filtered_data = filtered_data.take(downsample_indices(
+            filtered_data.timestamps,
+            [filtered_data.download, filtered_data.upload, filtered_data.ping],
+            max_points,
+            downsample
+        ))
     
     # Prepare data for charts
     chart_data = {
-        'labels': [entry['timestamp'] for entry in filtered_data],
-        'download_speeds': [entry['download_speed_mbps'] for entry in filtered_data],
-        'upload_speeds': [entry['upload_speed_mbps'] for entry in filtered_data],
-        'ping_times': [entry['ping_ms'] for entry in filtered_data]
+        'resolution': 'raw',
+        'sample_count': sample_count,
+        'downsampled': len(filtered_data) < sample_count,
+        'labels': format_timestamps(filtered_data.timestamps),
+        'download_speeds': as_float64(filtered_data.download).tolist(),
+        'upload_speeds': as_float64(filtered_data.upload).tolist(),
+        'ping_times': as_float64(filtered_data.ping).tolist(),
+        'distribution': distribution
     }
     
     return jsonify(chart_data)
 
+def rollup_chart_data(buckets, resolution, distribution):
+    """Shape rollup buckets like raw chart data, with per-bucket min/max bands."""
+    chart_data = {
+        'resolution': resolution,
+        'labels': [epoch_to_timestamp(bucket['bucket']) for bucket in buckets],
+        'distribution': distribution
+    }
+    for metric, key in (('download', 'download_speeds'), ('upload', 'upload_speeds'), ('ping', 'ping_times')):
+        chart_data[key] = [bucket[metric]['avg'] for bucket in buckets]
+        chart_data[f'{metric}_min'] = [bucket[metric]['min'] for bucket in buckets]
+        chart_data[f'{metric}_max'] = [bucket[metric]['max'] for bucket in buckets]
+    return chart_data
+
+@app.route('/api/rollups')
+@conditional_json()
+def api_rollups():
+    """API endpoint to get hourly/daily/weekly aggregates (count, avg, min, max, stddev, percentiles)."""
+    period = request.args.get('period', default='day')
+    days = request.args.get('days', type=int)
+    
+    if period not in PERIODS:
+        return jsonify({'error': f"period must be one of: {', '.join(PERIODS)}"}), 400
+    
+    buckets = get_rollup_store().query(period, days_cutoff_epoch(days) if days else None)
+    for bucket in buckets:
+        bucket['bucket'] = epoch_to_timestamp(bucket['bucket'])
+    
+    return jsonify({'period': period, 'buckets': buckets})
+
 @app.route('/download/csv')
 def download_csv():
     """Download the complete CSV file."""
     try:
+        # The SQLite backend has no CSV file; export everything through the filtered route
+        if get_storage_backend()[0] == 'sqlite':
+            return redirect(url_for('download_filtered_csv'))
+        
         if not os.path.exists(CSV_PATH):
             return "CSV file not found", 404
         
+        download_name = f'internet_speed_log_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        
+        # Earlier months live in compressed segments: stream them and the active file as one CSV
+        if load_segment_manifest(CSV_PATH):
+            return Response(
+                stream_with_context(stream_csv_log(CSV_PATH)),
+                mimetype='text/csv',
+                headers={'Content-Disposition': f'attachment; filename={download_name}'}
+            )
+        
         return send_file(
             CSV_PATH,
             as_attachment=True,
-            download_name=f'internet_speed_log_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+            download_name=download_name,
             mimetype='text/csv'
         )
     except Exception as e:
         logger.error(f"Error downloading CSV: {e}")
         return f"Error downloading file: {e}", 500
 
+# Rows rendered per chunk when streaming CSV exports
+EXPORT_CHUNK_ROWS = 1000
+
+def parse_date_param(value, end_of_day=False):
+    """
+    Parse a 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' query parameter into an epoch.
+    
+    A bare date used as an end bound covers that whole day.
+    """
+    if len(value) == 10:
+        dt = datetime.strptime(value, '%Y-%m-%d')
+        if end_of_day:
+            dt += timedelta(days=1)
+    else:
+        dt = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    return datetime_to_epoch(dt)
+
+def stream_csv_rows(frame, fieldnames, compress=False):
+    """
+    Generate CSV output for a frame chunk by chunk.
+    
+    Only one chunk of rows and one output buffer are alive at a time, so memory
+    use stays constant regardless of export size.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    
+    def flush():
+        text = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(text) if compressor else text
+    
+    writer.writeheader()
+    yield flush()
+    
+    for offset in range(0, len(frame), EXPORT_CHUNK_ROWS):
+        writer.writerows(frame.take(slice(offset, offset + EXPORT_CHUNK_ROWS)).to_records())
+        chunk = flush()
+        if chunk:
+            yield chunk
+    
+    if compressor:
+        yield compressor.flush()
+
+# Characters copied per chunk when streaming the raw CSV log
+EXPORT_CHUNK_CHARS = 64 * 1024
+
+def stream_csv_log(csv_path):
+    """
+    Generate the complete CSV log: every archived segment, then the active file, under one header.
+    
+    Parts with the active file's header are copied as they are; older parts
+    with fewer columns are rewritten with the missing columns left empty.
+    """
+    parts = csv_log_parts(csv_path)
+    with open_csv_text(parts[-1]) as file:
+        header = next(csv.reader(file), None) or []
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(header)
+    yield buffer.getvalue().encode('utf-8')
+    
+    for path in parts:
+        with open_csv_text(path) as file:
+            part_header = next(csv.reader([file.readline()]), None)
+            if part_header == header:
+                while True:
+                    chunk = file.read(EXPORT_CHUNK_CHARS)
+                    if not chunk:
+                        break
+                    yield chunk.encode('utf-8')
+                continue
+            
+            reader = csv.DictReader(file, fieldnames=part_header)
+            while True:
+                rows = list(itertools.islice(reader, EXPORT_CHUNK_ROWS))
+                if not rows:
+                    break
+                buffer = io.StringIO()
+                csv.DictWriter(buffer, fieldnames=header, restval='', extrasaction='ignore').writerows(rows)
+                yield buffer.getvalue().encode('utf-8')
+
 @app.route('/download/filtered-csv')
 def download_filtered_csv():
-    """Download filtered CSV data based on query parameters."""
+    """
+    Stream filtered CSV data based on query parameters.
+    
+    Query parameters:
+        days: Only the last N days
+        start, end: 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' bounds (end is exclusive, a bare end date is inclusive)
+        columns: Comma separated subset of columns
+        gzip: 1 to download a gzip-compressed .csv.gz
+    """
     try:
-        data = read_speed_data()
-        
         # Get query parameters for filtering
         days = request.args.get('days', type=int)
+        start = request.args.get('start')
+        end = request.args.get('end')
+        columns = request.args.get('columns')
+        compress = request.args.get('gzip', default=0, type=int) == 1
+        
+        try:
+            start_epoch = parse_date_param(start) if start else None
+            end_epoch = parse_date_param(end, end_of_day=True) if end else None
+        except ValueError:
+            return "Invalid start/end date, use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS", 400
         
         # Filter by days if specified
         if days:
-            cutoff_date = datetime.now() - timedelta(days=days)
-            data = [entry for entry in data 
-                    if datetime.strptime(entry['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_date]
+            cutoff = days_cutoff_epoch(days)
+            start_epoch = cutoff if start_epoch is None else max(start_epoch, cutoff)
         
-        if not data:
-            return "No data available for the specified filter", 404
+        # Binary-search the window; no rows are copied until they are streamed
+        frame = read_speed_frame(start_epoch, end_epoch).window(start_epoch, end_epoch)
         
-        # Create temporary CSV file
-        import tempfile
-        temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv')
+        if not len(frame):
+            return "No data available for the specified filter", 404
         
-        # Write headers
+        # Select columns
         fieldnames = ['timestamp', 'download_speed_mbps', 'upload_speed_mbps', 'ping_ms']
-        if data and 'server_name' in data[0]:
+        if frame.has_server_info:
             fieldnames.extend(['server_name', 'server_country', 'isp'])
-        
-        writer = csv.DictWriter(temp_file, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        # Write data
-        for entry in data:
-            row = {key: entry.get(key, '') for key in fieldnames}
-            writer.writerow(row)
-        
-        temp_file.close()
+        if columns:
+            requested = [c.strip() for c in columns.split(',') if c.strip()]
+            unknown = [c for c in requested if c not in fieldnames]
+            if unknown or not requested:
+                return f"Unknown columns: {', '.join(unknown)}. Available: {', '.join(fieldnames)}", 400
+            fieldnames = requested
         
         # Generate filename
-        suffix = f"_{days}days" if days else "_all"
+        if days:
+            suffix = f"_{days}days"
+        elif start or end:
+            suffix = f"_{(start or 'begin')[:10]}_{(end or 'now')[:10]}"
+        else:
+            suffix = "_all"
         filename = f'internet_speed_log{suffix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        if compress:
+            filename += '.gz'
         
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='text/csv'
+        return Response(
+            stream_with_context(stream_csv_rows(frame, fieldnames, compress)),
+            mimetype='application/gzip' if compress else 'text/csv',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
         )
     
     except Exception as e:
@@ -888,14 +1299,18 @@ def api_status():
             last_modified = None
             file_size = 0
         
-        data = read_speed_data()
+        data = read_speed_frame()
+        segments = load_segment_manifest(CSV_PATH)
         
         status = {
+            'storage_backend': get_storage_backend()[0],
             'csv_exists': os.path.exists(CSV_PATH),
             'csv_last_modified': last_modified.isoformat() if last_modified else None,
             'csv_file_size': file_size,
+            'csv_archive_segments': len(segments),
+            'csv_archive_size': sum(segment['bytes'] for segment in segments),
             'total_records': len(data),
-            'latest_test': data[-1]['timestamp'] if data else None,
+            'latest_test': data.timestamp_at(-1) if len(data) else None,
             'server_time': datetime.now().isoformat()
         }
         
@@ -905,15 +1320,16 @@ def api_status():
         logger.error(f"Error getting status: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/recent-attempts')
-def api_recent_attempts():
-    """API endpoint to get recent test attempts from service logs."""
-    try:
-        attempts = get_recent_test_attempts(limit=5)
-        
-        # Also check service status
+def get_attempts_status(limit=5):
+    """Recent test attempts plus whether the logger service is running."""
+    attempts = get_recent_test_attempts(limit=limit)
+    
+    # Also check service status: the pid of the running logger, or systemd if the events don't say
+    is_running = get_event_log_tail().service_running()
+    if is_running is None:
         import subprocess
         try:
+            SUBPROCESS_SPAWNS.inc(command='systemctl')
             service_status = subprocess.run(
                 ['systemctl', 'is-active', 'internet-speed-logger.service'],
                 capture_output=True, text=True, timeout=5
@@ -921,17 +1337,196 @@ def api_recent_attempts():
             is_running = service_status.stdout.strip() == 'active'
         except:
             is_running = False
-        
-        return jsonify({
-            'recent_attempts': attempts,
-            'service_running': is_running,
-            'last_updated': datetime.now().isoformat()
-        })
+    
+    return {
+        'recent_attempts': attempts,
+        'service_running': is_running,
+        'last_updated': datetime.now().isoformat()
+    }
+
+@app.route('/api/recent-attempts')
+@conditional_json(ttl=30)
+def api_recent_attempts():
+    """API endpoint to get recent test attempts from service logs."""
+    try:
+        return jsonify(get_attempts_status())
     
     except Exception as e:
         logger.error(f"Error getting recent attempts: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Seconds between keepalive/status events on an idle /api/stream connection
+STREAM_KEEPALIVE_SECONDS = 30
+# Burst of file events (one CSV append fires several) folded into a single update
+STREAM_DEBOUNCE_SECONDS = 0.25
+
+# Seconds a shared stream update is reused by clients woken by the same change
+STREAM_SHARED_SECONDS = 5
+
+class StreamUpdateCache:
+    """
+    Shared part of /api/stream updates, built once per change and ?days= window.
+    
+    Every connected client wakes on the same notification; the first one builds
+    the stats, package performance, manual test state and attempts (which may
+    run systemctl/journalctl) and the others reuse them.
+    """
+    
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, days, generation, build):
+        key = (days, generation)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > STREAM_SHARED_SECONDS:
+                entry = (time.monotonic(), build(days))
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry[1]
+
+stream_update_cache = StreamUpdateCache()
+
+def build_shared_stream_state(days):
+    """
+    (frame, fields) shared by every stream client of a ?days= window: the
+    window's frame, and the stats, package performance, manual test state,
+    config and recent attempts of the update payload.
+    """
+    frame = read_speed_frame(days_cutoff_epoch(days) if days else None)
+    config = load_config()
+    window = frame.since(days_cutoff_epoch(days)) if days else frame
+    can_test, cooldown_remaining = can_run_manual_test()
+    
+    fields = {
+        'stats': get_statistics(window),
+        'package_performance': get_package_performance(window, config['subscription_package']),
+        'manual_test': {
+            'can_test': can_test,
+            'cooldown_remaining': cooldown_remaining,
+            'job': active_manual_test_job()
+        },
+        'config': {
+            'package': config['subscription_package'],
+            'test_interval': config['test_settings']['interval_hours'],
+            'manual_cooldown': config['test_settings'].get('manual_cooldown_minutes', 15)
+        },
+        'attempts': get_attempts_status()
+    }
+    return frame, fields
+
+def build_stream_update(days, since_epoch, generation=None):
+    """
+    Delta pushed to /api/stream clients after a change.
+    
+    The shared part is built once per change notification `generation` (see
+    StreamUpdateCache); only the samples are selected per client.
+    
+    Returns:
+        (payload, last_epoch) where payload carries only the samples newer than
+        since_epoch, plus the stats, package performance, manual test state and
+        recent attempts for the client's ?days= window
+    """
+    if generation is None:
+        generation = change_notifier.generation
+    frame, fields = stream_update_cache.get(days, generation, build_shared_stream_state)
+    
+    if since_epoch is None:
+        new_samples = frame.tail(0)
+        last_epoch = int(frame.timestamps[-1]) if len(frame) else None
+    else:
+        if days and since_epoch + 1 < days_cutoff_epoch(days):
+            # Reconnected after a gap longer than its window: read the missed samples separately
+            frame = read_speed_frame(since_epoch + 1)
+        new_samples = frame.since(since_epoch + 1)
+        last_epoch = int(new_samples.timestamps[-1]) if len(new_samples) else since_epoch
+    
+    payload = {'samples': new_samples.to_records()}
+    payload.update(fields)
+    return payload, last_epoch
+
+def sse_event(event, data, event_id=None):
+    """Format one Server-Sent Events message."""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+@app.route('/api/stream')
+def api_stream():
+    """
+    Server-Sent Events channel replacing dashboard polling.
+    
+    An 'update' event is pushed whenever the speed log or config changes or a
+    manual test is queued, starts, changes phase or finishes; idle connections get a 'status' event with
+    the manual test cooldown every STREAM_KEEPALIVE_SECONDS. The event id is the
+    epoch of the newest sample, so a reconnecting EventSource only receives the
+    samples it missed.
+    """
+    days = request.args.get('days', type=int)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since_epoch = int(last_event_id) if last_event_id else None
+    except ValueError:
+        since_epoch = None
+    
+    start_change_watcher()
+    
+    def generate():
+        last_epoch = since_epoch
+        if last_epoch is None:
+            # A fresh client has just loaded the full view; only stream what comes after it
+            frame = read_speed_frame(days_cutoff_epoch(days) if days else None)
+            last_epoch = int(frame.timestamps[-1]) if len(frame) else 0
+        
+        yield "retry: 5000\n\n"
+        generation = change_notifier.generation
+        if since_epoch is not None:
+            payload, last_epoch = build_stream_update(days, last_epoch, generation)
+            yield sse_event('update', payload, last_epoch)
+        
+        while True:
+            if change_notifier.wait(generation, STREAM_KEEPALIVE_SECONDS):
+                if change_notifier.closed:
+                    return
+                time.sleep(STREAM_DEBOUNCE_SECONDS)
+                generation = change_notifier.generation
+                try:
+                    payload, last_epoch = build_stream_update(days, last_epoch, generation)
+                except Exception as e:
+                    logger.error(f"Error building stream update: {e}")
+                    continue
+                yield sse_event('update', payload, last_epoch)
+            else:
+                can_test, cooldown_remaining = can_run_manual_test()
+                yield sse_event('status', {
+                    'manual_test': {
+                        'can_test': can_test,
+                        'cooldown_remaining': cooldown_remaining
+                    }
+                })
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Request, parsing, cache and speed test metrics in the Prometheus text format."""
+    # Scrapers can't log in, so local clients are allowed; anyone else needs an admin session
+    if not is_local_request() and not session.get('admin_logged_in'):
+        return Response("Forbidden\n", status=403, content_type='text/plain; charset=utf-8')
+    
+    # Pick up phase timings the loggers reported since the last read
+    get_event_log_tail().refresh()
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 if __name__ == '__main__':
     # Development server
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+WSGI to ASGI Adapter
+Serves a WSGI app (the Flask dashboard) from an ASGI server, running every
+request in its own worker thread.
+
+asgiref's WsgiToAsgi runs all requests on one shared thread, so a single open
+/api/stream (Server-Sent Events) response would block every other request.
+Here each request gets a thread from a pool, response chunks are handed to the
+event loop as they are produced, and a streaming response ends at its next
+chunk once the client has disconnected.
+"""
+
+import io
+import sys
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope and its request body."""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+
+    for name, value in scope['headers']:
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # Chunked requests have no Content-Length, but the body has been read whole
+    environ.setdefault('CONTENT_LENGTH', str(len(body)))
+    return environ
+
+
+class ThreadedWsgiAdapter:
+    """ASGI application wrapping a WSGI application, one worker thread per request."""
+
+    def __init__(self, wsgi_app, max_workers=16):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        loop = asyncio.get_running_loop()
+        disconnected = threading.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await loop.run_in_executor(self.executor, self._run, scope, bytes(body), send, loop, disconnected)
+        except ConnectionResetError:
+            pass
+        finally:
+            # Also stops a response still streaming when this request is cancelled (server shutdown)
+            disconnected.set()
+            watcher.cancel()
+
+    def _run(self, scope, body, send, loop, disconnected):
+        """Run the WSGI app in a worker thread, forwarding its output to `send`."""
+        response = {}
+
+        def send_message(message):
+            if disconnected.is_set():
+                raise ConnectionResetError("Client disconnected")
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def send_body(data, more_body=True):
+            if 'started' not in response:
+                response['started'] = True
+                send_message(response['start'])
+            send_message({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and 'started' in response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+            }
+            return send_body
+
+        iterable = self.wsgi_app(build_environ(scope, body), start_response)
+        try:
+            for chunk in iterable:
+                if chunk:
+                    send_body(chunk)
+            send_body(b'', more_body=False)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()